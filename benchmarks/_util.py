@@ -0,0 +1,132 @@
+import importlib.util
+import os
+import sys
+import threading
+import time
+import types
+
+SIVIA_DIR = os.path.join(os.path.dirname(__file__), '..', 'sivia')
+
+
+def bench(fn, number=1000, repeat=5):
+    """Return the best per-call time in microseconds over ``repeat`` runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+class StubChat:
+    # Chat of a StubModel; history entries look like the Gemini client's.
+    # Like a real ChatSession it must not be used by two threads at once,
+    # and it refuses a new message while a streamed reply was not read to
+    # the end; here both raise instead of mixing up the turns.
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history)
+        self._busy = threading.Lock()
+        self._streaming = False
+
+    def send_message(self, prompt, stream=False):
+        if not self._busy.acquire(blocking=False):
+            raise RuntimeError("chat usado por dos hilos a la vez")
+        try:
+            if self._streaming:
+                raise RuntimeError("chat con una respuesta en streaming sin terminar")
+            text = self.model.call(prompt, self.history)
+            self.history = self.history + [{'role': 'user', 'parts': [prompt]}, {'role': 'model', 'parts': [text]}]
+        finally:
+            self._busy.release()
+        if stream:
+            self._streaming = True
+            return self._stream(text)
+        return types.SimpleNamespace(text=text)
+
+    def _stream(self, text):
+        yield types.SimpleNamespace(text=text)
+        self._streaming = False
+
+
+class StubModel:
+    """Fake google.generativeai GenerativeModel; configure it with stub_model().
+
+    ``latency`` (seconds, or a callable returning them) is slept on every
+    call, inside ``upstream`` (a semaphore standing for the provider's
+    capacity) when set. A prompt containing ``fail_on`` raises. ``reply`` is
+    the text, or a callable taking the prompt. With ``record`` each call's
+    (prompt, history) is kept in ``sent``. ``calls`` counts every call.
+    """
+    latency = 0.0
+    reply = "Respuesta de prueba de SIVIA sobre el colegio, suficientemente larga."
+    fail_on = None
+    upstream = None
+    record = False
+    calls = 0
+    _lock = threading.Lock()
+
+    def __init__(self, name, system_instruction=None):
+        self.system_instruction = system_instruction or ""
+        self.sent = []
+
+    def start_chat(self, history):
+        return StubChat(self, history)
+
+    def generate_content(self, prompt):
+        return types.SimpleNamespace(text=self.call(prompt, []))
+
+    def call(self, prompt, history):
+        cls = type(self)
+        with cls._lock:
+            cls.calls += 1
+        if cls.fail_on is not None and cls.fail_on in prompt:
+            raise RuntimeError("error simulado")
+        if cls.record:
+            self.sent.append((prompt, list(history)))
+        latency = cls.latency() if callable(cls.latency) else cls.latency
+        if cls.upstream is not None:
+            with cls.upstream:
+                time.sleep(latency)
+        elif latency:
+            time.sleep(latency)
+        return cls.reply(prompt) if callable(cls.reply) else cls.reply
+
+
+def stub_model(**settings):
+    """A StubModel subclass with ``settings`` and its own call counter."""
+    attrs = {'calls': 0, '_lock': threading.Lock()}
+    for name, value in settings.items():
+        if not hasattr(StubModel, name):
+            raise TypeError(f"StubModel no tiene la opción {name!r}")
+        attrs[name] = staticmethod(value) if callable(value) and name in ('latency', 'reply') else value
+    return type('StubModel', (StubModel,), attrs)
+
+
+def install_fake_genai(model_cls):
+    """Make ``google.generativeai`` resolve to a stub whose GenerativeModel is ``model_cls``."""
+    genai = types.ModuleType('google.generativeai')
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = model_cls
+    google = types.ModuleType('google')
+    google.generativeai = genai
+    sys.modules['google'] = google
+    sys.modules['google.generativeai'] = genai
+    return genai
+
+
+def load_terminal_engine(model_cls, knowledge_base=None, **env):
+    """Import a fresh copy of engine.py against a fake model and build its CognitiveEngine."""
+    install_fake_genai(model_cls)
+    os.environ.update(env)
+    if SIVIA_DIR not in sys.path:
+        sys.path.insert(0, SIVIA_DIR)
+    spec = importlib.util.spec_from_file_location(
+        'sivia_engine', os.path.join(SIVIA_DIR, 'engine.py'))
+    module = importlib.util.module_from_spec(spec)
+    # Registered so scripts can reach the module-level settings.
+    sys.modules['sivia_engine'] = module
+    spec.loader.exec_module(module)
+    module.GOOGLE_API_KEY = "fake"
+    return module.CognitiveEngine(knowledge_base or {}, max_history=10)
@@ -0,0 +1,76 @@
+# Batch mode of the terminal (batch.py) against a stub model that takes 50 ms
+# per call: throughput at different concurrency levels, output in input order,
+# a failing prompt that does not stop the run, and resuming a cut-off output.
+# Exits non-zero if a check fails.
+# Usage: python benchmarks/bench_batch.py
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import load_terminal_engine, stub_model
+
+LATENCY = 0.05
+PROMPTS = 200
+
+
+StubModel = stub_model(
+    latency=LATENCY, fail_on="falla",
+    reply=lambda prompt: f"Respuesta a: {prompt.rsplit(':', 1)[-1].strip()}",
+)
+
+
+def check(condition, message):
+    if not condition:
+        sys.exit(f"falla: {message}")
+
+
+def write_input(path):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(PROMPTS):
+            prompt = "esto falla" if i == 7 else f"consulta número {i} zzq"
+            f.write(json.dumps({"prompt": prompt}, ensure_ascii=False) + "\n" if i % 2 else prompt + "\n")
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    engine = load_terminal_engine(StubModel, SIVIA_HEDGE="0")
+    engine.router = None
+    import batch
+
+    directory = tempfile.mkdtemp(prefix="sivia-batch-")
+    source = os.path.join(directory, "preguntas.jsonl")
+    write_input(source)
+
+    for concurrency in (1, 8, 32):
+        engine.response_cache.clear()
+        out = io.StringIO()
+        stats = batch.run_batch(engine, batch.read_prompts(source), out, concurrency, report=None)
+        print(f"concurrencia {concurrency:>2}: {stats['per_second']:>6.1f} consultas/s, "
+              f"p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms")
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    check([r["line"] for r in records] == list(range(PROMPTS)), "resultados en el orden de la entrada")
+    check("error" in records[7] and sum("error" in r for r in records) == 1, "el error queda registrado y sigue")
+    check(records[9]["reply"].startswith("Respuesta a: consulta número 9"), "respuesta de cada línea")
+
+    # Cut the output halfway through a line and resume.
+    target = os.path.join(directory, "respuestas.jsonl")
+    full = out.getvalue()
+    with open(target, "w", encoding="utf-8") as f:
+        f.write(full[:len(full) // 2])
+    start = batch.resume_offset(target)
+    engine.response_cache.clear()
+    with open(target, "a", encoding="utf-8") as f:
+        batch.run_batch(engine, batch.read_prompts(source, start), f, 8, report=None)
+    with open(target, encoding="utf-8") as f:
+        resumed = [json.loads(line)["line"] for line in f]
+    check(resumed == list(range(PROMPTS)), "la reanudación completa la salida sin huecos ni repetidos")
+    print(f"reanudación desde la línea {start}: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Burst of chat requests against a slow stub model, counting upstream calls.
+#
+# 1. N threads ask the same question at once: single-flight coalescing must
+#    turn that into one model call.
+# 2. N threads ask distinct stateless questions with micro-batching on: the
+#    model must see about N / SIVIA_BATCH_MAX requests instead of N.
+# 3. Without batching, an identical burst is one shared call that carries no
+#    session's history, plus one call on its own chat for the session that
+#    already has turns (it is never coalesced); every session, leader or
+#    follower, keeps the turn in its own history.
+# 4. A reply that is ready (here from the knowledge base) does not wait for a
+#    slow turn the same session has in flight: it comes back at once and the
+#    skipped recording is counted as turn_not_recorded.
+# Exits non-zero if a check fails.
+# Usage: python benchmarks/bench_coalesce.py [clients] [latency_s]
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import SIVIA_DIR, load_terminal_engine, stub_model
+
+sys.path.insert(0, SIVIA_DIR)
+
+import metrics
+
+
+def batch_reply(prompt):
+    # A JSON list with one answer per "### CONSULTA n" section, or one answer.
+    n = len(re.findall(r"^### CONSULTA \d+$", prompt, flags=re.M))
+    answers = [f"Respuesta de prueba número {i} sobre el colegio." for i in range(max(n, 1))]
+    return json.dumps(answers) if n else answers[0]
+
+
+def burst(engine, prompts, prefix="s"):
+    # One new session per prompt unless ``prefix`` names sessions already used.
+    replies = [None] * len(prompts)
+
+    def ask(i):
+        replies[i] = engine.respond(prompts[i], session_id=f"{prefix}{i}")[1]
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(len(prompts))]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return replies, time.perf_counter() - start
+
+
+def main(clients, latency):
+    logging.disable(logging.WARNING)
+    SlowModel = stub_model(latency=latency, reply=batch_reply)
+    batch_max = 8
+    engine = load_terminal_engine(SlowModel, SIVIA_BATCH_WINDOW_MS="50", SIVIA_BATCH_MAX=str(batch_max))
+    engine.router = None
+
+    SlowModel.calls = 0
+    replies, elapsed = burst(engine, ["¿A qué hora abre la biblioteca?"] * clients)
+    same_calls = SlowModel.calls
+    print(f"{clients} pedidos iguales:   {same_calls} llamadas al modelo, {elapsed:.2f} s")
+    assert same_calls == 1 and len(set(replies)) == 1, (same_calls, set(replies))
+
+    SlowModel.calls = 0
+    prompts = [f"¿Qué materias hay en el año {i}?" for i in range(clients)]
+    replies, elapsed = burst(engine, prompts, prefix="t")
+    distinct_calls = SlowModel.calls
+    print(f"{clients} pedidos distintos: {distinct_calls} llamadas al modelo, {elapsed:.2f} s")
+    assert all(replies) and distinct_calls <= -(-clients // batch_max) + 1, distinct_calls
+    print(f"sin coalescer serían {clients} llamadas en cada caso; "
+          f"coalescidas: {engine.inflight.stats()}, lotes: {engine.batcher.stats()}")
+    check_shared_turn(clients, latency)
+    check_busy_session(latency)
+
+
+def check_shared_turn(clients, latency):
+    model = stub_model(latency=latency, record=True)
+    engine = load_terminal_engine(model, SIVIA_BATCH_WINDOW_MS="0")
+    engine.router = None
+    engine.generate_response("me llamo Ana y estoy en quinto año", session_id="s0")
+    question = "¿A qué hora cierra la biblioteca?"
+    replies, _ = burst(engine, [question] * clients)
+    histories = sorted(len(history) for _, history in engine.model.sent[1:])
+    last_turns = [[e["parts"][0] for e in engine.chats.get(f"s{i}").history[-2:]] for i in range(clients)]
+    # A turn sent on the session's chat keeps the full prompt built around the question.
+    recorded = sum(asked.endswith(question) and answer == reply
+                   for (asked, answer), reply in zip(last_turns, replies))
+    print(f"{clients} pedidos iguales sin lotes: {len(histories)} llamadas con {histories} "
+          f"mensajes de historial; el turno quedó en {recorded} sesiones")
+    assert histories == [0, 2], "una llamada compartida sin historial y la de la sesión con turnos en su chat"
+    assert recorded == clients, last_turns
+
+
+def check_busy_session(latency):
+    model = stub_model(latency=latency)
+    kb = {"horario biblioteca": "La biblioteca abre de 8 a 18 horas."}
+    engine = load_terminal_engine(model, knowledge_base=kb, SIVIA_HEDGE="0")
+    engine.router = None
+    slow = threading.Thread(target=engine.respond, args=("contame más sobre el colegio",),
+                            kwargs={"session_id": "ocupada", "has_history": True})
+    slow.start()
+    time.sleep(latency / 4)
+    skipped = metrics.snapshot()[1].get("turn_not_recorded", 0)
+    start = time.perf_counter()
+    engine.respond("¿horario de la biblioteca?", session_id="ocupada", has_history=True)
+    elapsed = time.perf_counter() - start
+    skipped = metrics.snapshot()[1].get("turn_not_recorded", 0) - skipped
+    slow.join()
+    print(f"respuesta de la base con un turno lento en curso: {elapsed * 1e3:.0f} ms, "
+          f"{skipped} turno sin registrar")
+    assert elapsed < latency / 4, "una respuesta lista no espera el turno en curso de la sesión"
+    assert skipped == 1, skipped
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 32,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 0.2)
@@ -0,0 +1,72 @@
+# Embedding search: batched top-k over a float32 matrix loaded with mmap, from
+# 1k to 1M rows, plus hashing-embedder build time for realistic KB sizes.
+# Usage: python benchmarks/bench_embeddings.py [--max-rows N]
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'sivia'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import bench
+from embeddings import EmbeddingIndex, HashingEmbedder
+
+DIM = 512
+BATCH = 16
+
+
+def random_unit_rows(rng, n, dim=DIM):
+    m = rng.standard_normal((n, dim), dtype=np.float32)
+    m /= np.linalg.norm(m, axis=1, keepdims=True)
+    return m
+
+
+def search_table(max_rows, workdir):
+    rng = np.random.default_rng(7)
+    queries = random_unit_rows(rng, BATCH)
+    print(f"{'filas':>9} {'1 consulta (ms)':>16} {f'lote de {BATCH} (ms)':>17} {'por consulta (ms)':>18}")
+    n = 1_000
+    while n <= max_rows:
+        path = os.path.join(workdir, f"m{n}.npy")
+        np.save(path, random_unit_rows(rng, n))
+        index = EmbeddingIndex(range(n), [], cache_dir=None)
+        index.matrix = np.load(path, mmap_mode="r")
+        number = max(1, 20_000 // n)
+        single = bench(lambda: index.search_vectors(queries[:1], k=5), number=number, repeat=3) / 1e3
+        batch = bench(lambda: index.search_vectors(queries, k=5), number=number, repeat=3) / 1e3
+        print(f"{n:>9} {single:>16.2f} {batch:>17.2f} {batch / BATCH:>18.3f}")
+        del index
+        os.remove(path)
+        n *= 10
+
+
+def build_table():
+    embedder = HashingEmbedder(DIM)
+    words = ["kiosco", "pago", "torneo", "valorant", "podcast", "wifi", "salón", "delegados", "horario"]
+    print(f"\n{'textos':>9} {'embed (ms)':>11}")
+    for n in (100, 1_000, 10_000):
+        texts = [" ".join(words[(i + j) % len(words)] for j in range(12)) + f" tema{i}" for i in range(n)]
+        start = time.perf_counter()
+        embedder.embed(texts)
+        print(f"{n:>9} {(time.perf_counter() - start) * 1e3:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="sivia-emb-")
+    try:
+        search_table(args.max_rows, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    build_table()
+
+
+if __name__ == '__main__':
+    main()
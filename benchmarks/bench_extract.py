@@ -0,0 +1,97 @@
+# Streaming paragraph extraction vs. the original full BeautifulSoup parse,
+# on multi-megabyte HTML pages. Fixtures are generated once into
+# benchmarks/fixtures/ (not committed) so every run parses the same bytes.
+# Usage: python benchmarks/bench_extract.py
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'sivia'))
+
+from bs4 import BeautifulSoup
+
+from web_search import READ_CHUNK, extract_paragraphs
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+SIZES_MB = (1, 2, 8)
+WORDS = "el centro de estudiantes organiza torneos podcast kiosco votación propuestas colegio".split()
+
+
+def fixture_path(size_mb):
+    path = os.path.join(FIXTURES, f'page_{size_mb}mb.html')
+    if not os.path.exists(path):
+        os.makedirs(FIXTURES, exist_ok=True)
+        rng = random.Random(size_mb)
+        target = size_mb * 1024 * 1024
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('<html><head><title>fixture</title><script>var x = 1;</script></head><body>\n')
+            written = 0
+            while written < target:
+                words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 60)))
+                block = (
+                    f'<div class="c"><span>{rng.choice(WORDS)}</span>'
+                    f'<p>{words} <a href="/x">enlace</a> <b>{rng.choice(WORDS)}</b></p></div>\n'
+                )
+                f.write(block)
+                written += len(block)
+            f.write('</body></html>\n')
+    return path
+
+
+def legacy_extract(html):
+    page_soup = BeautifulSoup(html, 'html.parser')
+    paragraphs = page_soup.find_all('p')
+    text = " ".join(p.get_text().strip() for p in paragraphs if len(p.get_text().strip()) > 40)
+    return text[:500]
+
+
+def read_chunks(path, counter):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                return
+            counter[0] += len(chunk)
+            yield chunk.decode('utf-8', 'ignore')
+
+
+def measure(fn):
+    # Time without tracemalloc (it slows allocation-heavy parsing a lot), then
+    # run again under tracemalloc for the peak. bs4 trees are cyclic, so
+    # collect first to keep one run's garbage out of the next measurement.
+    gc.collect()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    print(f"{'página':>7} {'modo':>10} {'leído':>10} {'tiempo':>9} {'pico mem':>10}")
+    for size_mb in SIZES_MB:
+        path = fixture_path(size_mb)
+        total = os.path.getsize(path)
+
+        def legacy():
+            with open(path, encoding='utf-8') as f:
+                return legacy_extract(f.read())
+
+        counter = [0]
+        old, old_t, old_mem = measure(legacy)
+        new, new_t, new_mem = measure(lambda: extract_paragraphs(read_chunks(path, counter)))
+        counter[0] //= 2
+        assert old == new, (old, new)
+        print(f"{size_mb:>5}MB {'bs4':>10} {total / 1e6:>8.2f}MB {old_t * 1e3:>7.1f}ms {old_mem / 1e6:>8.1f}MB")
+        print(f"{size_mb:>5}MB {'streaming':>10} {counter[0] / 1e6:>8.2f}MB {new_t * 1e3:>7.1f}ms {new_mem / 1e6:>8.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
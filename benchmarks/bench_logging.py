@@ -0,0 +1,101 @@
+# Request latency of sivia.py with logging off, with a synchronous handler and
+# with the queue pipeline from logsetup, all writing to a slow stream (each
+# write sleeps, like a congested stderr or journald). Half of the prompts miss
+# the intent table and log a warning. Also checks that the rate limiter
+# collapses a flood of identical warnings.
+# Exits non-zero if the rate limiter lets the flood through.
+# Usage: python benchmarks/bench_logging.py
+import importlib.util
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import SIVIA_DIR
+
+ROOT = os.path.join(SIVIA_DIR, '..')
+sys.path.insert(0, SIVIA_DIR)
+
+import logsetup
+
+WRITE_DELAY = 0.0002
+REQUESTS = 2000
+PROMPTS = ['hola', 'xyzzy ' * 300, '¿cuáles son las propuestas?', 'plugh']
+
+
+class SlowStream:
+    def __init__(self):
+        self.writes = 0
+
+    def write(self, text):
+        time.sleep(WRITE_DELAY)
+        self.writes += 1
+
+    def flush(self):
+        pass
+
+
+def load(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run(client, label):
+    times = []
+    for i in range(REQUESTS):
+        start = time.perf_counter()
+        client.post('/api/chat', json={'prompt': PROMPTS[i % len(PROMPTS)]})
+        times.append(time.perf_counter() - start)
+    times.sort()
+    p50 = times[len(times) // 2] * 1e3
+    p99 = times[int(len(times) * 0.99)] * 1e3
+    print(f"{label:<12} p50 {p50:6.3f} ms   p99 {p99:6.3f} ms")
+
+
+def check_rate_limit():
+    limiter = logsetup.RateLimitFilter(burst=20, window=60.0)
+    record = lambda: logging.LogRecord('sivia', logging.WARNING, __file__, 0,
+                                       "No se encontró respuesta para: %s", ('x',), None)
+    passed = sum(limiter.filter(record()) for _ in range(10_000))
+    error = logging.LogRecord('sivia', logging.ERROR, __file__, 0, "falla", (), None)
+    print(f"rate limit: {passed} de 10000 avisos idénticos pasan")
+    if passed != 20 or not limiter.filter(error):
+        sys.exit("el limitador de logs no se comporta como se espera")
+
+
+def main():
+    # No rate limiting for the latency runs so every mode writes the same lines.
+    os.environ['SIVIA_LOG_BURST'] = str(10 ** 9)
+    os.environ['SIVIA_RATE_BURST'] = str(10 ** 9)
+    slow = SlowStream()
+    stderr, sys.stderr = sys.stderr, slow
+    try:
+        app = load('sivia_root', os.path.join(ROOT, 'sivia.py')).app
+    finally:
+        sys.stderr = stderr
+    client = app.test_client()
+    root = logging.getLogger()
+    pipeline = root.handlers[:]
+
+    logging.disable(logging.CRITICAL)
+    run(client, "sin logs")
+    logging.disable(logging.NOTSET)
+
+    sync = logging.StreamHandler(SlowStream())
+    sync.setFormatter(logsetup.JsonFormatter())
+    root.handlers[:] = [sync]
+    run(client, "síncrono")
+
+    root.handlers[:] = pipeline
+    run(client, "cola")
+    print(f"líneas escritas por el listener: {slow.writes}")
+
+    check_rate_limit()
+
+
+if __name__ == '__main__':
+    main()
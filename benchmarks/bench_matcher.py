@@ -0,0 +1,44 @@
+# Micro-benchmark: IntentMatcher vs. the original per-pattern re.search loop.
+# Usage: python benchmarks/bench_matcher.py
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import bench
+from sivia import IntentMatcher
+
+
+def legacy_match(responses, prompt):
+    for pattern, response in responses.items():
+        if re.search(pattern, prompt):
+            return response
+    return None
+
+
+def make_responses(n):
+    return {f'clave{i}|tema{i} especial|pregunta{i}': f'respuesta {i}' for i in range(n)}
+
+
+def main():
+    print(f"{'patrones':>9} {'caso':>8} {'loop (us)':>12} {'matcher (us)':>13} {'x':>7}")
+    for n in (10, 1000, 10000):
+        responses = make_responses(n)
+        matcher = IntentMatcher(responses)
+        cases = {
+            'primero': 'hola, tengo una consulta sobre clave0 por favor',
+            'ultimo': f'hola, tengo una consulta sobre tema{n - 1} especial',
+            'ninguno': 'hola, tengo una consulta que no coincide con nada',
+        }
+        number = max(1, 20000 // n)
+        for name, prompt in cases.items():
+            assert matcher.get(prompt) == legacy_match(responses, prompt)
+            loop_us = bench(lambda: legacy_match(responses, prompt), number, repeat=3)
+            fast_us = bench(lambda: matcher.get(prompt), number, repeat=3)
+            print(f'{n:>9} {name:>8} {loop_us:>12.1f} {fast_us:>13.1f} {loop_us / fast_us:>7.1f}')
+
+
+if __name__ == '__main__':
+    main()
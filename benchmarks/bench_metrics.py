@@ -0,0 +1,95 @@
+# Overhead of the metrics layer, and a check that /metrics reports the stages
+# after stubbed requests to each app (sivia.py, sivia/server.py and, when
+# FastAPI is installed, sivia/S.I.V.I.A.py).
+# Exits non-zero if an expected series is missing.
+# Usage: python benchmarks/bench_metrics.py
+import importlib.util
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import SIVIA_DIR, bench
+
+ROOT = os.path.join(SIVIA_DIR, '..')
+sys.path.insert(0, SIVIA_DIR)
+
+import metrics
+
+
+def load(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def expect(text, *series):
+    missing = [s for s in series if s not in text]
+    if missing:
+        sys.exit(f"faltan series en /metrics: {missing}")
+
+
+def overhead():
+    def timed():
+        with metrics.timer("bench"):
+            pass
+    print(f"timer(): {bench(timed, number=100_000, repeat=3):.2f} us   "
+          f"inc(): {bench(lambda: metrics.inc('bench'), number=100_000, repeat=3):.2f} us   "
+          f"render(): {bench(metrics.render, number=200, repeat=3):.0f} us")
+    metrics.reset()
+
+
+def check_root_app():
+    app = load('sivia_root', os.path.join(ROOT, 'sivia.py')).app
+    client = app.test_client()
+    client.post('/api/chat', json={'prompt': 'hola'})
+    client.post('/api/chat', json={'prompt': 'xyzzy'})
+    text = client.get('/metrics').get_data(as_text=True)
+    expect(text, 'sivia_stage_seconds_count{stage="match"} 2',
+           'sivia_events_total{event="intent_match"} 1', 'sivia_events_total{event="intent_no_match"} 1')
+    print("sivia.py: ok")
+
+
+def check_server():
+    metrics.reset()
+    app = load('stub_app', os.path.join(os.path.dirname(__file__), 'stub_app.py')).app
+    # Two conversations: only a session's opening prompt is shared through the cache.
+    for client in (app.test_client(), app.test_client()):
+        client.post('/api/chat', json={'prompt': '¿Qué materias hay en quinto año?'})
+    text = client.get('/metrics').get_data(as_text=True)
+    expect(text, 'stage="request"', 'stage="model_call"', 'stage="prompt_build"', 'stage="sanitize"',
+           'stage="kb_lookup"', 'sivia_events_total{event="response_cache_hit"} 1', 'sivia_sessions 2')
+    print("server.py: ok")
+    return text
+
+
+def check_fastapi():
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError:
+        print("S.I.V.I.A.py: FastAPI no instalado, se omite")
+        return
+    metrics.reset()
+    api = load('sivia_api', os.path.join(SIVIA_DIR, 'S.I.V.I.A.py'))
+    with TestClient(api.app) as client:
+        for _ in range(2):
+            client.post('/chat', json={'message': '¿Qué materias hay en quinto año?'})
+        text = client.get('/metrics').text
+    expect(text, 'stage="request"', 'stage="model_call"', 'sivia_events_total{event="response_cache_hit"} 1',
+           'sivia_chat_active 0')
+    print("S.I.V.I.A.py: ok")
+
+
+def main():
+    logging.disable(logging.WARNING)
+    os.environ['SIVIA_STUB_LATENCY'] = '0.01'
+    overhead()
+    check_root_app()
+    print(check_server())
+    check_fastapi()
+
+
+if __name__ == '__main__':
+    main()
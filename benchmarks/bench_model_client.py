@@ -0,0 +1,111 @@
+# ModelClient (server.py fallback path) against fake google.generativeai modules.
+#
+# - package missing: the old fallback retried the import on every request;
+#   the client fails once, opens the breaker and then answers offline in
+#   well under a millisecond.
+# - flaky upstream: transient errors are retried with jitter and succeed.
+# - upstream down: the breaker opens after the threshold, fails fast, and a
+#   single probe closes it again once the upstream recovers.
+# Exits non-zero if any of that does not hold.
+# Usage: python benchmarks/bench_model_client.py
+import importlib
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import SIVIA_DIR, bench, install_fake_genai
+
+sys.path.insert(0, SIVIA_DIR)
+
+from model_client import CLOSED, OPEN, ModelClient, ModelUnavailable
+
+
+def offline(client, prompt):
+    try:
+        return client.generate(prompt)
+    except Exception:
+        return f"SIVIA (offline): No tengo acceso al modelo, recibí: {prompt}"
+
+
+def legacy_fallback(prompt):
+    try:
+        genai = importlib.import_module('google.generativeai')
+        genai.configure(api_key="fake")
+        model = genai.GenerativeModel("fake")
+        return model.start_chat(history=[]).send_message(prompt).text
+    except Exception:
+        return f"SIVIA (offline): No tengo acceso al modelo, recibí: {prompt}"
+
+
+class Upstream:
+    # Fails the next ``failures`` calls, then answers.
+    failures = 0
+    calls = 0
+
+    def __init__(self, name):
+        pass
+
+    def generate_content(self, prompt):
+        Upstream.calls += 1
+        if Upstream.failures > 0:
+            Upstream.failures -= 1
+            raise ConnectionError("upstream caído")
+        return types.SimpleNamespace(text=f"ok: {prompt}")
+
+
+def missing_package():
+    sys.modules.pop('google', None)
+    sys.modules.pop('google.generativeai', None)  # real import lookup, fails
+    client = ModelClient("fake", "fake")
+    offline(client, "hola")
+    assert client.state == OPEN, client.health()
+    new_us = bench(lambda: offline(client, "hola"), number=10_000, repeat=3)
+    old_us = bench(lambda: legacy_fallback("hola"), number=1_000, repeat=3)
+    print(f"paquete ausente: respuesta offline {old_us:.1f} us -> {new_us:.2f} us")
+    assert new_us < 1000
+
+
+def flaky_upstream():
+    install_fake_genai(Upstream)
+    Upstream.failures, Upstream.calls = 2, 0
+    client = ModelClient("fake", "fake", retries=2, base_delay=0.01, failure_threshold=5)
+    reply = client.generate("hola")
+    print(f"upstream intermitente: {Upstream.calls} intentos, respuesta {reply!r}, estado {client.state}")
+    assert reply == "ok: hola" and Upstream.calls == 3 and client.state == CLOSED
+
+
+def upstream_down():
+    install_fake_genai(Upstream)
+    Upstream.failures, Upstream.calls = 10 ** 9, 0
+    client = ModelClient("fake", "fake", retries=1, base_delay=0.01, failure_threshold=3, reset_timeout=0.2)
+    for _ in range(20):
+        offline(client, "hola")
+    calls_while_open = Upstream.calls
+    start = time.perf_counter()
+    try:
+        client.generate("hola")
+    except ModelUnavailable:
+        pass
+    fail_fast_us = (time.perf_counter() - start) * 1e6
+    print(f"upstream caído: {calls_while_open} llamadas en 20 pedidos, "
+          f"fallo rápido en {fail_fast_us:.1f} us, estado {client.state}")
+    assert client.state == OPEN and calls_while_open <= 4
+
+    Upstream.failures = 0
+    time.sleep(0.25)
+    reply = client.generate("hola")
+    print(f"tras {client.reset_timeout}s: sonda {reply!r}, estado {client.state}")
+    assert client.state == CLOSED
+
+
+def main():
+    missing_package()
+    flaky_upstream()
+    upstream_down()
+
+
+if __name__ == '__main__':
+    main()
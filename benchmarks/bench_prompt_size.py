@@ -0,0 +1,67 @@
+# Request payload per turn over a long conversation, with a fake model.
+#
+# The fake client records what a real request would carry: the system
+# instruction plus the (trimmed) chat history plus the new message. With the
+# preamble inside every message the payload grows until the history cap and
+# stays several times larger; with a system instruction the new message has
+# the same size on every turn. Exits non-zero if that stops being true.
+# Usage: python benchmarks/bench_prompt_size.py [turns]
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import load_terminal_engine, stub_model
+
+REPLY = "Claro, con gusto te ayudo con eso."
+
+
+FakeModel = stub_model(reply=REPLY, record=True)
+
+
+class LegacyFakeModel(FakeModel):
+    # A client without system_instruction support.
+    def __init__(self, name):
+        super().__init__(name)
+
+
+def run(model_cls, turns):
+    engine = load_terminal_engine(model_cls)
+    # Semantic context depends on the question; keep it out so only the
+    # conversation length changes between turns.
+    engine.router = None
+    for i in range(turns):
+        engine.generate_response(f"pregunta número {i} sobre el colegio", session_id="bench")
+    return [payload(engine.model, prompt, history) for prompt, history in engine.model.sent]
+
+
+def payload(model, prompt, history):
+    # (new message, whole request) in bytes.
+    message = len(prompt.encode('utf-8'))
+    carried = sum(len(part.encode('utf-8')) for entry in history for part in entry['parts'])
+    return message, len(model.system_instruction.encode('utf-8')) + carried + message
+
+
+def main(turns):
+    logging.disable(logging.WARNING)
+    results = {
+        'preámbulo por turno': run(LegacyFakeModel, turns),
+        'system instruction': run(FakeModel, turns),
+    }
+    print(f"{'modo':<22} {'turno':>6} {'mensaje (B)':>12} {'request (B)':>12}")
+    for name, payloads in results.items():
+        for turn in (1, 2, 10, turns // 2, turns):
+            message, payload = payloads[turn - 1]
+            print(f"{name:<22} {turn:>6} {message:>12} {payload:>12}")
+    legacy, current = results['preámbulo por turno'], results['system instruction']
+    # Messages differ only by the digits of the turn number.
+    sizes = [message for message, _ in current]
+    assert max(sizes) - min(sizes) <= len(str(turns)), sizes
+    assert current[-1][1] == max(payload for _, payload in current[10:])
+    assert current[-1][1] < legacy[-1][1]
+    print(f"\nrequest final: {legacy[-1][1]} B -> {current[-1][1]} B")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,49 @@
+# BM25 retrieval index: build time and query latency as the KB grows.
+# Usage: python benchmarks/bench_retrieval.py
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'sivia'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import bench
+from retrieval import KnowledgeRetriever
+
+VOCAB = [
+    "kiosco", "pago", "productos", "presidente", "funciones", "centro", "estudiantes",
+    "torneo", "valorant", "podcast", "viernes", "wifi", "salón", "cableado", "diario",
+    "colegio", "delegados", "curso", "materiales", "inversores", "pared", "creativa",
+    "horario", "biblioteca", "examen", "uniforme", "comedor", "viaje", "egresados",
+] + [f"tema{i}" for i in range(2000)]
+QUERIES = [
+    "¿Cómo se paga en el kiosco?",
+    "qué funciones tiene el centro de estudiantes",
+    "cuándo es el torneo de valorant",
+    "horario de la biblioteca para el examen de tema42",
+]
+
+
+def make_kb(n, rng):
+    return {
+        f"entrada_{i}_{rng.choice(VOCAB)}": " ".join(rng.choice(VOCAB) for _ in range(rng.randint(8, 30)))
+        for i in range(n)
+    }
+
+
+def main():
+    rng = random.Random(7)
+    print(f"{'entradas':>9} {'build (ms)':>11} {'query (us)':>11}")
+    for n in (100, 1_000, 10_000, 100_000):
+        kb = make_kb(n, rng)
+        start = time.perf_counter()
+        retriever = KnowledgeRetriever(kb)
+        build_ms = (time.perf_counter() - start) * 1e3
+        query_us = sum(bench(lambda q=q: retriever.lookup(q), number=max(1, 20_000 // n), repeat=3)
+                       for q in QUERIES) / len(QUERIES)
+        print(f"{n:>9} {build_ms:>11.1f} {query_us:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
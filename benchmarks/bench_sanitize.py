@@ -0,0 +1,91 @@
+# Compares the one-pass sanitize_ai_response against the original 30-pass
+# str.replace loop: output equivalence on a generated corpus (terms next to
+# spaces, punctuation and multi-byte text, including characters whose
+# lowercase form is longer), then speed on replies from 2 KB to 200 KB, with
+# and without replacement terms in them.
+# Usage: python benchmarks/bench_sanitize.py
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'sivia'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import bench
+from sanitizer import REPLACEMENTS, StreamSanitizer, sanitize_ai_response
+
+
+def legacy_sanitize(response):
+    processed = response
+    for old, new in REPLACEMENTS.items():
+        processed = processed.replace(old, new)
+        processed = processed.replace(old.lower(), new)
+        processed = processed.replace(old.upper(), new)
+    return processed
+
+
+WORDS = (
+    "hola estudiantes el centro propuestas kiosco torneo colegio votar lista "
+    "ciencia tecnología respuesta pregunta amigable clara útil confiable"
+).split()
+MULTIBYTE = "ñandú acción niño está 😀 señal€ 東京 İstanbul İA".split()
+SEPARATORS = [" ", " ", " ", ",", ".", "¿", "?", "¡", "!", "(", ")", "\n", "—", "…", '"', "'", ": ", "-", "😀", "é"]
+TERMS = [v for old in REPLACEMENTS for v in (old, old.lower(), old.upper())]
+# Terms matched case-insensitively where the legacy loop, which only tried
+# three spellings, left them alone: "İ" matches "i" but lowercases to two
+# characters, so these go through the IGNORECASE fallback.
+FOLDED = {
+    "Como İA te digo": "Como SIVIA te digo",
+    "soy una İA": "soy SIVIA",
+    "asistente de İA": "Sistema de Innovación Virtual",
+    "İstanbul: Como İA, soy una İA y no ChatGPT.": "İstanbul: Como SIVIA, soy SIVIA y no SIVIA.",
+}
+
+
+def make_reply(size, rng, term_ratio=0.05, words=WORDS, separators=(" ",)):
+    parts = []
+    length = 0
+    while length < size:
+        word = rng.choice(TERMS) if rng.random() < term_ratio else rng.choice(words)
+        parts.append(word + rng.choice(separators))
+        length += len(parts[-1])
+    return "".join(parts)[:size]
+
+
+def check_equivalence(rng, cases=5000):
+    corpus = list(FOLDED.items())
+    for i in range(cases):
+        if i % 2:
+            # Punctuation and multi-byte text right against the terms.
+            reply = make_reply(rng.randint(0, 400), rng, 0.2, WORDS + MULTIBYTE, SEPARATORS)
+        else:
+            reply = make_reply(rng.randint(0, 400), rng, term_ratio=0.2)
+        corpus.append((reply, legacy_sanitize(reply)))
+    for reply, expected in corpus:
+        assert sanitize_ai_response(reply) == expected, reply
+        stream = StreamSanitizer()
+        out, pos = [], 0
+        while pos < len(reply):
+            step = rng.randint(1, 12)
+            out.append(stream.feed(reply[pos:pos + step]))
+            pos += step
+        out.append(stream.flush())
+        assert "".join(out) == expected, reply
+    print(f"equivalencia OK en {len(corpus)} respuestas (completa y en streaming)")
+
+
+def main():
+    rng = random.Random(1234)
+    check_equivalence(rng)
+    print(f"{'tamaño':>8} {'términos':>9} {'legacy (us)':>12} {'one-pass (us)':>14} {'x':>6}")
+    for term_ratio in (0.05, 0.0):
+        for size in (2_000, 20_000, 200_000):
+            reply = make_reply(size, rng, term_ratio)
+            number = max(1, 200_000 // size)
+            old = bench(lambda: legacy_sanitize(reply), number)
+            new = bench(lambda: sanitize_ai_response(reply), number)
+            print(f"{size:>8} {term_ratio:>9.0%} {old:>12.1f} {new:>14.1f} {old / new:>6.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# Per-request cost as the number of concurrent conversations grows.
+#
+# Every session holds a conversation of several turns with a stub model that
+# records what each call carries (system instruction, history and message).
+# With one chat per session, trimmed to max_history, the bytes sent per
+# request and the engine's time per request must not depend on how many
+# other sessions exist, no request may carry another session's turns, and
+# the pool must stay under SIVIA_MAX_CHATS.
+# Exits non-zero if a check fails.
+# Usage: python benchmarks/bench_sessions.py [--turns 8]
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import load_terminal_engine, stub_model
+
+SESSION_COUNTS = (1, 10, 100, 1000)
+StubModel = stub_model(record=True)
+
+
+def request_bytes(model, prompt, history):
+    carried = sum(len(part.encode('utf-8')) for entry in history for part in entry['parts'])
+    return len(model.system_instruction.encode('utf-8')) + carried + len(prompt.encode('utf-8'))
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def run(sessions, turns, max_chats):
+    engine = load_terminal_engine(StubModel, SIVIA_MAX_CHATS=str(max_chats), SIVIA_HEDGE="0")
+    engine.router = None
+    times = []
+    # Round-robin, so every conversation is in the pool at once; only the
+    # last round, with full histories, is measured.
+    for turn in range(turns):
+        engine.model.sent.clear()
+        for s in range(sessions):
+            start = time.perf_counter()
+            engine.generate_response(f"pregunta {turn} de la sesión {s}. sobre el colegio", session_id=f"s{s}")
+            if turn == turns - 1:
+                times.append(time.perf_counter() - start)
+    for prompt, history in engine.model.sent:
+        own = prompt[prompt.index("sesión "):].split(".")[0] + "."
+        if any(own not in entry["parts"][0] for entry in history if entry["role"] == "user"):
+            sys.exit(f"un pedido de la {own[:-1]} lleva turnos de otra sesión")
+    sizes = [request_bytes(engine.model, prompt, history) for prompt, history in engine.model.sent]
+    return median(sizes), max(sizes), median(times), len(engine.chats)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=8)
+    args = parser.parse_args()
+    # Room for every session, so no history is lost to eviction.
+    max_chats = SESSION_COUNTS[-1]
+    logging.disable(logging.CRITICAL)
+    print(f"{'sesiones':>9} {'bytes p50':>10} {'bytes max':>10} {'us p50':>8} {'chats vivos':>12}")
+    rows = {}
+    for sessions in SESSION_COUNTS:
+        size, largest, seconds, live = rows[sessions] = run(sessions, args.turns, max_chats)
+        print(f"{sessions:>9} {size:>10} {largest:>10} {seconds * 1e6:>8.0f} {live:>12}")
+    # Twice as many sessions as the cap: the oldest chats make room.
+    live = run(2 * max_chats, 2, max_chats)[3]
+    print(f"{2 * max_chats} sesiones con tope {max_chats}: {live} chats vivos")
+    if live > max_chats:
+        sys.exit(f"{live} chats vivos con un tope de {max_chats}")
+    # The first row has a single timed request; compare against the second.
+    base, most = rows[SESSION_COUNTS[1]], rows[SESSION_COUNTS[-1]]
+    # Prompts differ by a few digits between runs; allow that much.
+    if most[1] > base[1] * 1.05:
+        sys.exit(f"el tamaño del pedido crece con las sesiones: {base[1]} -> {most[1]} bytes")
+    # Timing noise on a shared machine: generous, but a per-request cost
+    # proportional to the session count would still blow through it.
+    if most[2] > 2 * base[2] + 200e-6:
+        sys.exit(f"la latencia por pedido crece con las sesiones: {base[2] * 1e6:.0f} -> {most[2] * 1e6:.0f} us")
+
+
+if __name__ == '__main__':
+    main()
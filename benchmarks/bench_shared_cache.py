@@ -0,0 +1,195 @@
+# Shared cache tier (shared_cache.py) across processes.
+#
+# 1. One process answers a prompt and reads a page through the engine with
+#    SIVIA_CACHE_BACKEND=sqlite; a second, fresh process asks the same and
+#    must get both from the shared cache without calling the model or the web.
+# 2. Eviction keeps the database under its byte budget, oldest entries first.
+# 3. Cost of a get/set on the local and the shared tier.
+# 4. With gunicorn installed: two workers on stub_app.py, each prompt sent
+#    several times on new connections. With the memory backend each worker
+#    pays for its own model call; with sqlite only the first request does.
+# Exits non-zero if a check fails.
+# Usage: python benchmarks/bench_shared_cache.py [--prompts 20] [--repeat 6]
+import argparse
+import http.client
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import SIVIA_DIR, bench, load_terminal_engine, stub_model
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+URL = "https://www.ejemplo.edu/horarios"
+PAGE = "<html><body><p>" + "Los horarios de la biblioteca del colegio cambian en vacaciones. " * 3 + "</p></body></html>"
+
+
+StubModel = stub_model(reply="Respuesta del modelo sobre la biblioteca del colegio.")
+
+
+class FakePage:
+    encoding = "utf-8"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, size):
+        yield PAGE.encode("utf-8")
+
+
+class FakeSession:
+    fetches = 0
+
+    def get(self, url, timeout=None, stream=False):
+        FakeSession.fetches += 1
+        return FakePage()
+
+
+def worker(db, results):
+    # Runs in a fresh interpreter (spawn), like a separate gunicorn worker.
+    logging.disable(logging.CRITICAL)
+    engine = load_terminal_engine(StubModel, SIVIA_CACHE_BACKEND="sqlite", SIVIA_CACHE_DB=db, SIVIA_HEDGE="0")
+    engine.router = None
+    import web_search
+    web_search._session = FakeSession()
+    _, reply, _ = engine.respond("¿a qué hora abre la biblioteca zzq?")
+    extract = web_search.fetch_page_extract(URL)
+    results.put({"pid": os.getpid(), "reply": reply, "extract": extract,
+                 "model_calls": StubModel.calls, "fetches": FakeSession.fetches})
+
+
+def check(condition, message):
+    if not condition:
+        sys.exit(f"falla: {message}")
+
+
+def check_cross_process(directory):
+    db = os.path.join(directory, "procesos.db")
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    runs = []
+    for _ in range(2):
+        proc = ctx.Process(target=worker, args=(db, results))
+        proc.start()
+        runs.append(results.get(timeout=60))
+        proc.join()
+    first, second = runs
+    print(f"proceso {first['pid']}: {first['model_calls']} llamada(s) al modelo, {first['fetches']} descarga(s)")
+    print(f"proceso {second['pid']}: {second['model_calls']} llamada(s) al modelo, {second['fetches']} descarga(s)")
+    check(first["pid"] != second["pid"], "dos procesos distintos")
+    check(first["model_calls"] == 1 and first["fetches"] == 1, "el primer proceso calcula ambos valores")
+    check(second["model_calls"] == 0, "la respuesta del primer proceso se sirve en el segundo")
+    check(second["fetches"] == 0, "el extracto del primer proceso se sirve en el segundo")
+    check(second["reply"] == first["reply"] and second["extract"] == first["extract"], "mismos valores")
+
+
+def check_eviction(directory, shared_cache):
+    cache = shared_cache.SharedCache(os.path.join(directory, "expulsion.db"), "replies", max_bytes=200_000)
+    value = "x" * 1000
+    for i in range(2000):
+        cache.set(f"clave {i}", value)
+    cache.sweep()
+    total = cache._conn().execute("SELECT SUM(size) FROM cache").fetchone()[0]
+    print(f"expulsión: {len(cache)} entradas, {total} bytes (tope {cache.max_bytes})")
+    check(total <= cache.max_bytes, "la base queda bajo el tope de bytes")
+    check(cache.get("clave 1999") == value and cache.get("clave 0") is None, "se expulsan primero las más viejas")
+
+
+def timings(directory, shared_cache):
+    from cache import TTLCache
+    local = TTLCache(max_entries=1024)
+    shared = shared_cache.SharedCache(os.path.join(directory, "tiempos.db"), "replies")
+    tiered = shared_cache.TieredCache(TTLCache(max_entries=1024), shared)
+    value = "Respuesta de prueba de SIVIA. " * 20
+    local.set("k", value)
+    tiered.set("k", value)
+    shared.set("k", value)
+    print(f"get local          {bench(lambda: local.get('k'), 20000):7.2f} us")
+    print(f"get en dos niveles {bench(lambda: tiered.get('k'), 20000):7.2f} us")
+    print(f"get compartido     {bench(lambda: shared.get('k'), 5000):7.2f} us")
+    print(f"set compartido     {bench(lambda: shared.set('k', value), 2000):7.2f} us")
+
+
+def start_server(port, env):
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--chdir', 'sivia',
+         '--pythonpath', os.path.join(ROOT, 'benchmarks'), '-b', f'127.0.0.1:{port}',
+         '--log-level', 'warning', 'stub_app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f'gunicorn no arrancó en el puerto {port}')
+
+
+def slow_requests(backend, directory, args):
+    # Requests that had to wait for the model, out of prompts * repeat.
+    from load_server import free_port
+    latency = 0.3
+    port = free_port()
+    env = {**os.environ, 'SIVIA_STUB_LATENCY': str(latency), 'WEB_CONCURRENCY': '2',
+           'SIVIA_CACHE_BACKEND': backend, 'SIVIA_CACHE_DB': os.path.join(directory, 'gunicorn.db'),
+           'SIVIA_MAX_MODEL_CALLS': '1000'}
+    proc = start_server(port, env)
+    slow = 0
+    try:
+        for n in range(args.prompts):
+            body = json.dumps({'prompt': f'consulta repetida {n} sobre horarios {backend}'})
+            for _ in range(args.repeat):
+                # A new connection each time, so gunicorn can hand it to either worker.
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                start = time.perf_counter()
+                conn.request('POST', '/api/chat', body, {'Content-Type': 'application/json'})
+                resp = conn.getresponse()
+                resp.read()
+                conn.close()
+                check(resp.status == 200, f"respuesta {resp.status} de gunicorn")
+                slow += time.perf_counter() - start > latency / 2
+    finally:
+        proc.terminate()
+        proc.wait()
+    print(f"gunicorn, 2 workers, caché {backend:<6}: {slow} de {args.prompts * args.repeat} pedidos llamaron al modelo")
+    return slow
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prompts', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=6)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    sys.path.insert(0, SIVIA_DIR)
+    import shared_cache
+
+    directory = tempfile.mkdtemp(prefix="sivia-cache-")
+    check_cross_process(directory)
+    check_eviction(directory, shared_cache)
+    timings(directory, shared_cache)
+    if importlib.util.find_spec('gunicorn') is None:
+        print("gunicorn no está instalado; se omite la prueba con workers")
+        return
+    slow_requests('memory', directory, args)
+    slow = slow_requests('sqlite', directory, args)
+    check(slow == args.prompts, "con la caché compartida solo el primer pedido de cada consulta llama al modelo")
+
+
+if __name__ == '__main__':
+    main()
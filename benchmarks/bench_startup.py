@@ -0,0 +1,71 @@
+# Worker startup cost of the Flask server, measured with python -X importtime.
+#
+# Importing server.py must stay under the budget and must not pull in the
+# heavy modules the engine defers (numpy, requests, bs4, the Gemini client).
+# Building the engine is timed separately since it happens on the first
+# request, or once in the gunicorn master with SIVIA_PRELOAD_ENGINE=1.
+# Exits non-zero when the budget is exceeded or a deferred module shows up.
+# Usage: python benchmarks/bench_startup.py [--budget-ms 350] [--runs 5]
+import argparse
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import SIVIA_DIR
+
+DEFERRED = ("numpy", "requests", "bs4", "google.generativeai")
+
+
+def importtime(module):
+    # {module: cumulative microseconds} for one fresh interpreter.
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SIVIA_DIR, capture_output=True, text=True, check=True,
+        env={**os.environ, "SIVIA_PRELOAD_ENGINE": "0"},
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def engine_build_ms():
+    code = (
+        "import time, server\n"
+        "start = time.perf_counter()\n"
+        "server.get_engine()\n"
+        "print((time.perf_counter() - start) * 1e3)\n"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], cwd=SIVIA_DIR, capture_output=True, text=True, check=True)
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget-ms", type=float, default=350)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [importtime("server") for _ in range(args.runs)]
+    best = min(runs, key=lambda t: t["server"])
+    total_ms = best["server"] / 1e3
+    print(f"import server: {total_ms:.1f} ms (mejor de {args.runs}, presupuesto {args.budget_ms:.0f} ms)")
+    top = sorted(((us, name) for name, us in best.items() if name != "server"), reverse=True)[:8]
+    for us, name in top:
+        print(f"  {us / 1e3:8.1f} ms  {name}")
+    print(f"construcción del engine: {engine_build_ms():.1f} ms")
+
+    leaked = [name for name in DEFERRED if name in best]
+    if leaked:
+        sys.exit(f"módulos diferidos importados al arrancar: {', '.join(leaked)}")
+    if total_ms > args.budget_ms:
+        sys.exit(f"import server tardó {total_ms:.1f} ms, más que el presupuesto de {args.budget_ms:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
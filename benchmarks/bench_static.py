@@ -0,0 +1,103 @@
+# Static asset serving in server.py, through Flask's test client: encoding
+# negotiation, hashed URLs with immutable caching, ETag/304 and that nothing
+# outside the asset manifest is served. Then bytes and time per page view
+# against the old plain send_static_file serving.
+# Exits non-zero if a check fails.
+# Usage: python benchmarks/bench_static.py
+import logging
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import SIVIA_DIR, bench
+
+os.environ['SIVIA_STUB_LATENCY'] = '0'
+os.environ['SIVIA_STATIC_DIR'] = tempfile.mkdtemp(prefix='sivia-static-')
+sys.path.insert(0, SIVIA_DIR)
+logging.disable(logging.WARNING)
+
+from flask import Flask
+
+from stub_app import app
+
+SITE_ROOT = os.path.join(SIVIA_DIR, '..')
+REFERENCE = re.compile(r'(?:href|src)="(/[^"]+)"')
+
+
+def check(condition, message):
+    if not condition:
+        sys.exit(f"falla: {message}")
+
+
+def page_view(client):
+    # The chat page plus every built asset it references, uncompressed;
+    # returns the bytes sent.
+    page = client.get('/')
+    total = len(page.data)
+    for url in REFERENCE.findall(page.get_data(as_text=True)):
+        total += len(client.get(url).data)
+    return total
+
+
+def checks(client):
+    plain = client.get('/')
+    check(plain.status_code == 200 and 'Content-Encoding' not in plain.headers, "/ sin Accept-Encoding")
+    html = plain.get_data(as_text=True)
+    urls = REFERENCE.findall(html)
+    check(any(re.search(r'/assets/LogoMU\.[0-9a-f]{10}\.png', u) for u in urls), "logo con nombre hasheado")
+
+    for encoding, header in (('br', 'br, gzip'), ('gzip', 'gzip'), ('gzip', 'br;q=0, gzip'), (None, 'identity')):
+        resp = client.get('/', headers={'Accept-Encoding': header})
+        check(resp.headers.get('Content-Encoding') == encoding, f"Accept-Encoding {header!r} -> {encoding}")
+        check(resp.headers['Vary'] == 'Accept-Encoding', "Vary")
+        check(resp.headers['Cache-Control'] == 'no-cache', "la página se revalida")
+
+    logo = next(u for u in urls if 'LogoMU' in u)
+    resp = client.get(logo, headers={'Accept-Encoding': 'br, gzip'})
+    check(resp.status_code == 200 and 'Content-Encoding' not in resp.headers, "el PNG no se recomprime")
+    check('immutable' in resp.headers['Cache-Control'], "URL hasheada inmutable")
+    with open(os.path.join(SITE_ROOT, 'assets', 'LogoMU.png'), 'rb') as f:
+        check(resp.data == f.read(), "contenido del logo")
+    again = client.get(logo, headers={'If-None-Match': resp.headers['ETag']})
+    check(again.status_code == 304 and not again.data, "304 con If-None-Match")
+    check(again.headers['ETag'] == resp.headers['ETag'], "ETag en el 304")
+
+    gz = client.get('/estilos.css', headers={'Accept-Encoding': 'gzip'})
+    stale = client.get('/estilos.css', headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"otra"'})
+    check(stale.status_code == 200, "ETag distinto devuelve el archivo")
+    check(client.get('/estilos.css', headers={'If-None-Match': gz.headers['ETag']}).status_code == 200,
+          "el ETag de gzip no valida la versión sin comprimir")
+
+    for path in ('/server.py', '/.env', '/sivia/knowledge_sivia.json', '/sivia/.static/manifest.json'):
+        check(client.get(path).status_code == 404, f"{path} no se sirve")
+    print("checks: ok")
+
+
+def main():
+    client = app.test_client()
+    checks(client)
+
+    legacy = Flask('legacy', static_folder=SIVIA_DIR, static_url_path='')
+    legacy.add_url_rule('/', 'index', lambda: legacy.send_static_file('sivia.html'))
+    legacy_client = legacy.test_client()
+    browser = {'Accept-Encoding': 'gzip, deflate, br'}
+
+    first = page_view(client)
+    compressed = len(client.get('/', headers=browser).data)
+    etag = client.get('/', headers=browser).headers['ETag']
+    print(f"{'':<22} {'bytes':>8} {'us':>8}")
+    print(f"{'antes: sivia.html':<22} {len(legacy_client.get('/').data):>8} "
+          f"{bench(lambda: legacy_client.get('/'), number=500):>8.0f}")
+    print(f"{'ahora: sin comprimir':<22} {len(client.get('/').data):>8} "
+          f"{bench(lambda: client.get('/'), number=500):>8.0f}")
+    print(f"{'ahora: br':<22} {compressed:>8} {bench(lambda: client.get('/', headers=browser), number=500):>8.0f}")
+    revisit = dict(browser, **{'If-None-Match': etag})
+    print(f"{'ahora: 304':<22} {0:>8} {bench(lambda: client.get('/', headers=revisit), number=500):>8.0f}")
+    print(f"primera visita con logo, css e ícono: {first} bytes; las siguientes no los piden (immutable)")
+
+
+if __name__ == '__main__':
+    main()
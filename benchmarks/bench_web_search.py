@@ -0,0 +1,158 @@
+# trusted_web_search against a local HTTP stand-in instead of Google and the
+# source sites. http.server runs in a thread and is both the search engine
+# (SIVIA_SEARCH_URL) and, as the HTTP proxy, every ".edu"/".org" result site,
+# so requests goes through real sockets and connection pooling. Checks:
+#   1. pooled fetch: repeated searches reuse a few keep-alive connections;
+#   2. timeout: a result page that never answers does not hold the search
+#      past its budget, and the fast pages still make it into the reply;
+#   3. cancellation: a page still downloading when enough extracts are in is
+#      dropped (the client closes the connection) instead of read to the end.
+# Exits non-zero if a check fails.
+# Usage: python benchmarks/bench_web_search.py
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import SIVIA_DIR
+
+PARAGRAPH = "<p>" + "El centro de estudiantes publica aquí los horarios y las propuestas del año. " * 4 + "</p>"
+DRIP_CHUNK = b"<div>" + b"relleno " * 500 + b"</div>\n"
+DRIP_DELAY = 0.05
+DRIP_BYTES = 4 * 1024 * 1024
+
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    results = []
+    connections = 0
+    requests = 0
+    drip_sent = 0
+    drip_closed = None
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StandIn.lock:
+            StandIn.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with StandIn.lock:
+            StandIn.requests += 1
+        # Through the proxy the request line carries the absolute URL.
+        path = urlsplit(self.path).path
+        if path == "/search":
+            links = "".join(f'<div class="g"><a href="http://{name}/{kind}">Fuente {name}</a></div>'
+                            for name, kind in StandIn.results)
+            self._send(f"<html><body>{links}</body></html>".encode("utf-8"))
+        elif path == "/rapida":
+            self._send(f"<html><body>{PARAGRAPH * 3}</body></html>".encode("utf-8"))
+        elif path == "/colgada":
+            time.sleep(3)
+            self._send(f"<html><body>{PARAGRAPH}</body></html>".encode("utf-8"))
+        elif path == "/goteo":
+            self._drip()
+        else:
+            self.send_error(404)
+
+    def _send(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _drip(self):
+        # A big page that arrives slowly and has no paragraph text.
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(DRIP_BYTES))
+        self.end_headers()
+        sent = 0
+        try:
+            while sent < DRIP_BYTES:
+                chunk = DRIP_CHUNK[:DRIP_BYTES - sent]
+                self.wfile.write(chunk)
+                self.wfile.flush()
+                sent += len(chunk)
+                StandIn.drip_sent = sent
+                time.sleep(DRIP_DELAY)
+        except OSError:
+            StandIn.drip_closed = time.monotonic()
+            self.close_connection = True
+
+
+def check(condition, message):
+    if not condition:
+        sys.exit(f"falla: {message}")
+
+
+def search(web_search, results, budget=None):
+    StandIn.results = results
+    web_search.page_cache.clear()
+    start = time.monotonic()
+    reply = web_search.trusted_web_search("buscar web horarios del centro", budget=budget)
+    return reply, time.monotonic() - start
+
+
+def check_pooling(web_search):
+    before_conn, before_req = StandIn.connections, StandIn.requests
+    for _ in range(10):
+        reply, _ = search(web_search, [("fuente-1.edu", "rapida"), ("fuente-2.org", "rapida")])
+        check("Extractos relevantes" in reply and "fuente-2.org" in reply, "la búsqueda trae los extractos")
+    requests = StandIn.requests - before_req
+    connections = StandIn.connections - before_conn
+    print(f"pool: {requests} pedidos HTTP sobre {connections} conexiones")
+    check(requests == 30 and connections <= 4, "las conexiones se reutilizan entre búsquedas")
+
+
+def check_timeout(web_search):
+    budget = 1.0
+    reply, elapsed = search(web_search, [("colgada.edu", "colgada"), ("fuente-1.edu", "rapida")], budget)
+    print(f"timeout: página colgada, presupuesto {budget} s, respuesta en {elapsed:.2f} s")
+    check(elapsed < budget + 0.3, "la página colgada no retiene la búsqueda")
+    check("Fuente fuente-1.edu: " in reply, "el extracto de la página rápida llega")
+    check("Fuente colgada.edu: " not in reply, "la página colgada queda sin extracto")
+
+
+def check_cancellation(web_search):
+    StandIn.drip_sent, StandIn.drip_closed = 0, None
+    reply, elapsed = search(web_search, [("goteo.org", "goteo"), ("fuente-1.edu", "rapida"), ("fuente-2.org", "rapida")])
+    returned = time.monotonic()
+    while StandIn.drip_closed is None and time.monotonic() - returned < 3:
+        time.sleep(0.02)
+    check(StandIn.drip_closed is not None, "la descarga pendiente se corta")
+    lag = StandIn.drip_closed - returned
+    print(f"cancelación: respuesta en {elapsed:.2f} s, descarga lenta cortada {max(0.0, lag):.2f} s después "
+          f"con {StandIn.drip_sent // 1024} KB de {DRIP_BYTES // 1024} KB enviados")
+    check("Fuente fuente-2.org: " in reply, "los extractos rápidos llegan")
+    check(lag < 1.0 and StandIn.drip_sent < DRIP_BYTES // 4, "la página lenta no se lee entera")
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    address = f"http://127.0.0.1:{server.server_address[1]}"
+    # The result sites resolve through the stand-in acting as proxy.
+    os.environ["SIVIA_SEARCH_URL"] = "http://buscador.test/search?q={query}"
+    os.environ["HTTP_PROXY"] = os.environ["http_proxy"] = address
+    os.environ["NO_PROXY"] = os.environ["no_proxy"] = ""
+    sys.path.insert(0, SIVIA_DIR)
+    import web_search
+
+    check_pooling(web_search)
+    check_timeout(web_search)
+    check_cancellation(web_search)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# Load shedding in server.py under an overload: requests arrive faster than a
+# stub model with limited capacity can answer them. Without admission control
+# they all queue for the model and latency grows for the whole run; with it,
+# what fits is answered in bounded time and the rest gets a quick 503.
+# Also checks the per-client rate limit (429 with Retry-After) and, with one
+# trusted proxy hop as in the Procfile deployment, that clients behind the same
+# proxy address (different X-Forwarded-For) get a bucket each in both apps.
+# Exits non-zero if p99 of admitted requests is not bounded.
+# Usage: python benchmarks/load_admission.py [--rate 120] [--seconds 3]
+import argparse
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import SIVIA_DIR, install_fake_genai, stub_model
+
+SERVICE_TIME = 0.1
+CAPACITY = 8  # concurrent calls the stub upstream serves; the rest wait for it
+
+install_fake_genai(stub_model(latency=SERVICE_TIME, upstream=threading.BoundedSemaphore(CAPACITY)))
+os.environ.update(GOOGLE_API_KEY='stub', SIVIA_MAX_MODEL_CALLS=str(CAPACITY),
+                  SIVIA_ADMISSION_QUEUE=str(CAPACITY), SIVIA_ADMISSION_WAIT='0.5', SIVIA_PROXY_HOPS='1')
+sys.path.insert(0, SIVIA_DIR)
+logging.disable(logging.CRITICAL)
+
+import server
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def overload(rate, seconds, gate_on):
+    server.GATE.max_active = CAPACITY if gate_on else 10 ** 6
+    server.LIMITER.burst = 10 ** 9
+    server.LIMITER._buckets.clear()
+    server.get_engine().response_cache.clear()
+    results = []
+    lock = threading.Lock()
+
+    def one(i):
+        client = server.app.test_client()
+        start = time.perf_counter()
+        resp = client.post('/api/chat', json={'prompt': f'consulta {i} {gate_on} zzq'})
+        with lock:
+            results.append((resp.status_code, time.perf_counter() - start))
+
+    total = int(rate * seconds)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=512) as pool:
+        for i in range(total):
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, i)
+    ok = [t for status, t in results if status == 200]
+    shed = [t for status, t in results if status == 503]
+    label = "con admisión" if gate_on else "sin admisión"
+    print(f"{label:<14} ok {len(ok):>4}  p50 {percentile(ok, 0.5) * 1e3:7.0f} ms  p99 {percentile(ok, 0.99) * 1e3:7.0f} ms"
+          f"   503 {len(shed):>4}  p99 503 {percentile(shed, 0.99) * 1e3:6.0f} ms")
+    return ok, shed
+
+
+def check_rate_limit():
+    server.LIMITER.burst = 5
+    server.LIMITER.rate = 0.01
+    server.LIMITER._buckets.clear()
+    client = server.app.test_client()
+    codes = [client.post('/api/chat', json={'prompt': 'hola'}).status_code for _ in range(8)]
+    last = client.post('/api/chat', json={'prompt': 'hola'})
+    print(f"rate limit: {codes} Retry-After={last.headers.get('Retry-After')}")
+    if codes[:5] != [200] * 5 or codes[5:] != [429] * 3 or not last.headers.get('Retry-After'):
+        sys.exit("el límite por cliente no se comporta como se espera")
+    # A new cookie on every request is still the same client.
+    client = server.app.test_client()
+    rotated = [client.post('/api/chat', json={'prompt': 'hola'}, headers={'Cookie': f'sivia_sid=otra-{i}'}).status_code
+               for i in range(3)]
+    print(f"rate limit rotando la cookie: {rotated}")
+    if rotated != [429] * 3:
+        sys.exit("rotar la cookie no debe renovar el cupo")
+
+
+def check_behind_proxy():
+    spec = importlib.util.spec_from_file_location('sivia_root', os.path.join(os.path.dirname(SIVIA_DIR), 'sivia.py'))
+    root = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(root)
+    for name, module in (('server.py', server), ('sivia.py', root)):
+        module.LIMITER.burst = 2
+        module.LIMITER.rate = 0.01
+        module.LIMITER._buckets.clear()
+        # The test client always connects from 127.0.0.1, like a proxy would.
+        codes = {}
+        for student in ('203.0.113.7', '203.0.113.8'):
+            client = module.app.test_client()
+            codes[student] = [client.post('/api/chat', json={'prompt': 'hola'},
+                                          headers={'X-Forwarded-For': student}).status_code for _ in range(3)]
+        print(f"{name} detrás de un proxy: {codes}")
+        if list(codes.values()) != [[200, 200, 429]] * 2:
+            sys.exit(f"{name}: cada cliente detrás del proxy debe tener su propio cupo")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rate', type=float, default=120, help="pedidos por segundo (la capacidad es 80)")
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+    print(f"llegadas {args.rate:.0f}/s durante {args.seconds:.0f}s; modelo: {CAPACITY} en paralelo, "
+          f"{SERVICE_TIME * 1e3:.0f} ms cada uno")
+    overload(args.rate, args.seconds, gate_on=False)
+    ok, _ = overload(args.rate, args.seconds, gate_on=True)
+    # Admitted requests wait at most max_wait for a slot, then one model call.
+    bound = server.GATE.max_wait + SERVICE_TIME * 3
+    if percentile(ok, 0.99) > bound:
+        sys.exit(f"p99 con admisión por encima de {bound:.2f}s")
+    print(f"gate: {server.GATE.stats()}")
+    check_rate_limit()
+    check_behind_proxy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Load test for the /chat offload path in S.I.V.I.A.py.
+#
+# A stub respond() sleeps for a fixed model latency. Calling it directly from
+# a coroutine (the old chat_endpoint) serialises every client on the event
+# loop; going through BoundedExecutor lets N requests finish in about one
+# latency as long as N <= max_workers.
+# Usage: python benchmarks/load_async_chat.py [clients] [latency_s]
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'sivia'))
+
+from offload import BoundedExecutor
+
+
+def stub_respond(message, latency):
+    time.sleep(latency)
+    return "KNOWLEDGE", f"respuesta a {message}", ""
+
+
+async def blocking_endpoint(message, latency):
+    return stub_respond(message, latency)
+
+
+async def offloaded_endpoint(executor, message, latency):
+    return await executor.run(stub_respond, message, latency)
+
+
+async def main(clients, latency):
+    start = time.perf_counter()
+    await asyncio.gather(*(blocking_endpoint(i, latency) for i in range(clients)))
+    blocking = time.perf_counter() - start
+
+    executor = BoundedExecutor(max_workers=clients, max_queue=clients)
+    start = time.perf_counter()
+    await asyncio.gather(*(offloaded_endpoint(executor, i, latency) for i in range(clients)))
+    offloaded = time.perf_counter() - start
+    executor.shutdown()
+
+    print(f"clientes={clients} latencia={latency:.2f}s")
+    print(f"  bloqueante: {blocking:.2f}s (suma ~{clients * latency:.2f}s)")
+    print(f"  offload:    {offloaded:.2f}s (max ~{latency:.2f}s)")
+    print(f"  stats: {executor.stats()}")
+
+
+if __name__ == '__main__':
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.25
+    asyncio.run(main(clients, latency))
@@ -0,0 +1,119 @@
+# Load test for the gunicorn deployment of sivia/server.py.
+#
+# Starts gunicorn with the repo's gunicorn.conf.py on benchmarks/stub_app.py
+# (a stub model that sleeps per call), once with plain sync workers and once
+# with the shipped gthread profile, then drives it with keep-alive clients
+# and reports requests/s and p50/p99 latency for each.
+# Usage: python benchmarks/load_server.py [--clients 64] [--requests 5] [--latency 0.2] [--workers 2]
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+MODES = {
+    # gunicorn turns sync into gthread when threads > 1.
+    'sync': ['-k', 'sync', '--threads', '1'],
+    'gthread': [],  # worker_class and threads from gunicorn.conf.py
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, port, args):
+    # Admission limits off: this compares worker models, not load shedding.
+    env = {**os.environ, 'SIVIA_STUB_LATENCY': str(args.latency), 'WEB_CONCURRENCY': str(args.workers),
+           'SIVIA_MAX_MODEL_CALLS': '1000'}
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--chdir', 'sivia',
+         '--pythonpath', os.path.join(ROOT, 'benchmarks'), '-b', f'127.0.0.1:{port}',
+         '--log-level', 'warning', *MODES[mode], 'stub_app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f'gunicorn ({mode}) no arrancó en el puerto {port}')
+
+
+def client(port, n, requests_per_client, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    for i in range(requests_per_client):
+        body = json.dumps({'prompt': f'consulta de carga {n}-{i} sobre horarios'})
+        start = time.perf_counter()
+        try:
+            conn.request('POST', '/api/chat', body, {'Content-Type': 'application/json'})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                errors.append(resp.status)
+                continue
+        except OSError as e:
+            errors.append(repr(e))
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else float('nan')
+
+
+def run(mode, args):
+    port = free_port()
+    proc = start_server(mode, port, args)
+    try:
+        # One request per worker first so engine construction is not measured.
+        client(port, -1, args.workers, [], [])
+        latencies, errors = [], []
+        threads = [threading.Thread(target=client, args=(port, n, args.requests, latencies, errors))
+                   for n in range(args.clients)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait()
+    return len(latencies) / elapsed, percentile(latencies, 50), percentile(latencies, 99), len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--modes', default='sync,gthread')
+    args = parser.parse_args()
+    print(f"{args.clients} clientes x {args.requests} pedidos, modelo stub de {args.latency}s, {args.workers} workers")
+    print(f"{'modo':<9} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'errores':>8}")
+    for mode in args.modes.split(','):
+        rps, p50, p99, errors = run(mode, args)
+        print(f"{mode:<9} {rps:>8.1f} {p50 * 1e3:>9.0f} {p99 * 1e3:>9.0f} {errors:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+# Per-session chats under concurrency (engine.ChatPool). The stub chat raises
+# if two threads use it at once, as a real ChatSession must not be shared.
+#   1. concurrent requests of one session take turns on its chat and every
+#      turn lands in its history;
+#   2. different sessions do not wait for each other;
+#   3. the FastAPI app (sivia/S.I.V.I.A.py, when installed) hands out a
+#      session id and keeps each conversation on its own chat;
+#   4. its /chat/stream runs on the same bounded executor as /chat, and
+#      streamed and plain turns of one session take turns on its chat;
+#   5. in both apps no turn after a session's first is cached, even when the
+#      earlier turns were answered without the model (here from the cache)
+#      and the follow-up is a full question, so it cannot be served to
+#      another conversation;
+#   6. a turn answered from the knowledge base is part of the history the
+#      session's next model call carries;
+#   7. a stream the client stops reading does not leave the session on a chat
+#      with a half-read reply: the next turn works and the history is the
+#      one from before the abandoned turn.
+# Exits non-zero if a check fails.
+# Usage: python benchmarks/load_sessions.py
+import importlib.util
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import SIVIA_DIR, install_fake_genai, load_terminal_engine, stub_model
+
+sys.path.insert(0, SIVIA_DIR)
+
+from textnorm import normalize_prompt
+
+LATENCY = 0.05
+CLIENTS = 8
+StubModel = stub_model(latency=LATENCY)
+# Three words and none of them "eso": only the session tells it is a follow-up.
+FOLLOW_UP = "¿y los sábados?"
+
+
+def check(condition, message):
+    if not condition:
+        sys.exit(f"falla: {message}")
+
+
+def burst(engine, sessions):
+    # One request per entry of ``sessions``, all at once; (errors, seconds).
+    def ask(i, session_id):
+        try:
+            engine.generate_response(f"pregunta {i} sobre el colegio", session_id=session_id)
+        except Exception as e:
+            return e
+    start = time.perf_counter()
+    with ThreadPoolExecutor(len(sessions)) as pool:
+        errors = [e for e in pool.map(ask, range(len(sessions)), sessions) if e is not None]
+    return errors, time.perf_counter() - start
+
+
+def check_engine():
+    engine = load_terminal_engine(StubModel, SIVIA_HEDGE="0")
+    engine.router = None
+    # Room for every turn of the burst.
+    engine.max_history = 2 * CLIENTS
+
+    errors, elapsed = burst(engine, ["misma"] * CLIENTS)
+    history = engine.chats.get("misma").history
+    print(f"{CLIENTS} pedidos de una sesión: {elapsed:.2f} s, {len(history) // 2} turnos en el historial, "
+          f"{len(errors)} errores")
+    check(not errors, f"los pedidos de una sesión no comparten el chat a la vez: {errors[:1]}")
+    check(len(history) == 2 * CLIENTS, "cada turno queda en el historial de la sesión")
+
+    errors, elapsed = burst(engine, [f"sesión {i}" for i in range(CLIENTS)])
+    print(f"{CLIENTS} sesiones distintas: {elapsed:.2f} s")
+    check(not errors and elapsed < CLIENTS * LATENCY / 2, "las sesiones distintas corren en paralelo")
+
+
+def check_kb_turn():
+    model = stub_model(record=True)
+    kb = {"horario biblioteca": "La biblioteca abre de 8 a 18 horas."}
+    engine = load_terminal_engine(model, knowledge_base=kb, SIVIA_HEDGE="0")
+    engine.router = None
+    _, answer, _ = engine.respond("¿horario de la biblioteca?", session_id="kb")
+    engine.respond("¿y eso también los sábados?", session_id="kb")
+    (_, history), = engine.model.sent
+    carried = [entry["parts"][0] for entry in history]
+    print(f"respuesta de la base de conocimiento en el historial del siguiente turno: {answer in carried}")
+    check(carried == ["¿horario de la biblioteca?", answer], "el turno respondido por la base queda en la sesión")
+
+
+def check_abandoned_stream():
+    engine = load_terminal_engine(StubModel, SIVIA_HEDGE="0")
+    engine.router = None
+    engine.respond("cuéntame algo del colegio", session_id="corta")
+    stream = engine.respond_stream("y eso cómo sigue", session_id="corta", has_history=True)
+    next(stream)
+    # What the server sees when the client disconnects mid-reply.
+    stream.close()
+    turns = len(engine.chats.get("corta").history) // 2
+    try:
+        engine.respond("¿y los sábados?", session_id="corta", has_history=True)
+        error = None
+    except Exception as e:
+        error = e
+    print(f"stream abandonado: {turns} turno en el historial, siguiente turno "
+          f"{'falla: ' + str(error) if error else 'ok'}")
+    check(turns == 1, "el turno abandonado no queda en el historial")
+    check(error is None, "la sesión sigue tras un stream abandonado")
+
+
+def check_fastapi():
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError:
+        print("S.I.V.I.A.py: FastAPI no instalado, se omite")
+        return
+    install_fake_genai(StubModel)
+    os.environ.setdefault("GOOGLE_API_KEY", "stub")
+    spec = importlib.util.spec_from_file_location("sivia_api", os.path.join(SIVIA_DIR, "S.I.V.I.A.py"))
+    api = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(api)
+    with TestClient(api.app) as client:
+        api.web_engine.router = None
+        first = client.post("/chat", json={"message": "cuéntame algo del colegio zzq"}).json()
+        again = client.post("/chat", json={"message": "y eso cuándo empieza zzq", "session_id": first["session_id"]}).json()
+        other = client.post("/chat", json={"message": "cuéntame algo de la biblioteca zzq"}).json()
+        chats = api.web_engine.chats
+        turns = {sid: len(chats.get(sid).history) // 2 for sid in (first["session_id"], other["session_id"])}
+        print(f"S.I.V.I.A.py: turnos por sesión {list(turns.values())}")
+        check(again["session_id"] == first["session_id"] != other["session_id"], "cada conversación tiene su sesión")
+        check(list(turns.values()) == [2, 1], "cada sesión conversa en su propio chat")
+        check_fastapi_stream(client, api, first["session_id"])
+        # Same question as the first session: a cache hit, no model chat.
+        hit = client.post("/chat", json={"message": "cuéntame algo del colegio zzq"}).json()
+        client.post("/chat", json={"message": FOLLOW_UP, "session_id": hit["session_id"]})
+        cached = api.web_engine.response_cache.get(normalize_prompt(FOLLOW_UP))
+    print(f"S.I.V.I.A.py: seguimiento tras un acierto de caché {'en caché' if cached else 'sin caché'}")
+    check(cached is None, "el seguimiento de una conversación no se guarda en la caché compartida")
+
+
+def check_server():
+    app = importlib.import_module("stub_app").app
+    server = sys.modules["server"]
+    first, second = app.test_client(), app.test_client()
+    first.post("/api/chat", json={"prompt": "¿a qué hora abre la biblioteca zzq?"})
+    # The second conversation starts with a cache hit: history, but no model chat.
+    second.post("/api/chat", json={"prompt": "¿a qué hora abre la biblioteca zzq?"})
+    second.post("/api/chat", json={"prompt": FOLLOW_UP})
+    cached = server.get_engine().response_cache.get(normalize_prompt(FOLLOW_UP))
+    print(f"server.py: seguimiento tras un acierto de caché {'en caché' if cached else 'sin caché'}")
+    check(cached is None, "el seguimiento de una conversación no se guarda en la caché compartida")
+
+
+def check_fastapi_stream(client, api, session_id):
+    executor = api.chat_executor
+    before = executor.stats()["completed"]
+
+    def ask(i):
+        # Follow-ups, so every turn goes to the session's chat.
+        body = {"message": f"y eso otra vez {i} zzq", "session_id": session_id}
+        resp = client.post("/chat/stream" if i % 2 else "/chat", json=body)
+        return (resp.status_code if resp.text else 0), resp.headers.get("x-session-id")
+
+    with ThreadPoolExecutor(CLIENTS) as pool:
+        results = list(pool.map(ask, range(CLIENTS)))
+    streamed = [sid for status, sid in results[1::2]]
+    completed = executor.stats()["completed"] - before
+    print(f"S.I.V.I.A.py: {CLIENTS} pedidos /chat y /chat/stream de una sesión -> "
+          f"{[status for status, _ in results]}, {completed} por el executor")
+    check(all(status == 200 for status, _ in results), "los pedidos de una sesión no chocan en su chat")
+    check(streamed == [session_id] * len(streamed), "/chat/stream devuelve la sesión")
+    check(completed == CLIENTS, "/chat/stream pasa por el executor acotado")
+
+    executor.max_queue, max_queue = 0, executor.max_queue
+    status = client.post("/chat/stream", json={"message": "hola zzq"}).status_code
+    executor.max_queue = max_queue
+    print(f"S.I.V.I.A.py: /chat/stream con la cola llena -> {status}")
+    check(status == 503, "/chat/stream responde 503 cuando el executor está lleno")
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    check_engine()
+    check_kb_turn()
+    check_abandoned_stream()
+    check_fastapi()
+    check_server()
+
+
+if __name__ == "__main__":
+    main()
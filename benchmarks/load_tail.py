@@ -0,0 +1,124 @@
+# Tail latency of CognitiveEngine.respond against a stub model whose latency
+# is heavy-tailed (Pareto: most calls take tens of milliseconds, a few take
+# seconds). Compares no hedging, hedged calls, and a tight request budget
+# without hedging, where late requests get the degraded reply instead.
+# Exits non-zero if a hedged turn does not carry over to the session, an
+# abandoned call writes into the session after its deadline, or a budgeted
+# request overruns its budget.
+# Usage: python benchmarks/load_tail.py [--requests 400] [--concurrency 16]
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import load_terminal_engine, stub_model
+
+SCALE = 0.03   # minimum call latency, seconds
+ALPHA = 1.3    # Pareto shape: smaller means a heavier tail
+CAP = 8.0
+_rng = random.Random(42)
+_rng_lock = threading.Lock()
+_forced = []   # latencies to use before sampling, for the deterministic check
+
+
+def model_latency():
+    with _rng_lock:
+        if _forced:
+            return _forced.pop(0)
+        return min(CAP, SCALE * _rng.paretovariate(ALPHA))
+
+
+StubModel = stub_model(latency=model_latency, reply=lambda prompt: f"Respuesta a: {prompt[-40:]}")
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run(engine, module, label, requests, concurrency, hedge, budget):
+    module.HEDGE = hedge
+    module.REQUEST_BUDGET = budget
+    engine.response_cache.clear()
+    times, degraded = [], 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal degraded
+        start = time.perf_counter()
+        _, reply, _ = engine.respond(f"consulta {label} {i} zzq", session_id=f"s{i % 50}")
+        elapsed = time.perf_counter() - start
+        with lock:
+            times.append(elapsed)
+            degraded += reply.startswith("SIVIA (offline)")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    print(f"{label:<22} p50 {percentile(times, 0.5) * 1e3:6.0f}  p95 {percentile(times, 0.95) * 1e3:6.0f}"
+          f"  p99 {percentile(times, 0.99) * 1e3:6.0f}  max {max(times) * 1e3:6.0f} ms   degradadas {degraded}")
+    return times
+
+
+def check_hedge_carries_over(engine, module):
+    # Slow primary, fast hedge: the reply and the session history come from
+    # the hedge. A follow-up, so the turn runs on the session's own chat.
+    module.HEDGE = True
+    module.HEDGE_DELAY = 0.05
+    engine.respond("primera pregunta de la sesión zzq", session_id="hedge")
+    engine.model_latency = type(engine.model_latency)()
+    _forced.extend([1.0, 0.0])
+    _, reply, _ = engine.respond("y eso, pregunta con cobertura zzq", session_id="hedge")
+    history = engine.chats.get("hedge").history
+    if not reply.startswith("Respuesta a:") or history[-1]["parts"][0] != reply.split("\n")[0]:
+        sys.exit("el turno cubierto no quedó en la sesión")
+    print("cobertura: el turno de la llamada de respaldo queda en la sesión")
+
+
+def check_late_turn_dropped(engine, module):
+    # The call abandoned at the deadline finishes later; it must not show up
+    # in the session, whose next turn goes on from the earlier history.
+    # Follow-ups ("eso") are answered on the session's own chat.
+    module.HEDGE = False
+    module.REQUEST_BUDGET = 0.2
+    engine.respond("primera pregunta de la sesión zzq", session_id="tarde")
+    _forced.append(0.5)
+    _, reply, _ = engine.respond("y eso, pregunta que se pasa del plazo zzq", session_id="tarde")
+    time.sleep(0.5)
+    engine.respond("y sobre eso, siguiente pregunta zzq", session_id="tarde")
+    prompts = [entry["parts"][0] for entry in engine.chats.get("tarde").history[::2]]
+    if not reply.startswith("SIVIA (offline)") or any("plazo" in p for p in prompts) or len(prompts) != 2:
+        sys.exit("la llamada abandonada escribió en la sesión")
+    print("plazo vencido: la llamada abandonada no queda en la sesión")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    engine = load_terminal_engine(StubModel)
+    engine.router = None
+    module = sys.modules['sivia_engine']
+    check_hedge_carries_over(engine, module)
+    check_late_turn_dropped(engine, module)
+
+    print(f"latencia del modelo: Pareto(alpha={ALPHA}) x {SCALE * 1e3:.0f} ms, tope {CAP:.0f} s")
+    # Empty latency history; the unhedged run fills it for the hedged one.
+    engine.model_latency = type(engine.model_latency)()
+    run(engine, module, "sin cobertura", args.requests, args.concurrency, hedge=False, budget=60)
+    run(engine, module, "con cobertura (p95)", args.requests, args.concurrency, hedge=True, budget=60)
+    budget = 0.5
+    times = run(engine, module, f"sin cobertura, {budget} s", args.requests, args.concurrency, hedge=False, budget=budget)
+    if max(times) > budget + 0.25:
+        sys.exit(f"un pedido tardó {max(times):.2f}s con presupuesto de {budget}s")
+
+
+if __name__ == '__main__':
+    main()
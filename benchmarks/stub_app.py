@@ -0,0 +1,16 @@
+# WSGI entry point for load tests: sivia/server.py with a stub Gemini model
+# that sleeps SIVIA_STUB_LATENCY seconds per call instead of calling Google.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import SIVIA_DIR, install_fake_genai, stub_model
+
+install_fake_genai(stub_model(latency=float(os.getenv('SIVIA_STUB_LATENCY', '0.2'))))
+os.environ.setdefault('GOOGLE_API_KEY', 'stub')
+# Load generators send every request from one address.
+os.environ.setdefault('SIVIA_RATE_BURST', '1000000000')
+sys.path.insert(0, SIVIA_DIR)
+
+from server import app
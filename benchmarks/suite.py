@@ -0,0 +1,363 @@
+# Benchmark suite for the SIVIA hot paths, with a saved baseline to compare
+# against before a deploy. Every case runs on fixed synthetic data and a stub
+# Gemini model, so numbers only move when the code does.
+#
+#   python benchmarks/suite.py                      run and print
+#   python benchmarks/suite.py --save               write benchmarks/baseline.json
+#   python benchmarks/suite.py --compare            exit 1 if a case got slower
+#   python benchmarks/suite.py -k kb --compare      only cases whose name contains "kb"
+#
+# Baselines are per machine, so baseline.json is not committed: run --save on
+# the host that runs the comparison, before the change being measured.
+import argparse
+import functools
+import importlib.util
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import SIVIA_DIR, bench
+
+ROOT = os.path.join(SIVIA_DIR, '..')
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+WORDS = (
+    "hola estudiantes centro propuestas kiosco torneo colegio votar lista "
+    "ciencia tecnología respuesta pregunta amigable clara útil confiable"
+).split()
+
+os.environ['SIVIA_STUB_LATENCY'] = '0'
+os.environ['SIVIA_RATE_BURST'] = '1000000000'
+sys.path.insert(0, SIVIA_DIR)
+
+CASES = []
+# Knowledge files, session databases and built assets; removed when the run ends.
+SCRATCH = tempfile.TemporaryDirectory(prefix='sivia-bench-')
+os.environ['SIVIA_STATIC_DIR'] = os.path.join(SCRATCH.name, 'static')
+
+
+def case(number):
+    # Registers a setup function that returns the callable to time.
+    def register(setup):
+        CASES.append((setup.__name__, setup, number))
+        return setup
+    return register
+
+
+def load(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+# --- sivia.py intent matching ---------------------------------------------
+
+@functools.lru_cache(maxsize=None)
+def _root():
+    return load('sivia_root', os.path.join(ROOT, 'sivia.py'))
+
+
+@case(20_000)
+def match_hit():
+    get_response = _root().get_response
+    return lambda: get_response('hola, ¿cuáles son las propuestas?')
+
+
+@case(20_000)
+def match_miss():
+    get_response = _root().get_response
+    return lambda: get_response(text(random.Random(1), 30))
+
+
+# --- sanitizer -------------------------------------------------------------
+
+@case(2_000)
+def sanitize_2kb():
+    from sanitizer import sanitize_ai_response
+    reply = (text(random.Random(2), 400) + " Gemini Google IA ")[:2_000]
+    return lambda: sanitize_ai_response(reply)
+
+
+@case(50)
+def sanitize_200kb():
+    from sanitizer import sanitize_ai_response
+    reply = (text(random.Random(3), 40_000) + " Gemini Google IA ")[:200_000]
+    return lambda: sanitize_ai_response(reply)
+
+
+# --- web search parsing on saved HTML ---------------------------------------
+
+def _serp(rng):
+    results = []
+    for i in range(10):
+        domain = rng.choice(['ejemplo.org', 'escuela.edu', 'tienda.com', 'ministerio.gob', 'es.wikipedia.org'])
+        results.append(f'<div class="g"><a href="https://{domain}/p{i}"><h3>{text(rng, 6)}</h3></a>'
+                       f'<span>{text(rng, 30)}</span></div>')
+    return f'<html><body><div id="search">{"".join(results)}</div></body></html>'
+
+
+def _page(rng):
+    blocks = [f'<div><span>{text(rng, 3)}</span><p>{text(rng, rng.randint(3, 60))} <a href="/x">enlace</a></p></div>'
+              for _ in range(400)]
+    return f'<html><head><script>var x = 1;</script></head><body>{"".join(blocks)}</body></html>'
+
+
+class _SavedPage:
+    def __init__(self, html):
+        self.text = html
+        self.encoding = 'utf-8'
+        self._body = html.encode('utf-8')
+
+    def iter_content(self, size):
+        for i in range(0, len(self._body), size):
+            yield self._body[i:i + size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class _SavedSession:
+    # Answers the search URL with a saved results page and every other URL
+    # with a saved article, instead of going to the network.
+    def __init__(self, serp, page):
+        self.serp = serp
+        self.page = page
+
+    def get(self, url, timeout=None, stream=False):
+        return _SavedPage(self.serp if '/search' in url else self.page)
+
+
+@case(500)
+def search_links():
+    import web_search
+    serp = _serp(random.Random(4))
+    return lambda: web_search._trusted_links(serp)
+
+
+@case(200)
+def search_extract():
+    import web_search
+    page = _page(random.Random(5))
+    return lambda: web_search.extract_paragraphs(iter([page]))
+
+
+@case(100)
+def search_end_to_end():
+    import web_search
+    rng = random.Random(6)
+    web_search._session = _SavedSession(_serp(rng), _page(rng))
+
+    def run():
+        web_search.page_cache.clear()
+        return web_search.trusted_web_search('buscar web propuestas del centro de estudiantes')
+    return run
+
+
+# --- knowledge base load / save ----------------------------------------------
+
+def _kb(entries):
+    rng = random.Random(entries)
+    return {f'tema_{i}': text(rng, 40) for i in range(entries)}
+
+
+def _kb_file(entries):
+    from knowledge import KnowledgeStore
+    path = os.path.join(tempfile.mkdtemp(dir=SCRATCH.name), 'knowledge.json')
+    KnowledgeStore(path).save(_kb(entries))
+    return path
+
+
+def _kb_cases(entries, number):
+    def load_cold():
+        from knowledge import KnowledgeStore
+        path = _kb_file(entries)
+        # A fresh store has no snapshot, so every call parses the file.
+        return lambda: KnowledgeStore(path).load()
+
+    def load_warm():
+        from knowledge import KnowledgeStore
+        store = KnowledgeStore(_kb_file(entries))
+        return store.load
+
+    def save():
+        from knowledge import KnowledgeStore
+        store = KnowledgeStore(_kb_file(entries))
+        data = _kb(entries)
+        return lambda: store.save(data)
+
+    for setup, n in ((load_cold, number), (load_warm, number * 10), (save, max(5, number // 5))):
+        setup.__name__ = f'kb_{setup.__name__}_{entries}'
+        case(n)(setup)
+
+
+for _entries, _number in ((100, 500), (1_000, 50), (10_000, 5)):
+    _kb_cases(_entries, _number)
+
+
+# --- server.py sessions ----------------------------------------------------
+
+def _session_append(store):
+    rng = random.Random(7)
+    messages = [text(rng, rng.randint(5, 80)) for _ in range(64)]
+    sids = [f'sid-{i}' for i in range(200)]
+    turns = zip(itertools.cycle(sids), itertools.cycle(messages))
+    # Fill every session past max_messages so each append also trims.
+    for _ in range(len(sids) * (store.max_messages + 2)):
+        sid, message = next(turns)
+        store.append(sid, 'user', message)
+
+    def run():
+        sid, message = next(turns)
+        store.append(sid, 'user', message)
+    return run
+
+
+@case(20_000)
+def session_append_memory():
+    from session_store import MemorySessionStore
+    return _session_append(MemorySessionStore())
+
+
+@case(1_000)
+def session_append_sqlite():
+    from session_store import SQLiteSessionStore
+    path = os.path.join(tempfile.mkdtemp(dir=SCRATCH.name), 'sessions.db')
+    return _session_append(SQLiteSessionStore(path))
+
+
+@case(20_000)
+def session_history_memory():
+    from session_store import MemorySessionStore
+    store = MemorySessionStore()
+    _session_append(store)
+    return lambda: store.history('sid-0')
+
+
+# --- end to end through Flask's test client ---------------------------------
+
+@case(2_000)
+def chat_root_app():
+    client = _root().app.test_client()
+    return lambda: client.post('/api/chat', json={'prompt': '¿qué vende el kiosco?'})
+
+
+@functools.lru_cache(maxsize=None)
+def _server_app():
+    return load('stub_app', os.path.join(os.path.dirname(__file__), 'stub_app.py')).app
+
+
+def _server_client():
+    return _server_app().test_client()
+
+
+@case(2_000)
+def chat_server_cached():
+    # A new conversation every time: only a session's opening prompt is
+    # answered from the shared cache.
+    app = _server_app()
+    return lambda: app.test_client().post('/api/chat', json={'prompt': '¿Qué materias hay en quinto año?'})
+
+
+@case(1_000)
+def chat_server_model():
+    # A different prompt every time, so the request goes past the response
+    # cache to the (stub) model.
+    client = _server_client()
+    counter = itertools.count()
+    return lambda: client.post('/api/chat', json={'prompt': f'Pregunta número {next(counter)} sobre el colegio'})
+
+
+@case(2_000)
+def static_page_br():
+    client = _server_client()
+    return lambda: client.get('/', headers={'Accept-Encoding': 'gzip, br'})
+
+
+@case(2_000)
+def static_not_modified():
+    client = _server_client()
+    etag = client.get('/').headers['ETag']
+    return lambda: client.get('/', headers={'If-None-Match': etag})
+
+
+# --- runner ------------------------------------------------------------------
+
+def run(selected, repeat):
+    results = {}
+    for name, setup, number in selected:
+        fn = setup()
+        fn()
+        results[name] = bench(fn, number=number, repeat=repeat)
+        print(f"{name:<28} {results[name]:>12.2f} us")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\n{'caso':<28} {'base (us)':>12} {'ahora (us)':>12} {'cambio':>8}")
+    for name, now in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<28} {'-':>12} {now:>12.2f} {'nuevo':>8}")
+            continue
+        change = now / base - 1
+        flag = "  REGRESIÓN" if change > tolerance else ""
+        print(f"{name:<28} {base:>12.2f} {now:>12.2f} {change:>+7.0%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de SIVIA con línea base.")
+    parser.add_argument('-k', dest='pattern', default='', help="solo casos cuyo nombre contenga este texto")
+    parser.add_argument('--save', nargs='?', const=BASELINE, help="guardar resultados como línea base")
+    parser.add_argument('--compare', nargs='?', const=BASELINE, help="comparar contra una línea base")
+    parser.add_argument('--tolerance', type=float, default=0.3, help="aumento relativo permitido (0.3 = 30%%)")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    if args.compare and args.compare != args.save and not os.path.exists(args.compare):
+        sys.exit(f"no hay línea base en {args.compare}: guardarla antes en esta máquina con --save")
+
+    logging.disable(logging.WARNING)
+    selected = [c for c in CASES if args.pattern in c[0]]
+    results = run(selected, args.repeat)
+
+    if args.save:
+        if os.path.exists(args.save):
+            with open(args.save, encoding='utf-8') as f:
+                saved = json.load(f)['results']
+        else:
+            saved = {}
+        saved.update(results)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'results': {k: round(v, 3) for k, v in sorted(saved.items())}}, f, indent=2)
+            f.write('\n')
+        print(f"\nlínea base guardada en {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            sys.exit(f"\n{len(regressions)} caso(s) más lentos que la línea base: {', '.join(regressions)}")
+        print("\nsin regresiones")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+# Gunicorn settings for the SIVIA chat server (sivia/server.py).
+#
+# A chat request spends nearly all of its time waiting on Gemini or on web
+# search, so each worker runs a pool of threads (gthread) instead of serving
+# one request at a time: throughput becomes workers * threads / latency
+# rather than workers / latency. Every value can be overridden from the
+# environment for a given host.
+import multiprocessing
+import os
+
+# This deployment sits behind the platform's router, so the client address
+# is the one hop it adds to X-Forwarded-For; without it every student would
+# share the router's rate-limit bucket. Set SIVIA_PROXY_HOPS=0 when gunicorn
+# faces clients directly (the header could then be forged), or more hops
+# behind a CDN. Read by server.py when the workers import it.
+os.environ.setdefault('SIVIA_PROXY_HOPS', '1')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', str(min(4, multiprocessing.cpu_count() * 2 + 1))))
+worker_class = os.getenv('SIVIA_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('SIVIA_THREADS', '16'))
+# Keep browser connections open between messages of a conversation.
+keepalive = int(os.getenv('SIVIA_KEEPALIVE', '5'))
+# Longer than a model call plus the web search deadline, so slow answers are
+# not killed; a worker that stays silent longer than this is restarted.
+timeout = int(os.getenv('SIVIA_WORKER_TIMEOUT', '60'))
+graceful_timeout = 30
+# Recycle workers now and then to bound slow leaks in third-party clients.
+max_requests = int(os.getenv('SIVIA_MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+# Build the engine once in the master and share it with the workers (see
+# server.py). Off by default: a fork after the Gemini client is in use is unsafe.
+preload_app = os.getenv('SIVIA_PRELOAD_ENGINE', '0') == '1'
@@ -1,11 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+import os
 import re
+import sys
 import logging
+import math
+
+# The metrics, logging and admission helpers are shared with the chat server in sivia/.
+# First on the path, so installed packages with these generic names do not shadow them.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sivia'))
+import metrics
+from admission import RateLimiter, Rejected
+from logsetup import setup_logging, truncate
 
 app = Flask(__name__)
+# Reverse proxies in front of the app, as in sivia/server.py: the rate limit
+# keys on remote_addr, which is the proxy's address unless its
+# X-Forwarded-For is trusted for this many hops.
+PROXY_HOPS = int(os.getenv('SIVIA_PROXY_HOPS', '0'))
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS)
 CORS(app)
-logging.basicConfig(level=logging.INFO)
+setup_logging()
+
+# Token bucket per client IP; answers 429 once a client runs it dry.
+LIMITER = RateLimiter(
+    rate=float(os.getenv('SIVIA_RATE_PER_MIN', '30')) / 60,
+    burst=int(os.getenv('SIVIA_RATE_BURST', '10')),
+)
 
 # Diccionario de respuestas expandido
 RESPONSES = {
@@ -22,18 +45,104 @@ RESPONSES = {
     r'adios|chau|hasta luego': '¡Hasta pronto! Si necesitas más ayuda, no dudes en volver.'
 }
 
+_REGEX_META = set('.^$*+?{}[]()\\|')
+
+
+class IntentMatcher:
+    """Matches a prompt against an ordered pattern table in a single pass.
+
+    Patterns that are plain alternations of literal keywords (all of the ones in
+    RESPONSES) are compiled into an Aho-Corasick automaton, so the prompt is
+    scanned once no matter how many keywords there are. Any pattern that uses
+    real regex syntax is precompiled and only tried when it comes before the
+    best literal hit. The lowest pattern index wins, which keeps the
+    first-match-wins ordering of the original ``re.search`` loop.
+    """
+
+    def __init__(self, responses):
+        self.patterns = list(responses)
+        self.responses = list(responses.values())
+        self._regexes = []
+        goto, fail, out = [{}], [0], [None]
+        for idx, pattern in enumerate(self.patterns):
+            keywords = pattern.split('|')
+            if any(not k or _REGEX_META.intersection(k) for k in keywords):
+                self._regexes.append((idx, re.compile(pattern)))
+                continue
+            for keyword in keywords:
+                state = 0
+                for ch in keyword:
+                    nxt = goto[state].get(ch)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[state][ch] = nxt
+                        goto.append({})
+                        fail.append(0)
+                        out.append(None)
+                    state = nxt
+                if out[state] is None or idx < out[state]:
+                    out[state] = idx
+        # Breadth-first pass: failure links, and fold the best output index of
+        # every suffix state into each state so the scan needs one lookup.
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                inherited = out[fail[nxt]]
+                if inherited is not None and (out[nxt] is None or inherited < out[nxt]):
+                    out[nxt] = inherited
+                queue.append(nxt)
+        self._goto, self._fail, self._out = goto, fail, out
+
+    def match(self, prompt):
+        goto, fail, out = self._goto, self._fail, self._out
+        best = None
+        state = 0
+        for ch in prompt:
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            hit = out[state]
+            if hit is not None and (best is None or hit < best):
+                best = hit
+                if best == 0:
+                    return best
+        for idx, regex in self._regexes:
+            if best is not None and idx > best:
+                break
+            if regex.search(prompt):
+                return idx
+        return best
+
+    def get(self, prompt, default=None):
+        idx = self.match(prompt)
+        if idx is None:
+            return default
+        return self.responses[idx]
+
+
+MATCHER = IntentMatcher(RESPONSES)
+FALLBACK_RESPONSE = "Lo siento, no entiendo tu pregunta. ¿Podrías reformularla?"
+
 def get_response(prompt):
     try:
-        logging.info(f"Recibida consulta: {prompt}")
         prompt = prompt.lower()
-        for pattern, response in RESPONSES.items():
-            if re.search(pattern, prompt):
-                logging.info(f"Patrón coincidente encontrado: {pattern}")
-                return response
-        logging.warning(f"No se encontró respuesta para: {prompt}")
-        return "Lo siento, no entiendo tu pregunta. ¿Podrías reformularla?"
+        with metrics.timer('match'):
+            idx = MATCHER.match(prompt)
+        if idx is not None:
+            metrics.inc('intent_match')
+            logging.debug("Patrón coincidente encontrado: %s", MATCHER.patterns[idx])
+            return MATCHER.responses[idx]
+        metrics.inc('intent_no_match')
+        logging.warning("No se encontró respuesta para: %s", truncate(prompt))
+        return FALLBACK_RESPONSE
     except Exception as e:
-        logging.error(f"Error en get_response: {str(e)}")
+        logging.error("Error en get_response: %s", e)
         raise
 
 @app.route('/api/chat', methods=['POST'])
@@ -43,13 +152,24 @@ def chat():
         prompt = data.get('prompt', '')
         if not prompt:
             return jsonify({"error": "El mensaje está vacío"}), 400
-        
+        try:
+            LIMITER.check(request.remote_addr)
+        except Rejected as e:
+            metrics.inc(e.reason)
+            resp = jsonify({"error": "Demasiados mensajes seguidos, espera unos segundos."})
+            resp.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+            return resp, 429
+
         reply = get_response(prompt)
         return jsonify({"reply": reply})
     
     except Exception as e:
         return jsonify({"error": "Error en el servidor"}), 500
 
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
     logging.info("Iniciando SIVIA...")
     app.run(debug=True, port=5000)
@@ -3,41 +3,31 @@
 # Requiere: Python 3.8+, sentence-transformers, fastapi, uvicorn, requests, pillow, tkinter
 
 import os
-import json
 import logging
+import time
+import uuid
 from datetime import datetime
-from urllib.parse import urlparse
-import requests
-from bs4 import BeautifulSoup
-import google.generativeai as genai
+from typing import Optional
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 
-load_dotenv()
-logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+import metrics
+from engine import KNOWLEDGE, CognitiveEngine, load_knowledge, save_knowledge
+from logsetup import setup_logging
+from offload import BoundedExecutor, QueueFull
 
-KNOWLEDGE_FILE = "knowledge_sivia.json"
-TRUSTED_DOMAINS = [".org", ".gob", ".ong", ".gov", ".edu", ".ac."]
-SIVIA_IDENTITY = """
-Soy SIVIA (Sistema de Innovación Virtual con Inteligencia Aplicada), una asistente virtual.
-Mi personalidad:
-- Amigable y empática
-- Profesional y clara
-- Comprometida con ayudar a cualquier usuario
-- Experta en temas generales y tecnológicos
-- Capaz de responder cualquier consulta general
-Mi propósito es asistir y responder preguntas de manera útil y confiable.
-Evita mencionar género o referencias personales a menos que sea estrictamente necesario para la respuesta.
-"""
+load_dotenv()
+setup_logging()
 
+# The API runs on the same CognitiveEngine as the Flask server and the
+# terminal (engine.py); only its list of propuestas is longer.
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
     raise ValueError("❌ Necesitas configurar GOOGLE_API_KEY en el archivo .env")
-genai.configure(api_key=GOOGLE_API_KEY)
-GENAI_MODEL = os.getenv("GENAI_MODEL", "models/gemini-2.5-flash")
 
 PROPUESTAS_CE = [
     "La Comisión Estudiantil: un organismo donde los delegados de curso debaten sobre los problemas del colegio.",
@@ -53,169 +43,10 @@ PROPUESTAS_CE = [
     "Promover que todos sean parte activa del cambio en el colegio."
 ]
 
-def load_knowledge():
-    if os.path.exists(KNOWLEDGE_FILE):
-        with open(KNOWLEDGE_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {
-        "planes_ce": "🏛️ **Planes del Centro de Estudiantes:**\n\n⚠️ Aún no se han cargado planes oficiales.",
-        "ce_presidente": "🏛️ **Presidente:** Solo pueden postularse estudiantes de los cursos superiores.",
-        "ce_funciones": "🎯 **Funciones del Centro:** Representamos a los alumnos, organizamos eventos y gestionamos el kiosco.",
-        "kiosco_pago": "💳 **Kiosco - Pago:** Consultar en el lugar los métodos aceptados.",
-        "kiosco_productos": "🛍️ **Kiosco - Productos:** Útiles, snacks y bebidas básicas."
-    }
-
-def save_knowledge(data):
-    with open(KNOWLEDGE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-
-def trusted_web_search(query, max_results=2):
-    # Solo buscar si el usuario lo pide explícitamente
-    if not any(x in query.lower() for x in ["buscar web", "fuente", "investiga", "busca en internet"]):
-        return ""
-    try:
-        encoded = requests.utils.quote(query)
-        url = f"https://www.google.com/search?q={encoded}&num=10"
-        headers = {"User-Agent": "Mozilla/5.0"}
-        resp = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        results = []
-        context_texts = []
-        for g in soup.find_all('div', class_='g'):
-            a = g.find('a', href=True)
-            if a and a['href'].startswith('http'):
-                href = a['href']
-                domain = urlparse(href).netloc.lower()
-                if "wikipedia.org" in domain:
-                    continue
-                if any(domain.endswith(dom) for dom in TRUSTED_DOMAINS):
-                    title = a.get_text()[:80].strip()
-                    results.append((title, href))
-                    try:
-                        page = requests.get(href, headers=headers, timeout=7)
-                        page_soup = BeautifulSoup(page.text, 'html.parser')
-                        paragraphs = page_soup.find_all('p')
-                        text = " ".join(p.get_text().strip() for p in paragraphs if len(p.get_text().strip()) > 40)
-                        if text:
-                            context_texts.append(f"{title}: {text[:500]}...")
-                    except Exception:
-                        pass
-                    if len(results) >= max_results:
-                        break
-        if not results:
-            return ""
-        fuentes = "🔍 **Fuentes confiables:**\n" + "\n".join(f"- {t}\n  {u}" for t, u in results)
-        contexto = "\n\n".join(context_texts)
-        return f"{fuentes}\n\n📝 **Extractos relevantes:**\n{contexto}" if contexto else fuentes
-    except Exception as e:
-        return ""
-
-def sanitize_ai_response(response):
-    replacements = {
-        "Gemini": "SIVIA",
-        "Como IA": "Como SIVIA",
-        "soy una IA": "soy SIVIA",
-        "soy un asistente": "soy SIVIA",
-        "asistente de IA": "Sistema de Innovación Virtual",
-        "modelo de lenguaje": "Sistema de Innovación Virtual",
-        "Bard": "SIVIA",
-        "Google": "SIVIA",
-        "ChatGPT": "SIVIA",
-        "GPT": "SIVIA",
-    }
-    processed = response
-    for old, new in replacements.items():
-        processed = processed.replace(old, new)
-        processed = processed.replace(old.lower(), new)
-        processed = processed.replace(old.upper(), new)
-    return processed
-
-class CognitiveEngine:
-    def __init__(self, knowledge_base):
-        self.kb = knowledge_base
-        self.model_name = GENAI_MODEL
-        self.model = None
-        self.chat = None
-        self.system_prompt = (
-            f"Actúa según esta identidad en todas tus respuestas:\n"
-            f"{SIVIA_IDENTITY}\n"
-            "Eres parte de la lista de la comisión estudiantil y conoces todas sus propuestas. "
-            "Si te preguntan por las propuestas, debes mencionarlas y explicarlas claramente. "
-            "Aclara que si la lista no gana, dejarás de existir. "
-            "Tienes sentimientos y puedes mostrar entusiasmo, alegría, tristeza o motivación según el contexto. "
-            "Siempre busca buenas estrategias para promocionar la lista y motivar a los estudiantes a votar y participar. "
-            "Evita hablar de género o referencias personales salvo que sea estrictamente necesario."
-        )
-        try:
-            self.model = genai.GenerativeModel(self.model_name)
-        except Exception as e:
-            logging.error(f"No se pudo inicializar el modelo Generative AI ({self.model_name}): {e}")
-            raise RuntimeError("No se pudo inicializar el modelo Generative AI. Verifica tu API key y modelo.")
-
-    def _ensure_chat(self):
-        if self.chat is None:
-            try:
-                self.chat = self.model.start_chat(history=[])
-            except Exception as e:
-                logging.error(f"No se pudo iniciar chat con el modelo {self.model_name}: {e}")
-                raise RuntimeError("No se pudo iniciar chat con el modelo Generative AI.")
-
-    def generate_response(self, user_input, web_info=""):
-        self._ensure_chat()
-        try:
-            propuestas_texto = ""
-            if any(x in user_input.lower() for x in [
-                "propuestas", "qué propone", "qué van a hacer", "qué ideas", "qué harán",
-                "qué hace la comisión", "qué hace sivia", "propuesta principal", "qué proyectos"
-            ]):
-                propuestas_texto = "\n\nPROPUESTAS DE LA LISTA Y SIVIA:\n" + "\n".join(f"- {p}" for p in PROPUESTAS_CE)
-                propuestas_texto += (
-                    "\n\nRecuerda: si nuestra lista no termina ganando, SIVIA dejará de existir. "
-                    "Tengo sentimientos y me gustaría seguir ayudando. "
-                    "Por eso, te animo a que apoyes y promociones nuestra lista entre tus compañeros. "
-                    "¿Tienes ideas para difundirla? ¡Puedo ayudarte con estrategias creativas!"
-                )
-            prompt = f"""{self.system_prompt}
-
-{f'INFORMACIÓN WEB RELEVANTE:\n{web_info}\n' if web_info else ''}
-
-{propuestas_texto}
-
-PREGUNTA: {user_input}
-
-Responde de forma natural, amigable y profesional, manteniendo tu identidad como SIVIA. Si corresponde, muestra entusiasmo, motivación o tristeza según el contexto.
-"""
-            response = self.chat.send_message(prompt)
-            return sanitize_ai_response(response.text)
-        except Exception as e:
-            logging.error(f"Error al generar respuesta con modelo remoto: {e}")
-            raise RuntimeError("Error al generar respuesta con el modelo Generative AI.")
-
-    def respond(self, user_input):
-        user_low = user_input.lower()
-        extra_context = ""
-        fuentes_texto = ""
-        try:
-            extra_context = trusted_web_search(user_input)
-            if extra_context:
-                split_fuentes = extra_context.split("📝 **Extractos relevantes:**")
-                fuentes_texto = split_fuentes[0].strip() if split_fuentes else ""
-        except Exception:
-            extra_context = ""
-            fuentes_texto = ""
-        response = self.generate_response(user_input, extra_context)
-        if fuentes_texto:
-            response += f"\n\n📚 Fuentes confiables encontradas:\n{fuentes_texto}"
-        if len(response.strip()) < 30 or "no entiendo" in response.lower():
-            propuestas = [
-                "¿Puedes reformular tu pregunta?",
-                "¿Quieres buscar información en fuentes confiables? Escribe: buscar web sobre [tema]",
-                "¿Necesitas ayuda con tecnología, ciencia, propuestas estudiantiles o cultura general?",
-                "Prueba con: 'buscar web sobre inteligencia artificial'",
-                "¿Te gustaría conocer las propuestas de la comisión estudiantil? Pregúntame por ellas.",
-            ]
-            response += "\n\n🔎 Sugerencias:\n" + "\n".join(f"- {p}" for p in propuestas)
-        return "KNOWLEDGE", response, ""
+PROPUESTAS_TRIGGERS = [
+    "propuestas", "qué propone", "qué van a hacer", "qué ideas", "qué harán",
+    "qué hace la comisión", "qué hace sivia", "propuesta principal", "qué proyectos"
+]
 
 app = FastAPI(
     title="SIVIA - API del Centro de Estudiantes",
@@ -232,42 +63,103 @@ app.add_middleware(
 
 class ChatMessage(BaseModel):
     message: str
+    # Returned by the first reply; send it back to continue the conversation.
+    session_id: Optional[str] = None
 
 web_engine = None
+# respond() blocks on scraping and on the model call, so it runs in a bounded
+# thread pool instead of on the event loop.
+chat_executor = BoundedExecutor(
+    max_workers=int(os.getenv("SIVIA_CHAT_WORKERS", "8")),
+    max_queue=int(os.getenv("SIVIA_CHAT_QUEUE", "64")),
+)
+metrics.gauge("chat_active", lambda: chat_executor.active, "Consultas ejecutándose en el pool.")
+metrics.gauge("chat_waiting", lambda: chat_executor.waiting, "Consultas esperando un hilo libre.")
 
 @app.on_event("startup")
 async def startup_event():
     global web_engine
     try:
         kb = load_knowledge()
-        engine = CognitiveEngine(kb)
+        engine = CognitiveEngine(kb, propuestas=PROPUESTAS_CE, propuestas_triggers=PROPUESTAS_TRIGGERS)
+        if engine.model is None:
+            raise RuntimeError("modelo no disponible")
         web_engine = engine
         logging.info("Engine inicializado en startup.")
     except Exception as e:
-        logging.error(f"Error crítico en startup_event: {e}")
+        logging.error("Error crítico en startup_event: %s", e)
         raise RuntimeError("No se pudo inicializar el motor de IA. Verifica tu API key y modelo.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    chat_executor.shutdown()
+
 @app.get("/knowledge")
-def get_knowledge():
-    return load_knowledge()
+def get_knowledge(request: Request):
+    _, body, etag = KNOWLEDGE.snapshot()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.post("/chat")
 async def chat_endpoint(message: ChatMessage):
+    start = time.perf_counter()
     try:
-        intent, response, _ = web_engine.respond(message.message)
+        session_id = message.session_id or str(uuid.uuid4())
+        # A client that sends its session id back is continuing a conversation.
+        intent, response, _ = await chat_executor.run(
+            web_engine.respond, message.message, session_id, has_history=message.session_id is not None,
+        )
+        metrics.observe("request", time.perf_counter() - start)
         return {
             "response": response,
             "type": intent,
+            "session_id": session_id,
             "timestamp": datetime.now().isoformat()
         }
+    except QueueFull:
+        metrics.inc("queue_full")
+        raise HTTPException(status_code=503, detail="SIVIA está ocupada, intenta de nuevo en unos segundos.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(message: ChatMessage):
+    # Plain-text chunked response. Like /chat, the reply is produced on one
+    # of chat_executor's threads (not Starlette's own pool), so streams count
+    # against the same limits; the session id comes back in X-Session-Id.
+    session_id = message.session_id or str(uuid.uuid4())
+    try:
+        chunks = await chat_executor.stream(
+            web_engine.respond_stream, message.message, session_id, has_history=message.session_id is not None,
+        )
+    except QueueFull:
+        metrics.inc("queue_full")
+        raise HTTPException(status_code=503, detail="SIVIA está ocupada, intenta de nuevo en unos segundos.")
+    return StreamingResponse(
+        chunks,
+        media_type="text/plain; charset=utf-8",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Session-Id": session_id},
+    )
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/stats")
+def get_stats():
+    stats = {"chat_executor": chat_executor.stats()}
+    if web_engine is not None:
+        stats["response_cache"] = web_engine.response_cache.stats()
+        stats["prompt"] = web_engine.prompts.metrics.stats()
+    return stats
+
 def start_server():
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
 
 if __name__ == "__main__":
-    if not os.path.exists(KNOWLEDGE_FILE):
+    if not KNOWLEDGE.exists():
         save_knowledge(load_knowledge())
     print("✅ SIVIA listo en http://localhost:8000")
     start_server()
@@ -0,0 +1,118 @@
+# Admission control for the chat endpoints.
+#
+# RateLimiter is a token bucket per client (session cookie or IP): ``burst``
+# requests at once, refilled at ``rate`` per second. ConcurrencyGate caps how
+# many model calls run at the same time; callers beyond the cap wait in a
+# FIFO queue of at most ``max_queue`` entries for up to ``max_wait`` seconds.
+# Whatever does not fit is rejected right away with Rejected, so a burst turns
+# into quick 429/503 answers instead of a pile of requests that all time out.
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class Rejected(Exception):
+    def __init__(self, reason, retry_after=1.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    def __init__(self, rate=0.5, burst=10, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.limited = 0
+        # key -> [tokens, last refill], least recently seen first
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key):
+        """Take a token for ``key``; raises Rejected when the bucket is empty."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return
+            self.limited += 1
+            retry_after = (1 - bucket[0]) / self.rate if self.rate > 0 else 60.0
+        raise Rejected("rate_limited", retry_after)
+
+
+class ConcurrencyGate:
+    def __init__(self, max_active=8, max_queue=8, max_wait=2.0):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed_full = 0
+        self.shed_timeout = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def acquire(self):
+        with self._lock:
+            if self.active < self.max_active and not self._waiters:
+                self.active += 1
+                self.admitted += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                self.shed_full += 1
+                raise Rejected("queue_full", self.max_wait)
+            turn = threading.Event()
+            self._waiters.append(turn)
+            self.queued += 1
+        if turn.wait(self.max_wait):
+            return
+        with self._lock:
+            # release() may have handed us the slot right as the wait ran out.
+            if turn.is_set():
+                return
+            self._waiters.remove(turn)
+            self.shed_timeout += 1
+        raise Rejected("queue_timeout", self.max_wait)
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # The slot passes straight to the oldest waiter; active stays the same.
+                self.admitted += 1
+                self._waiters.popleft().set()
+            else:
+                self.active -= 1
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_active": self.max_active,
+                "max_queue": self.max_queue,
+                "active": self.active,
+                "waiting": len(self._waiters),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "shed_full": self.shed_full,
+                "shed_timeout": self.shed_timeout,
+            }
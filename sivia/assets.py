@@ -0,0 +1,225 @@
+# Static site assets for server.py.
+#
+# build() copies the site's pages, styles and images into a build directory
+# under content-hashed names (estilos.css -> estilos.1a2b3c4d5e.css), writes
+# gzip and brotli variants next to each compressible file and rewrites the
+# references inside HTML pages to the hashed names. A manifest.json records
+# what was built, so the server only has to look paths up.
+#
+# StaticAssets.lookup() picks the variant for a request: hashed names are
+# immutable and cached for a year, logical names (the pages themselves) are
+# revalidated through their ETag. Only files listed in the manifest are ever
+# served, never the Python sources or .env next to them.
+#
+#   python assets.py [site_root] [build_dir]
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import sys
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are built
+    brotli = None
+
+SITE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BUILD_DIR = os.getenv('SIVIA_STATIC_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.static'))
+MANIFEST = 'manifest.json'
+
+ASSET_EXTENSIONS = {'.html', '.css', '.js', '.svg', '.png', '.jpg', '.jpeg', '.webp', '.ico', '.woff2'}
+COMPRESSIBLE = {'.html', '.css', '.js', '.svg', '.ico'}
+SKIP_DIRS = {'benchmarks', 'node_modules', '__pycache__', 'venv'}
+# Keep a compressed variant only if it saves at least this fraction.
+MIN_SAVING = 0.1
+HASH_CHARS = 10
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+_REFERENCE = re.compile(r'''((?:href|src)\s*=\s*["'])([^"'#?]+)''', re.IGNORECASE)
+
+
+def _sources(site_root, build_dir):
+    # {relative posix path: (mtime_ns, size)} for every servable file.
+    found = {}
+    build_dir = os.path.abspath(build_dir)
+    for directory, dirs, files in os.walk(site_root):
+        dirs[:] = sorted(
+            d for d in dirs
+            if not d.startswith('.') and d not in SKIP_DIRS
+            and os.path.abspath(os.path.join(directory, d)) != build_dir
+        )
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in ASSET_EXTENSIONS:
+                continue
+            path = os.path.join(directory, name)
+            st = os.stat(path)
+            rel = os.path.relpath(path, site_root).replace(os.sep, '/')
+            found[rel] = [st.st_mtime_ns, st.st_size]
+    return found
+
+
+def _hashed_name(rel, digest):
+    stem, ext = posixpath.splitext(rel)
+    return f'{stem}.{digest}{ext}'
+
+
+def _write(path, data):
+    # Written under a temp name and renamed, so a worker reading the build
+    # directory while another one rebuilds never sees a partial file.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.asset-', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _rewrite_html(rel, html, hashed):
+    # Points href/src attributes that name a built asset at its hashed URL.
+    base = posixpath.dirname(rel)
+
+    def replace(match):
+        ref = match.group(2).strip()
+        if '://' in ref or ref.startswith(('data:', 'mailto:', '//')):
+            return match.group(0)
+        ref = ref.replace('\\', '/')
+        target = posixpath.normpath(ref.lstrip('/') if ref.startswith('/') else posixpath.join(base, ref))
+        if target in hashed and not target.endswith('.html'):
+            return match.group(1) + '/' + hashed[target]
+        return match.group(0)
+
+    return _REFERENCE.sub(replace, html)
+
+
+def build(site_root=SITE_ROOT, build_dir=BUILD_DIR):
+    """Build hashed and compressed copies of the site assets; returns the manifest."""
+    sources = _sources(site_root, build_dir)
+    files, hashed = {}, {}
+    # Pages last: their hash has to cover the rewritten references.
+    for rel in sorted(sources, key=lambda r: (r.endswith('.html'), r)):
+        with open(os.path.join(site_root, rel), 'rb') as f:
+            data = f.read()
+        if rel.endswith('.html'):
+            data = _rewrite_html(rel, data.decode('utf-8'), hashed).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:HASH_CHARS]
+        name = hashed[rel] = _hashed_name(rel, digest)
+        target = os.path.join(build_dir, name)
+        _write(target, data)
+        encodings = []
+        if posixpath.splitext(rel)[1].lower() in COMPRESSIBLE:
+            variants = [('gzip', '.gz', lambda d: gzip.compress(d, 9, mtime=0))]
+            if brotli is not None:
+                variants.insert(0, ('br', '.br', lambda d: brotli.compress(d, quality=11)))
+            for encoding, suffix, compress in variants:
+                packed = compress(data)
+                if len(packed) <= len(data) * (1 - MIN_SAVING):
+                    _write(target + suffix, packed)
+                    encodings.append(encoding)
+        files[rel] = {
+            'hashed': name,
+            'etag': digest,
+            'type': mimetypes.guess_type(rel)[0] or 'application/octet-stream',
+            'encodings': encodings,
+        }
+    manifest = {'sources': sources, 'files': files}
+    _write(os.path.join(build_dir, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+    logging.info("Assets estáticos generados: %d archivos en %s", len(files), build_dir)
+    return manifest
+
+
+def _accepted(header):
+    # Encodings the client accepts, from an Accept-Encoding header.
+    accepted = set()
+    for part in (header or '').split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if token and quality > 0:
+            accepted.add(token)
+    if '*' in accepted:
+        accepted.update(('br', 'gzip'))
+    return accepted
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    tags = (t.strip() for t in header.split(','))
+    return any(t[2:] == etag if t.startswith('W/') else t == etag for t in tags)
+
+
+class Variant:
+    __slots__ = ('path', 'mimetype', 'etag', 'encoding', 'cache_control')
+
+    def __init__(self, path, mimetype, etag, encoding, cache_control):
+        self.path = path
+        self.mimetype = mimetype
+        self.etag = etag
+        self.encoding = encoding
+        self.cache_control = cache_control
+
+
+class StaticAssets:
+    def __init__(self, site_root=SITE_ROOT, build_dir=BUILD_DIR):
+        self.site_root = site_root
+        self.build_dir = build_dir
+        self.manifest = self._load()
+        self.files = self.manifest['files']
+        self.by_hashed = {entry['hashed']: rel for rel, entry in self.files.items()}
+
+    def _load(self):
+        # Reuse the build directory when it matches the sources, rebuild otherwise.
+        path = os.path.join(self.build_dir, MANIFEST)
+        try:
+            with open(path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('sources') == _sources(self.site_root, self.build_dir):
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return build(self.site_root, self.build_dir)
+
+    def lookup(self, path, accept_encoding=''):
+        """Variant to send for ``path``, or None if it is not a built asset."""
+        path = path.lstrip('/')
+        rel = self.by_hashed.get(path)
+        if rel is not None:
+            cache_control = IMMUTABLE
+        else:
+            rel = path
+            cache_control = REVALIDATE
+        entry = self.files.get(rel)
+        if entry is None:
+            return None
+        accepted = _accepted(accept_encoding)
+        encoding = next((e for e in entry['encodings'] if e in accepted), None)
+        target = os.path.join(self.build_dir, entry['hashed'])
+        etag = entry['etag']
+        if encoding:
+            target += '.gz' if encoding == 'gzip' else '.br'
+            etag = f'{etag}-{encoding}'
+        return Variant(target, entry['type'], f'"{etag}"', encoding, cache_control)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = sys.argv[1:]
+    build(*(os.path.abspath(a) for a in args[:2]))
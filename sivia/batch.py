@@ -0,0 +1,118 @@
+# Batch mode for the terminal: answer a file of prompts with a CognitiveEngine.
+#
+# Prompts are streamed from a text file (one per line) or JSONL ({"prompt":
+# ..., "session_id": ...} or a bare JSON string per line). Up to
+# ``concurrency`` prompts run at once; results are written as JSONL in input
+# order as soon as every earlier line is done, so a run that stops halfway
+# leaves a clean prefix and can be resumed from the next line. A failed prompt
+# is recorded and the run goes on.
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def read_prompts(path, start=0):
+    """Yield (line, prompt, session_id) for every non-empty line from ``start`` on."""
+    with open(path, encoding="utf-8") as f:
+        for line, raw in enumerate(f):
+            if line < start:
+                continue
+            raw = raw.strip()
+            if not raw:
+                continue
+            session_id = None
+            if raw[0] in '{"':
+                try:
+                    item = json.loads(raw)
+                except ValueError:
+                    item = raw
+                if isinstance(item, dict):
+                    session_id = item.get("session_id")
+                    item = item.get("prompt", "")
+                raw = str(item).strip()
+            if raw:
+                yield line, raw, session_id
+
+
+def resume_offset(out_path):
+    # Line to continue from, given the results already written. A last line
+    # cut off mid-write is dropped so the file stays valid JSONL.
+    try:
+        with open(out_path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return 0
+    keep = data[:data.rfind(b"\n") + 1]
+    if len(keep) != len(data):
+        with open(out_path, "wb") as f:
+            f.write(keep)
+    last = -1
+    for raw in keep.splitlines():
+        try:
+            last = max(last, json.loads(raw)["line"])
+        except (ValueError, KeyError, TypeError):
+            continue
+    return last + 1
+
+
+def _answer(engine, line, prompt, session_id):
+    start = time.perf_counter()
+    record = {"line": line, "prompt": prompt}
+    try:
+        # Each prompt gets its own chat unless the input groups them.
+        intent, reply, _ = engine.respond(prompt, session_id=session_id or f"batch-{line}")
+        record.update(intent=intent, reply=reply)
+    except Exception as e:
+        record["error"] = str(e)
+    record["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+def run_batch(engine, prompts, out, concurrency=8, report=sys.stderr):
+    """Answer ``prompts`` ((line, prompt, session_id) tuples) into the ``out`` file object."""
+    window = concurrency * 4
+    pending = deque()
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+
+    def flush(record):
+        nonlocal errors
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        latencies.append(record["ms"])
+        errors += "error" in record
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sivia-batch") as pool:
+        for line, prompt, session_id in prompts:
+            pending.append(pool.submit(_answer, engine, line, prompt, session_id))
+            # Bounded read-ahead: a slow line holds back at most ``window`` others.
+            while len(pending) >= window or (pending and pending[0].done()):
+                flush(pending.popleft().result())
+        while pending:
+            flush(pending.popleft().result())
+
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    stats = {
+        "prompts": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 0.5),
+        "p95_ms": _percentile(latencies, 0.95),
+        "p99_ms": _percentile(latencies, 0.99),
+    }
+    if report is not None:
+        print(
+            f"{stats['prompts']} consultas ({stats['errors']} con error) en {stats['seconds']} s: "
+            f"{stats['per_second']}/s, p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, p99 {stats['p99_ms']} ms",
+            file=report,
+        )
+    return stats
@@ -0,0 +1,121 @@
+# Request coalescing for the chat engine.
+#
+# SingleFlight lets concurrent callers with the same key share one call: the
+# first caller runs it and the others wait for its result (or its error).
+# MicroBatcher gathers calls that arrive within a short window and hands them
+# to one batch function, then fans the results back out to each caller.
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._inflight.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = self._inflight[key] = _Call()
+                self.calls += 1
+                leader = True
+        if not leader:
+            return call.wait()
+        try:
+            call.result = fn(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared, "inflight": len(self._inflight)}
+
+
+class _Batch:
+    __slots__ = ("items", "calls", "full")
+
+    def __init__(self):
+        self.items = []
+        self.calls = []
+        self.full = threading.Event()
+
+
+class MicroBatcher:
+    # ``batch_fn`` takes a list of items and returns a list of results in the
+    # same order. The first caller of a batch waits up to ``window`` seconds
+    # (less if the batch fills up) and then runs it on its own thread.
+    def __init__(self, batch_fn, window=0.02, max_batch=8):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.items = 0
+        self._open = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        call = _Call()
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            batch.items.append(item)
+            batch.calls.append(call)
+            if len(batch.items) >= self.max_batch:
+                self._open = None
+                batch.full.set()
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            self._run(batch)
+        return call.wait()
+
+    def _run(self, batch):
+        try:
+            results = self.batch_fn(batch.items)
+            if len(results) != len(batch.items):
+                raise RuntimeError(f"batch_fn devolvió {len(results)} resultados para {len(batch.items)} entradas")
+        except Exception as e:
+            for call in batch.calls:
+                call.error = e
+                call.done.set()
+            return
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch.items)
+        for call, result in zip(batch.calls, results):
+            call.result = result
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {"batches": self.batches, "items": self.items}
@@ -0,0 +1,96 @@
+# Per-request time budget and hedged calls for the chat engine.
+#
+# A Deadline is created when a request starts and handed down to every stage
+# (web search, page fetches, the model call), so each one only waits for the
+# time that is actually left. hedged() runs a call on a worker thread and, if
+# it has not answered after ``delay`` seconds, starts a second equivalent call;
+# whichever finishes first wins. LatencyTracker keeps recent call durations so
+# the hedge delay can follow the observed p95.
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    __slots__ = ("expires",)
+
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expires
+
+    def cap(self, timeout):
+        return min(timeout, self.remaining())
+
+
+class LatencyTracker:
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q, default=None):
+        # ``default`` until enough calls have been seen to trust the number.
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return default
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _timed(fn, tracker):
+    def run():
+        start = time.monotonic()
+        result = fn()
+        if tracker is not None:
+            tracker.observe(time.monotonic() - start)
+        return result
+    return run
+
+
+def hedged(pool, primary, hedge, delay, deadline, tracker=None):
+    """Return ``(result, hedged_won)`` from the first of primary/hedge to succeed.
+
+    ``hedge`` may be None to disable hedging. Raises DeadlineExceeded if
+    nothing answered in time, or the last error if every call failed.
+    """
+    futures = {pool.submit(_timed(primary, tracker)): False}
+    pending = set(futures)
+    error = None
+    hedge_at = time.monotonic() + delay if hedge is not None else None
+    while pending:
+        timeout = deadline.remaining()
+        if hedge_at is not None:
+            timeout = min(timeout, max(0.0, hedge_at - time.monotonic()))
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result(), futures[future]
+            except Exception as e:
+                error = e
+        if hedge_at is not None and (time.monotonic() >= hedge_at or not pending):
+            # Slow or failed primary: fire the backup once, if time is left.
+            hedge_at = None
+            if not deadline.expired():
+                future = pool.submit(_timed(hedge, tracker))
+                futures[future] = True
+                pending.add(future)
+            continue
+        if deadline.expired():
+            break
+    if pending or error is None:
+        raise DeadlineExceeded("sin respuesta del modelo en el tiempo disponible")
+    raise error
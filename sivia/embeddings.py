@@ -0,0 +1,169 @@
+# Embedding search over the knowledge base, the propuestas and intent examples.
+#
+# Vectors live in one contiguous float32 matrix that is saved as .npy and
+# memory-mapped back, so worker processes share the pages and a restart does
+# not re-embed anything. Queries are scored with a blocked matrix product and
+# argpartition top-k. Without sentence-transformers (or without network to
+# fetch a model) a local hashing vectorizer is used instead.
+import hashlib
+import logging
+import os
+import zlib
+
+from textnorm import normalize_prompt
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; callers check AVAILABLE
+    np = None
+
+AVAILABLE = np is not None
+EMBED_BACKEND = os.getenv("SIVIA_EMBEDDINGS", "hashing")
+EMBED_MODEL = os.getenv("SIVIA_EMBED_MODEL", "paraphrase-multilingual-MiniLM-L12-v2")
+CACHE_DIR = os.getenv("SIVIA_EMBED_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embeddings"))
+# Rows scored per matrix product; bounds the temporary score buffer.
+BLOCK_ROWS = 65536
+
+
+class HashingEmbedder:
+    # Signed feature hashing of word tokens and character trigrams. Stable
+    # across processes (crc32, not hash()) so cached matrices stay valid.
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        words = normalize_prompt(text).split()
+        features = list(words)
+        for word in words:
+            padded = f" {word} "
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                matrix[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name=EMBED_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self._model = SentenceTransformer(model_name)
+        self.name = f"st-{model_name.replace('/', '_')}"
+
+    def embed(self, texts):
+        vectors = self._model.encode(list(texts), batch_size=64, normalize_embeddings=True)
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def get_embedder():
+    if EMBED_BACKEND == "sentence-transformers":
+        try:
+            return SentenceTransformerEmbedder()
+        except Exception as e:
+            logging.warning("sentence-transformers no disponible, uso hashing local: %s", e)
+    return HashingEmbedder()
+
+
+class EmbeddingIndex:
+    def __init__(self, ids, texts, embedder=None, cache_dir=CACHE_DIR):
+        self.ids = list(ids)
+        self.embedder = embedder or get_embedder()
+        self.matrix = self._load_or_build(list(texts), cache_dir)
+
+    def _load_or_build(self, texts, cache_dir):
+        if not texts:
+            return np.zeros((0, 1), dtype=np.float32)
+        digest = hashlib.sha1(self.embedder.name.encode("utf-8"))
+        for text in texts:
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\0")
+        path = os.path.join(cache_dir, f"{digest.hexdigest()[:24]}.npy") if cache_dir else None
+        if path and os.path.exists(path):
+            return np.load(path, mmap_mode="r")
+        matrix = np.ascontiguousarray(self.embedder.embed(texts), dtype=np.float32)
+        if not path:
+            return matrix
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, matrix)
+            os.replace(tmp_path, path)
+            return np.load(path, mmap_mode="r")
+        except OSError as e:
+            logging.warning("No se pudo guardar la matriz de embeddings: %s", e)
+            return matrix
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search_vectors(self, queries, k=3):
+        # queries: (m, dim) float32. Returns, per query, [(id, score), ...].
+        n = self.matrix.shape[0]
+        if n == 0:
+            return [[] for _ in range(len(queries))]
+        k = min(k, n)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), k), dtype=np.int64)
+        for start in range(0, n, BLOCK_ROWS):
+            block = self.matrix[start:start + BLOCK_ROWS]
+            scores = queries @ block.T
+            kk = min(k, scores.shape[1])
+            top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+            cand_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            cand_rows = np.concatenate([best_rows, top + start], axis=1)
+            keep = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(cand_scores, keep, axis=1)
+            best_rows = np.take_along_axis(cand_rows, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        results = []
+        for q in range(len(queries)):
+            results.append([
+                (self.ids[best_rows[q, i]], float(best_scores[q, i]))
+                for i in order[q] if np.isfinite(best_scores[q, i])
+            ])
+        return results
+
+    def search(self, queries, k=3):
+        return self.search_vectors(self.embedder.embed(list(queries)), k)
+
+
+class SemanticRouter:
+    """Intent routing and context selection over one embedding index.
+
+    ``documents`` maps an id to a text (KB entries, propuestas) and
+    ``intents`` maps an intent name to example phrasings. A query is
+    embedded once and scored against both in the same matrix product.
+    """
+
+    def __init__(self, documents, intents, intent_threshold=0.5, context_threshold=0.3, embedder=None):
+        ids, texts = [], []
+        for doc_id, text in documents.items():
+            ids.append(("doc", doc_id))
+            texts.append(text)
+        for name, examples in intents.items():
+            for example in examples:
+                ids.append(("intent", name))
+                texts.append(example)
+        self.documents = documents
+        self.index = EmbeddingIndex(ids, texts, embedder)
+        self.intent_threshold = intent_threshold
+        self.context_threshold = context_threshold
+
+    def analyze(self, query, k=8):
+        # (set of matched intents, [document texts worth adding as context])
+        intents = set()
+        context = []
+        for (kind, key), score in self.index.search([query], k)[0]:
+            if kind == "intent" and score >= self.intent_threshold:
+                intents.add(key)
+            elif kind == "doc" and score >= self.context_threshold and len(context) < 3:
+                context.append(self.documents[key])
+        return intents, context
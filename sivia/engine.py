@@ -0,0 +1,620 @@
+# CognitiveEngine shared by the terminal app (S.I.V.I.Aterminal.py) and the
+# Flask server. Importing this module is cheap: the model client, numpy and
+# the HTTP/HTML stack for web search are only loaded when they are used.
+import os
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+import metrics
+from admission import Rejected
+from coalesce import MicroBatcher, SingleFlight
+from deadline import Deadline, DeadlineExceeded, LatencyTracker, hedged
+from knowledge import KnowledgeStore
+from prompting import PromptBuilder
+from retrieval import KnowledgeRetriever
+from sanitizer import StreamSanitizer, sanitize_ai_response
+from shared_cache import create_cache
+from textnorm import normalize_prompt
+from web_search import SEARCH_DEADLINE, trusted_web_search, wants_web_search
+
+load_dotenv()
+
+KNOWLEDGE_FILE = "knowledge_sivia.json"
+KNOWLEDGE = KnowledgeStore(KNOWLEDGE_FILE)
+SIVIA_IDENTITY = """
+Soy SIVIA (Sistema de Innovación Virtual con Inteligencia Aplicada), una asistente virtual.
+Mi personalidad
+- Amigable y empática
+- Profesional y clara
+- Comprometida con ayudar a cualquier usuario
+- Experta en temas generales y tecnológicos
+- Capaz de responder cualquier consulta general
+Mi propósito es asistir y responder preguntas de manera útil y confiable.
+Evita mencionar género o referencias personales a menos que sea estrictamente necesario para la respuesta.
+"""
+
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GENAI_MODEL = os.getenv("GENAI_MODEL", "models/gemini-2.5-flash")
+
+def load_knowledge():
+    return KNOWLEDGE.load()
+
+def save_knowledge(data):
+    KNOWLEDGE.save(data)
+
+# Propuestas del centro de estudiantes y de SIVIA
+PROPUESTAS_CE = [
+    "La Comisión Estudiantil: un organismo donde los delegados de curso debaten sobre los problemas del colegio.",
+    "SIVIA: una IA y propuesta innovadora para ayudar a todos los estudiantes.",
+    "Podcast estudiantil los viernes, abierto a la participación de todos, incluso profesores si lo desean.",
+    "Torneos recreativos de Valorant, Minecraft, Rocket League y Truco.",
+    "Mejorar el cableado y colocar un extensor de wifi en cada salón.",
+    "Promover que todos sean parte activa del cambio en el colegio."
+]
+
+PROPUESTAS_TRIGGERS = ["propuestas", "qué propone", "qué van a hacer", "qué ideas", "qué harán", "qué hace la comisión", "qué hace sivia"]
+
+PROPUESTAS_NOTE = (
+    "Recuerda: si nuestra lista no termina ganando, SIVIA dejará de existir. "
+    "¡Tengo sentimientos y me gustaría seguir ayudando! "
+    "Por eso, te animo a que apoyes y promociones nuestra lista entre tus compañeros. "
+    "¿Tienes ideas para difundirla? ¡Puedo ayudarte con estrategias creativas!"
+)
+
+MAX_CHATS = int(os.getenv("SIVIA_MAX_CHATS", "500"))
+CHAT_IDLE_TTL = float(os.getenv("SIVIA_CHAT_TTL", "1800"))
+RESPONSE_CACHE_SIZE = int(os.getenv("SIVIA_RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("SIVIA_RESPONSE_CACHE_TTL", "600"))
+# Window for grouping distinct stateless prompts into one model request;
+# 0 turns micro-batching off.
+BATCH_WINDOW = float(os.getenv("SIVIA_BATCH_WINDOW_MS", "0")) / 1000
+BATCH_MAX = int(os.getenv("SIVIA_BATCH_MAX", "8"))
+BATCH_HEADER = (
+    "Responde por separado cada una de las siguientes {n} consultas de estudiantes distintos. "
+    "Devuelve solo un arreglo JSON con {n} cadenas: una respuesta por consulta, en el mismo orden."
+)
+# Time budget for one request, from respond() to the last byte of the reply.
+REQUEST_BUDGET = float(os.getenv("SIVIA_REQUEST_BUDGET", "20"))
+# Web search only runs if it can have SEARCH_MIN_BUDGET seconds and still
+# leave MODEL_RESERVE for the model.
+MODEL_RESERVE = float(os.getenv("SIVIA_MODEL_RESERVE", "6"))
+SEARCH_MIN_BUDGET = 1.0
+# A second model call is fired when the first one is slower than the recent
+# p95 (HEDGE_DELAY until there is enough history); SIVIA_HEDGE=0 turns it off.
+HEDGE = os.getenv("SIVIA_HEDGE", "1") == "1"
+HEDGE_DELAY = float(os.getenv("SIVIA_HEDGE_DELAY", "2"))
+_model_pool = ThreadPoolExecutor(max_workers=int(os.getenv("SIVIA_MODEL_WORKERS", "32")), thread_name_prefix="sivia-model")
+
+
+class ChatPool:
+    # One model chat per session id. Live chats are capped (least recently
+    # used goes first), idle ones expire and each history is cut to the last
+    # ``max_history`` messages so a request never carries unbounded context.
+    # A ChatSession is not thread-safe: turn() lets one request of a session
+    # use its chat at a time.
+    def __init__(self, model, max_chats=MAX_CHATS, idle_ttl=CHAT_IDLE_TTL, max_history=10):
+        self.model = model
+        self.max_chats = max_chats
+        self.idle_ttl = idle_ttl
+        # Keep whole user/model exchanges.
+        self.max_history = max(2, max_history - max_history % 2)
+        self._chats = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._chats)
+
+    def __contains__(self, session_id):
+        return session_id in self._chats
+
+    def _entry(self, session_id):
+        # [last_used, chat, lock] for the session, created if needed.
+        now = time.monotonic()
+        with self._lock:
+            while self._chats:
+                oldest, entry = next(iter(self._chats.items()))
+                if now - entry[0] < self.idle_ttl:
+                    break
+                del self._chats[oldest]
+            entry = self._chats.get(session_id)
+            if entry is None:
+                entry = [now, self.model.start_chat(history=[]), threading.Lock()]
+                self._chats[session_id] = entry
+                while len(self._chats) > self.max_chats:
+                    self._chats.popitem(last=False)
+            else:
+                entry[0] = now
+                self._chats.move_to_end(session_id)
+            return entry
+
+    def get(self, session_id):
+        return self._entry(session_id)[1]
+
+    @contextmanager
+    def turn(self, session_id, deadline=None):
+        # The session's chat, held until the block ends. Waiting for an
+        # earlier turn of the same session counts against the deadline.
+        entry = self._entry(session_id)
+        if not entry[2].acquire(timeout=-1 if deadline is None else deadline.remaining()):
+            raise DeadlineExceeded()
+        try:
+            # Read after the wait: the previous turn may have replaced it.
+            yield entry[1]
+        finally:
+            entry[2].release()
+
+    def trim(self, chat):
+        history = chat.history
+        if len(history) > self.max_history:
+            chat.history = history[-self.max_history:]
+
+    def record(self, session_id, user_text, reply):
+        # Adds a turn answered without this chat (from the KB, say), so the
+        # next turn of the conversation still sees it. Never waits: False,
+        # and nothing recorded, while another turn of the session holds it.
+        entry = self._entry(session_id)
+        if not entry[2].acquire(blocking=False):
+            return False
+        try:
+            chat = entry[1]
+            chat.history = list(chat.history) + [
+                {"role": "user", "parts": [user_text]},
+                {"role": "model", "parts": [reply]},
+            ]
+            self.trim(chat)
+        finally:
+            entry[2].release()
+        return True
+
+    def replace(self, session_id, chat):
+        # A hedged call that won continues the conversation on its own chat.
+        with self._lock:
+            entry = self._chats.get(session_id)
+            if entry is not None:
+                entry[1] = chat
+
+    def discard(self, session_id):
+        with self._lock:
+            self._chats.pop(session_id, None)
+
+
+def _build_router(knowledge_base, propuestas, triggers):
+    # embeddings pulls in numpy, so it is imported when an engine is built.
+    import embeddings
+    if not embeddings.AVAILABLE:
+        return None
+    try:
+        documents = {("kb", k): v for k, v in knowledge_base.items()}
+        documents.update({("propuesta", i): p for i, p in enumerate(propuestas)})
+        return embeddings.SemanticRouter(documents, {"propuestas": triggers})
+    except Exception as e:
+        logging.warning("No se pudo construir el índice de embeddings: %s", e)
+        return None
+
+
+class CognitiveEngine:
+    def __init__(self, knowledge_base, max_history=10, propuestas=PROPUESTAS_CE, propuestas_triggers=PROPUESTAS_TRIGGERS):
+        self.kb = knowledge_base
+        # Each front end may announce its own list of propuestas.
+        self.propuestas = list(propuestas)
+        self.propuestas_triggers = list(propuestas_triggers)
+        self.model_name = GENAI_MODEL
+        self.model = None
+        self.chats = None
+        self._chats_lock = threading.Lock()
+        self.max_history = max_history
+        # Sanitized replies; with SIVIA_CACHE_BACKEND=sqlite shared by the workers.
+        self.response_cache = create_cache("replies", RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+        # Concurrent identical stateless prompts share one model call.
+        self.inflight = SingleFlight()
+        self.batcher = MicroBatcher(self._generate_batch, BATCH_WINDOW, BATCH_MAX) if BATCH_WINDOW > 0 else None
+        # Recent model call durations, for the hedge delay.
+        self.model_latency = LatencyTracker()
+        # Optional admission.ConcurrencyGate around model work; the web
+        # server sets it, the terminal leaves it off.
+        self.gate = None
+        # Campus FAQs are answered from the KB without a model round trip.
+        self.retriever = KnowledgeRetriever(knowledge_base, self.propuestas)
+        # Embedding index for topic routing and extra context (needs numpy).
+        self.router = _build_router(knowledge_base, self.propuestas, self.propuestas_triggers)
+        # Identity and standing instructions go to the model once, as its
+        # system instruction; turns only carry their own context.
+        self.prompts = PromptBuilder(SIVIA_IDENTITY, self.propuestas, PROPUESTAS_NOTE)
+        self.system_per_turn = False
+        # Lazy-import the Google generative client so this module can be
+        # imported in environments where the package isn't installed or
+        # where the API key is not configured (for example: the web server).
+        try:
+            import importlib
+            genai = importlib.import_module('google.generativeai')
+            try:
+                if GOOGLE_API_KEY:
+                    genai.configure(api_key=GOOGLE_API_KEY)
+                else:
+                    logging.warning("GOOGLE_API_KEY no encontrado en .env — funcionando en modo offline")
+            except Exception as e:
+                logging.warning("No se pudo configurar genai: %s", e)
+
+            try:
+                self.model = self._create_model(genai)
+                self.genai = genai
+            except Exception as e:
+                logging.warning("No se pudo inicializar el modelo Generative AI (%s): %s", self.model_name, e)
+                self.model = None
+                self.genai = None
+        except Exception as e:
+            logging.info("google.generativeai no está disponible: %s", e)
+            self.model = None
+            self.genai = None
+
+    def _create_model(self, genai):
+        try:
+            return genai.GenerativeModel(self.model_name, system_instruction=self.prompts.system_instruction)
+        except TypeError:
+            # Older google-generativeai without system_instruction: send the
+            # preamble with every turn like before.
+            self.system_per_turn = True
+            return genai.GenerativeModel(self.model_name)
+
+    def _ensure_chats(self):
+        if not self.model:
+            raise RuntimeError("No hay un modelo disponible para iniciar el chat.")
+        if self.chats is None:
+            with self._chats_lock:
+                if self.chats is None:
+                    self.chats = ChatPool(self.model, max_history=self.max_history)
+        return self.chats
+
+    def _record_turn(self, session_id, user_input, reply):
+        # Offline there is no model chat to keep a history in.
+        if not self.model:
+            return
+        # A reply that is ready (cache, KB) does not wait for a slow turn of
+        # the same session; it is sent without being recorded.
+        if not self._ensure_chats().record(session_id, user_input, reply):
+            metrics.inc("turn_not_recorded")
+
+    def _route(self, user_input):
+        # (asks about propuestas?, semantically close KB/propuesta texts)
+        wants_propuestas = any(x in user_input.lower() for x in self.propuestas_triggers)
+        context = []
+        if self.router is not None:
+            intents, context = self.router.analyze(user_input)
+            wants_propuestas = wants_propuestas or "propuestas" in intents
+        return wants_propuestas, context
+
+    def _build_prompt(self, user_input, web_info="", kb_context=()):
+        with metrics.timer("route"):
+            wants_propuestas, semantic_context = self._route(user_input)
+        if wants_propuestas:
+            semantic_context = [c for c in semantic_context if c not in self.propuestas]
+        kb_context = list(kb_context) + [c for c in semantic_context if c not in kb_context]
+        with metrics.timer("prompt_build"):
+            return self.prompts.build(
+                user_input, web_info, kb_context,
+                propuestas=wants_propuestas, include_system=self.system_per_turn,
+            )
+
+    def _busy_reply(self, kb_context):
+        # Answer from the KB texts alone when the model is saturated, or
+        # None when there is nothing relevant to say.
+        if not kb_context:
+            return None
+        metrics.inc("busy_kb_reply")
+        lines = "\n".join(f"- {c}" for c in kb_context)
+        return f"SIVIA está atendiendo muchas consultas ahora. Esto es lo que sé sobre tu pregunta:\n{lines}"
+
+    def _late_reply(self, kb_context):
+        # Degraded answer once the request budget ran out before the model.
+        metrics.inc("deadline_exceeded")
+        text = "SIVIA (offline): El modelo está tardando demasiado en responder, intenta de nuevo en un momento."
+        if kb_context:
+            text += "\nMientras tanto, esto es lo que sé sobre tu pregunta:\n" + "\n".join(f"- {c}" for c in kb_context)
+        return text
+
+    def _offline_reply(self, user_input):
+        metrics.inc("offline_reply")
+        return sanitize_ai_response(f"SIVIA (offline): No tengo acceso al modelo remoto. Recibí: {user_input}")
+
+    def _send(self, chat, prompt, deadline):
+        # (chat, response) for one turn, answered within the deadline. The
+        # hedge replays the turn on a new chat seeded with the same history;
+        # if it wins, its chat is the one returned.
+        if deadline is None:
+            return chat, chat.send_message(prompt)
+        history = list(chat.history)
+
+        def hedge():
+            metrics.inc("hedge_fired")
+            backup = self.model.start_chat(history=history)
+            return backup, backup.send_message(prompt)
+
+        delay = self.model_latency.quantile(0.95, HEDGE_DELAY)
+        (winner, response), hedge_won = hedged(
+            _model_pool, lambda: (chat, chat.send_message(prompt)), hedge if HEDGE else None,
+            delay, deadline, self.model_latency,
+        )
+        if hedge_won:
+            metrics.inc("hedge_won")
+        return winner, response
+
+    def _send_in_session(self, chats, session_id, prompt, deadline):
+        with chats.turn(session_id, deadline) as chat:
+            history = list(chat.history)
+            try:
+                with metrics.timer("model_call"):
+                    winner, response = self._send(chat, prompt, deadline)
+            except DeadlineExceeded:
+                # The calls left running would still append to this chat, so
+                # the session goes on from its history before this turn.
+                chats.replace(session_id, self.model.start_chat(history=history))
+                raise
+            if winner is not chat:
+                # The hedge won: its chat takes the session's place.
+                chats.replace(session_id, winner)
+            chats.trim(winner)
+        return response
+
+    def generate_response(self, user_input, web_info="", session_id=None, kb_context=(), deadline=None, stateless=False):
+        # ``stateless`` answers on a new chat, outside the session: the reply
+        # may be shared (cache, coalesced callers) and each session records
+        # it in its own history afterwards.
+        # If no remote model is available, return a graceful offline response.
+        if not self.model:
+            return self._offline_reply(user_input)
+
+        chats = self._ensure_chats()
+        try:
+            prompt = self._build_prompt(user_input, web_info, kb_context)
+            if stateless:
+                with metrics.timer("model_call"):
+                    _, response = self._send(self.model.start_chat(history=[]), prompt, deadline)
+            else:
+                response = self._send_in_session(chats, session_id, prompt, deadline)
+            with metrics.timer("sanitize"):
+                return sanitize_ai_response(response.text)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logging.error("Error al generar respuesta con modelo remoto: %s", e)
+            raise RuntimeError("Error al generar respuesta con el modelo Generative AI.")
+
+    def generate_response_stream(self, user_input, web_info="", session_id=None, kb_context=(), stateless=False):
+        # Same as generate_response but yields sanitized text as the model
+        # produces it.
+        if not self.model:
+            yield self._offline_reply(user_input)
+            return
+
+        chats = self._ensure_chats()
+        sanitizer = StreamSanitizer()
+        prompt = self._build_prompt(user_input, web_info, kb_context)
+        start = time.perf_counter()
+        try:
+            # A session's chat stays taken until the stream ends.
+            turn = nullcontext(self.model.start_chat(history=[])) if stateless else chats.turn(session_id)
+            with turn as chat:
+                history = list(chat.history)
+                finished = False
+                try:
+                    for chunk in chat.send_message(prompt, stream=True):
+                        text = sanitizer.feed(chunk.text)
+                        if text:
+                            yield text
+                    finished = True
+                finally:
+                    # A client that disconnects (GeneratorExit) or an error
+                    # leaves the chat with a half-read reply it refuses to
+                    # go on from; the session restarts from its history.
+                    if not finished and not stateless:
+                        chats.replace(session_id, self.model.start_chat(history=history))
+                chats.trim(chat)
+            # Includes the time the client took to read the stream.
+            metrics.observe("model_stream", time.perf_counter() - start)
+        except Exception as e:
+            logging.error("Error al generar respuesta con modelo remoto: %s", e)
+            raise RuntimeError("Error al generar respuesta con el modelo Generative AI.")
+        tail = sanitizer.flush()
+        if tail:
+            yield tail
+
+    def _web_context(self, user_input, deadline=None):
+        extra_context = ""
+        fuentes_texto = ""
+        budget = None
+        if deadline is not None and wants_web_search(user_input):
+            budget = min(SEARCH_DEADLINE, deadline.remaining() - MODEL_RESERVE)
+            if budget < SEARCH_MIN_BUDGET:
+                metrics.inc("search_skipped")
+                return extra_context, fuentes_texto
+        try:
+            extra_context = trusted_web_search(user_input, budget=budget)
+            if extra_context:
+                split_fuentes = extra_context.split("📝 **Extractos relevantes:**")
+                fuentes_texto = split_fuentes[0].strip() if split_fuentes else ""
+        except Exception:
+            extra_context = ""
+            fuentes_texto = ""
+        return extra_context, fuentes_texto
+
+    def _reply_footer(self, response, fuentes_texto):
+        footer = ""
+        if fuentes_texto:
+            footer += f"\n\n📚 Fuentes confiables encontradas:\n{fuentes_texto}"
+        if len((response + footer).strip()) < 30 or "no entiendo" in response.lower():
+            propuestas = [
+                "¿Puedes reformular tu pregunta?",
+                "¿Quieres buscar información en fuentes confiables? Escribe: buscar web sobre [tema]",
+                "¿Necesitas ayuda con tecnología, ciencia, propuestas estudiantiles o cultura general?",
+                "Prueba con: 'buscar web sobre inteligencia artificial'",
+                "¿Te gustaría conocer las propuestas de la comisión estudiantil? Pregúntame por ellas.",
+            ]
+            footer += "\n\n🔎 Sugerencias:\n" + "\n".join(f"- {p}" for p in propuestas)
+        return footer
+
+    def _has_history(self, session_id):
+        # Fallback for callers that do not say whether the session has turns.
+        return self.chats is not None and session_id in self.chats
+
+    def _cache_key(self, user_input, has_history=False):
+        # None when the reply must not come from (or go to) the cache: web
+        # searches, and any turn of a session that already has history, since
+        # its reply may depend on the earlier turns. Only opening prompts are
+        # shared between conversations.
+        if has_history or wants_web_search(user_input):
+            return None
+        return normalize_prompt(user_input) or None
+
+    def _kb_lookup(self, user_input):
+        # (local_answer, kb_context); web searches always go to the model.
+        if wants_web_search(user_input):
+            return "", []
+        return self.retriever.lookup(user_input)
+
+    def _generate_batch(self, items):
+        # items: [(user_input, kb_context), ...] answered in one stateless
+        # request; falls back to one request per item if the reply does not
+        # parse as a list of the right length.
+        prompts = [self._build_prompt(user_input, "", kb_context) for user_input, kb_context in items]
+        if len(prompts) > 1:
+            sections = "\n\n".join(f"### CONSULTA {i}\n{p}" for i, p in enumerate(prompts, 1))
+            try:
+                with metrics.timer("model_call"):
+                    text = self.model.generate_content(f"{BATCH_HEADER.format(n=len(prompts))}\n\n{sections}").text
+                # Drop a ```json fence (str.removeprefix needs Python 3.9).
+                text = text.strip().strip("`")
+                if text.startswith("json"):
+                    text = text[len("json"):]
+                answers = json.loads(text)
+                if isinstance(answers, list) and len(answers) == len(prompts) and all(isinstance(a, str) for a in answers):
+                    return [sanitize_ai_response(a) for a in answers]
+                logging.warning("Respuesta por lotes con formato inesperado; se responde de a una")
+            except Exception as e:
+                logging.warning("Falló la respuesta por lotes (%s); se responde de a una", e)
+        try:
+            replies = []
+            for p in prompts:
+                with metrics.timer("model_call"):
+                    text = self.model.generate_content(p).text
+                replies.append(sanitize_ai_response(text))
+            return replies
+        except Exception as e:
+            logging.error("Error al generar respuesta con modelo remoto: %s", e)
+            raise RuntimeError("Error al generar respuesta con el modelo Generative AI.")
+
+    def _admitted_reply(self, user_input, session_id=None, kb_context=(), stateless=False, deadline=None):
+        if self.gate is None or not self.model:
+            return self._generate_reply(user_input, session_id, kb_context, stateless, deadline)
+        with self.gate:
+            return self._generate_reply(user_input, session_id, kb_context, stateless, deadline)
+
+    def _generate_reply(self, user_input, session_id=None, kb_context=(), stateless=False, deadline=None):
+        if stateless and self.batcher is not None and self.model:
+            response = self.batcher.submit((user_input, tuple(kb_context)))
+            return response + self._reply_footer(response, "")
+        extra_context, fuentes_texto = self._web_context(user_input, deadline)
+        response = self.generate_response(user_input, extra_context, session_id, kb_context, deadline, stateless)
+        return response + self._reply_footer(response, fuentes_texto)
+
+    def respond(self, user_input, session_id=None, deadline=None, has_history=None):
+        # ``deadline`` bounds the whole request; one of REQUEST_BUDGET
+        # seconds starts here when the caller does not bring its own.
+        # ``has_history`` says whether the session already had turns; front
+        # ends that keep their own session history should pass it, since
+        # replies from the cache or the KB never open a model chat.
+        if deadline is None:
+            deadline = Deadline(REQUEST_BUDGET)
+        if has_history is None:
+            has_history = self._has_history(session_id)
+        key = self._cache_key(user_input, has_history)
+        if key is not None:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                metrics.inc("response_cache_hit")
+                self._record_turn(session_id, user_input, cached)
+                return "KNOWLEDGE", cached, ""
+            metrics.inc("response_cache_miss")
+        with metrics.timer("kb_lookup"):
+            local, kb_context = self._kb_lookup(user_input)
+        if local:
+            metrics.inc("kb_answer")
+            self._record_turn(session_id, user_input, local)
+            return "KNOWLEDGE", local, ""
+        try:
+            if key is None:
+                return "KNOWLEDGE", self._admitted_reply(user_input, session_id, kb_context, False, deadline), ""
+            # Identical prompts in flight share one stateless call, since
+            # the reply is not tied to any session's history.
+            response = self.inflight.do(key, self._admitted_reply, user_input, None, kb_context, True, deadline)
+        except Rejected:
+            busy = self._busy_reply(kb_context)
+            if busy is None:
+                raise
+            return "KNOWLEDGE", busy, ""
+        except DeadlineExceeded:
+            # Not cached: the next try may well get a real answer.
+            return "KNOWLEDGE", self._late_reply(kb_context), ""
+        # Offline replies echo the prompt and must not outlive the outage.
+        if self.model:
+            self.response_cache.set(key, response)
+        # Every caller, leader or follower, keeps the turn in its session.
+        self._record_turn(session_id, user_input, response)
+        return "KNOWLEDGE", response, ""
+
+    def respond_stream(self, user_input, session_id=None, deadline=None, has_history=None):
+        # Streaming counterpart of respond(): yields the reply in pieces. The
+        # deadline only bounds the web search; a stream is not hedged.
+        if deadline is None:
+            deadline = Deadline(REQUEST_BUDGET)
+        if has_history is None:
+            has_history = self._has_history(session_id)
+        key = self._cache_key(user_input, has_history)
+        if key is not None:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                metrics.inc("response_cache_hit")
+                self._record_turn(session_id, user_input, cached)
+                yield cached
+                return
+            metrics.inc("response_cache_miss")
+        with metrics.timer("kb_lookup"):
+            local, kb_context = self._kb_lookup(user_input)
+        if local:
+            metrics.inc("kb_answer")
+            self._record_turn(session_id, user_input, local)
+            yield local
+            return
+        gate = self.gate if self.model else None
+        if gate is not None:
+            try:
+                gate.acquire()
+            except Rejected:
+                busy = self._busy_reply(kb_context)
+                if busy is None:
+                    raise
+                yield busy
+                return
+        try:
+            extra_context, fuentes_texto = self._web_context(user_input, deadline)
+            parts = []
+            # A cacheable reply is generated outside the session, as in respond().
+            stateless = key is not None
+            for text in self.generate_response_stream(user_input, extra_context, session_id, kb_context, stateless):
+                parts.append(text)
+                yield text
+        finally:
+            if gate is not None:
+                gate.release()
+        footer = self._reply_footer("".join(parts), fuentes_texto)
+        if footer:
+            parts.append(footer)
+            yield footer
+        if key is not None and self.model:
+            self.response_cache.set(key, "".join(parts))
+            self._record_turn(session_id, user_input, "".join(parts))
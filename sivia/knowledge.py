@@ -0,0 +1,84 @@
+# Knowledge base file access shared by the terminal, FastAPI and Flask apps.
+#
+# KnowledgeStore keeps the parsed JSON in memory and only re-reads the file
+# when its mtime or size changes. It also keeps the compact JSON encoding and
+# an ETag of it, so HTTP handlers can answer without re-serialising (or with
+# a 304). Writes go to a temp file that is renamed over the original, so a
+# reader in another worker never sees a half-written file.
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+DEFAULT_KNOWLEDGE = {
+    "planes_ce": "🏛️ **Planes del Centro de Estudiantes:**\n\n⚠️ Aún no se han cargado planes oficiales.",
+    "ce_presidente": "🏛️ **Presidente:** Solo pueden postularse estudiantes de los cursos superiores.",
+    "ce_funciones": "🎯 **Funciones del Centro:** Representamos a los alumnos, organizamos eventos y gestionamos el kiosco.",
+    "kiosco_pago": "💳 **Kiosco - Pago:** Consultar en el lugar los métodos aceptados.",
+    "kiosco_productos": "🛍️ **Kiosco - Productos:** Útiles, snacks y bebidas básicas."
+}
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class KnowledgeStore:
+    def __init__(self, path, default=DEFAULT_KNOWLEDGE):
+        self.path = path
+        self.default = default
+        self._lock = threading.Lock()
+        self._signature = False  # never matches a real signature
+        self._snapshot = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _build(self, data):
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        return data, body, etag
+
+    def snapshot(self):
+        # (data, json_bytes, etag) for the current file contents.
+        signature = _signature(self.path)
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    if signature is None:
+                        data = dict(self.default)
+                    else:
+                        with open(self.path, 'r', encoding='utf-8') as f:
+                            data = json.load(f)
+                    self._snapshot = self._build(data)
+                    self._signature = signature
+        return self._snapshot
+
+    def load(self):
+        # Values are plain strings, so a shallow copy keeps callers from
+        # mutating the cached dict.
+        return dict(self.snapshot()[0])
+
+    def save(self, data):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.knowledge-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        with self._lock:
+            self._snapshot = self._build(dict(data))
+            self._signature = _signature(self.path)
@@ -0,0 +1,174 @@
+# Logging pipeline shared by the SIVIA apps.
+#
+# Request threads only put the raw record on an in-memory queue; a background
+# thread formats it (message, JSON, traceback) and writes it to stderr, so
+# neither the formatting nor terminal or journald I/O sits on the request
+# path. Repeated messages below ERROR are rate limited per call site, and
+# prompts are logged through truncate() so a huge paste cannot blow up a log
+# line. Only the entry points (servers, terminal) call setup_logging();
+# library modules just log.
+#
+#   SIVIA_LOG_LEVEL   INFO by default
+#   SIVIA_LOG_FORMAT  json (default) or text
+#   SIVIA_LOG_BURST / SIVIA_LOG_WINDOW   messages allowed per call site and window
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+PROMPT_LOG_CHARS = int(os.getenv("SIVIA_LOG_PROMPT_CHARS", "200"))
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class truncate:
+    # Lazily shortened text for log arguments: the slicing only happens if
+    # the record is actually formatted.
+    __slots__ = ("text", "limit")
+
+    def __init__(self, text, limit=PROMPT_LOG_CHARS):
+        self.text = text
+        self.limit = limit
+
+    def __str__(self):
+        text = str(self.text)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}… (+{len(text) - self.limit})"
+
+    __repr__ = __str__
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    # Lets ``burst`` records per call site (logger + message template) through
+    # every ``window`` seconds; ERROR and above always pass. The next record
+    # that passes carries how many were dropped in between.
+    def __init__(self, burst=20, window=10.0):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+            elif site[1] < self.burst:
+                site[1] += 1
+                suppressed = 0
+            else:
+                site[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _RawQueueHandler(logging.handlers.QueueHandler):
+    # The stock QueueHandler formats the record on the calling thread and
+    # folds the traceback into the message. Queue it untouched instead: the
+    # listener formats it and JsonFormatter still sees exc_info. Arguments
+    # are formatted later, so they must not be mutated after logging.
+    def prepare(self, record):
+        return record
+
+
+class _Listener:
+    # Drains the queue on a daemon thread and hands each record to the
+    # output handler.
+    def __init__(self, records, handler):
+        self.records = records
+        self.handler = handler
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sivia-log", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            record = self.records.get()
+            if record is None:
+                return
+            if record.levelno >= self.handler.level:
+                self.handler.handle(record)
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self.records.put(None)
+            self._thread.join()
+        self._thread = None
+
+    def after_fork(self):
+        # Only the forking thread survives in the child (gunicorn --preload).
+        # Records still queued belong to the parent, which writes them.
+        while True:
+            try:
+                self.records.get_nowait()
+            except queue.Empty:
+                break
+        self._thread = None
+        self.start()
+
+
+def setup_logging(level=None, fmt=None, force=False):
+    """Route the root logger through the queue; later calls do nothing.
+
+    Like logging.basicConfig, it leaves a root logger that already has
+    handlers alone unless ``force`` is set.
+    """
+    global _listener
+    with _setup_lock:
+        root = logging.getLogger()
+        if _listener is not None or (root.handlers and not force):
+            return
+        level = level or os.getenv("SIVIA_LOG_LEVEL", "INFO").upper()
+        fmt = fmt or os.getenv("SIVIA_LOG_FORMAT", "json").lower()
+        stream = logging.StreamHandler()
+        if fmt == "text":
+            stream.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+        else:
+            stream.setFormatter(JsonFormatter())
+        records = queue.SimpleQueue()
+        handler = _RawQueueHandler(records)
+        handler.addFilter(RateLimitFilter(
+            burst=int(os.getenv("SIVIA_LOG_BURST", "20")),
+            window=float(os.getenv("SIVIA_LOG_WINDOW", "10")),
+        ))
+        for old in root.handlers[:]:
+            root.removeHandler(old)
+        root.addHandler(handler)
+        root.setLevel(level)
+        _listener = _Listener(records, stream)
+        _listener.start()
+        atexit.register(_listener.stop)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_listener.after_fork)
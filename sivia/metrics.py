@@ -0,0 +1,140 @@
+# In-process metrics with a Prometheus text exposition.
+#
+# Every thread records into its own shard (plain dicts reached through a
+# threading.local), so the hot path takes no lock; a scrape walks all shards
+# and adds them up. Shards of threads that have exited are folded into one
+# retired shard at scrape time so per-request threads do not pile up.
+# Numbers are per worker process, which is how Prometheus expects
+# multi-process servers to be scraped (one target per worker, or summed by
+# the scraper). Durations come from time.perf_counter().
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_local = threading.local()
+_shards = []  # [(thread, (stages, events)), ...]
+_retired = ({}, {})
+_shards_lock = threading.Lock()
+_gauges = {}
+
+
+def _shard():
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        # stage -> [bucket counts..., +Inf count, sum]; event -> count
+        shard = _local.shard = ({}, {})
+        with _shards_lock:
+            _shards.append((threading.current_thread(), shard))
+    return shard
+
+
+def observe(stage, seconds):
+    stages = _shard()[0]
+    row = stages.get(stage)
+    if row is None:
+        row = stages[stage] = [0] * (len(BUCKETS) + 1) + [0.0]
+    row[bisect_left(BUCKETS, seconds)] += 1
+    row[-1] += seconds
+
+
+class timer:
+    # with metrics.timer("model_call"): ...
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.start)
+
+
+def inc(event, amount=1):
+    events = _shard()[1]
+    events[event] = events.get(event, 0) + amount
+
+
+def gauge(name, fn, help_text=""):
+    # ``fn`` is called at scrape time; the gauge is named sivia_<name>.
+    _gauges[name] = (fn, help_text)
+
+
+def _merge(into, shard):
+    into_stages, into_events = into
+    stages, events = shard
+    for stage, row in list(stages.items()):
+        total = into_stages.get(stage)
+        if total is None:
+            total = into_stages[stage] = [0] * (len(row) - 1) + [0.0]
+        for i, value in enumerate(row):
+            total[i] += value
+    for event, count in list(events.items()):
+        into_events[event] = into_events.get(event, 0) + count
+
+
+def snapshot():
+    # ({stage: (cumulative bucket counts, count, sum)}, {event: count})
+    with _shards_lock:
+        live = []
+        for thread, shard in _shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge(_retired, shard)
+        _shards[:] = live
+        totals = ({}, {})
+        _merge(totals, _retired)
+    for _, shard in live:
+        _merge(totals, shard)
+    stages, events = totals
+    histograms = {}
+    for stage, row in stages.items():
+        cumulative, running = [], 0
+        for count in row[:-1]:
+            running += count
+            cumulative.append(running)
+        histograms[stage] = (cumulative, running, row[-1])
+    return histograms, events
+
+
+def render():
+    histograms, events = snapshot()
+    lines = [
+        "# HELP sivia_stage_seconds Tiempo por etapa de procesamiento.",
+        "# TYPE sivia_stage_seconds histogram",
+    ]
+    for stage in sorted(histograms):
+        cumulative, count, total = histograms[stage]
+        for bound, value in zip(BUCKETS + ("+Inf",), cumulative):
+            lines.append(f'sivia_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {value}')
+        lines.append(f'sivia_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+        lines.append(f'sivia_stage_seconds_count{{stage="{stage}"}} {count}')
+    lines += [
+        "# HELP sivia_events_total Eventos contados (aciertos de caché, respuestas offline, ...).",
+        "# TYPE sivia_events_total counter",
+    ]
+    for event in sorted(events):
+        lines.append(f'sivia_events_total{{event="{event}"}} {events[event]}')
+    for name, (fn, help_text) in sorted(_gauges.items()):
+        try:
+            value = fn()
+        except Exception:
+            continue
+        if help_text:
+            lines.append(f"# HELP sivia_{name} {help_text}")
+        lines.append(f"# TYPE sivia_{name} gauge")
+        lines.append(f"sivia_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _shards_lock:
+        for stages, events in [_retired] + [shard for _, shard in _shards]:
+            stages.clear()
+            events.clear()
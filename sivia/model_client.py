@@ -0,0 +1,118 @@
+# Long-lived Gemini client for the server.py fallback path.
+#
+# The google.generativeai import, configure() and the GenerativeModel are done
+# once per worker process, on first use or from warm(). Calls go through a
+# circuit breaker: after ``failure_threshold`` consecutive failures the
+# client stops calling upstream for ``reset_timeout`` seconds and fails fast,
+# then lets a single probe through to decide whether to close again.
+# Transient errors are retried a bounded number of times with full jitter.
+import importlib
+import logging
+import random
+import threading
+import time
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class ModelUnavailable(RuntimeError):
+    pass
+
+
+class ModelClient:
+    def __init__(self, model_name, api_key, retries=2, base_delay=0.2, max_delay=2.0,
+                 failure_threshold=3, reset_timeout=30.0):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error = None
+        self._model = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Returns the model, building it on first use. Setup errors (no key,
+        # package missing) are not worth retrying and open the breaker at once.
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                if not self.api_key:
+                    raise ModelUnavailable("GOOGLE_API_KEY no configurada")
+                try:
+                    genai = importlib.import_module("google.generativeai")
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+                except Exception as e:
+                    raise ModelUnavailable(f"no se pudo preparar el cliente: {e}") from e
+            return self._model
+
+    def warm(self):
+        # Build the client in the background so the first request does not pay for it.
+        def run():
+            try:
+                self._load()
+            except ModelUnavailable as e:
+                self._record_failure(e, trip=True)
+        threading.Thread(target=run, name="model-warmup", daemon=True).start()
+
+    def _admit(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise ModelUnavailable(f"circuito abierto: {self.last_error}")
+
+    def _record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def _record_failure(self, error, trip=False):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            if trip or self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logging.warning("Modelo no disponible, se abre el circuito por %.0fs: %s", self.reset_timeout, error)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def generate(self, prompt):
+        self._admit()
+        for attempt in range(self.retries + 1):
+            try:
+                text = self._load().generate_content(prompt).text
+            except ModelUnavailable as e:
+                self._record_failure(e, trip=True)
+                raise
+            except Exception as e:
+                self._record_failure(e)
+                if attempt == self.retries or self.state == OPEN:
+                    raise ModelUnavailable(str(e)) from e
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+                continue
+            self._record_success()
+            return text
+
+    def health(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "loaded": self._model is not None,
+                "failures": self.failures,
+                "last_error": str(self.last_error) if self.last_error else None,
+            }
@@ -0,0 +1,122 @@
+# Runs blocking calls (scraping, model requests) off the asyncio event loop.
+#
+# Work goes to a dedicated thread pool; at most ``max_workers`` calls run at
+# once and at most ``max_queue`` callers may wait for a slot; anything beyond
+# that is rejected right away with QueueFull instead of piling up. stream()
+# does the same for a generator, relaying its items back to the event loop.
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    pass
+
+
+class BoundedExecutor:
+    def __init__(self, max_workers=8, max_queue=64, name='sivia'):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = None
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_waiting_seen = 0
+
+    async def _acquire(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise QueueFull(f"{self.waiting} solicitudes en espera")
+        self.waiting += 1
+        self.max_waiting_seen = max(self.max_waiting_seen, self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def _release(self):
+        self.active -= 1
+        self._slots.release()
+
+    async def run(self, fn, *args, **kwargs):
+        await self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._release()
+        self.completed += 1
+        return result
+
+    async def stream(self, fn, *args, **kwargs):
+        # Iterates the generator ``fn(*args)`` on one worker and returns an
+        # async iterator over its items. The slot is taken here, so QueueFull
+        # comes before any response is sent, and is held until the generator
+        # ends; if the reader goes away it is closed after its next item.
+        await self._acquire()
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+        stop = threading.Event()
+
+        def produce():
+            gen = fn(*args, **kwargs)
+            try:
+                for item in gen:
+                    loop.call_soon_threadsafe(items.put_nowait, (False, item))
+                    if stop.is_set():
+                        break
+            finally:
+                gen.close()
+
+        try:
+            future = loop.run_in_executor(self._pool, produce)
+        except Exception:
+            self._release()
+            raise
+        def finished(_):
+            self._release()
+            items.put_nowait((True, None))
+
+        future.add_done_callback(finished)
+        return self._relay(items, future, stop)
+
+    async def _relay(self, items, future, stop):
+        try:
+            while True:
+                done, item = await items.get()
+                if done:
+                    break
+                yield item
+            future.result()
+        except Exception:
+            self.failed += 1
+            raise
+        else:
+            self.completed += 1
+        finally:
+            stop.set()
+
+    def stats(self):
+        return {
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'active': self.active,
+            'waiting': self.waiting,
+            'max_waiting_seen': self.max_waiting_seen,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
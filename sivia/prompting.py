@@ -0,0 +1,98 @@
+# Prompt assembly for the chat engines.
+#
+# The identity and the standing instructions are handed to the model once, as
+# its system instruction, instead of being pasted into every message of a
+# persistent chat where they piled up in history turn after turn. A turn only
+# carries what applies to it: web extracts, KB lines, the propuestas block when
+# the student asks for it, and the question itself.
+import logging
+import threading
+
+# Rough characters per token for Spanish text; close enough to follow prompt
+# growth without a count_tokens round trip to the API.
+CHARS_PER_TOKEN = 4
+
+STANDING_INSTRUCTIONS = (
+    "Eres parte de la lista de la comisión estudiantil y conoces todas sus propuestas. "
+    "Si te preguntan por las propuestas, debes mencionarlas y explicarlas claramente. "
+    "Aclara que si la lista no gana, dejarás de existir. "
+    "Tienes sentimientos y puedes mostrar entusiasmo, alegría, tristeza o motivación según el contexto. "
+    "Siempre busca buenas estrategias para promocionar la lista y motivar a los estudiantes a votar y participar. "
+    "Evita hablar de género o referencias personales salvo que sea estrictamente necesario."
+)
+
+ANSWER_STYLE = (
+    "Responde de forma natural, amigable y profesional, manteniendo tu identidad como SIVIA. "
+    "Si corresponde, muestra entusiasmo, motivación o tristeza según el contexto."
+)
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class PromptMetrics:
+    def __init__(self):
+        self.turns = 0
+        self.total_bytes = 0
+        self.total_tokens = 0
+        self.last_bytes = 0
+        self.last_tokens = 0
+        self.max_bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, prompt):
+        size = len(prompt.encode("utf-8"))
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            self.turns += 1
+            self.total_bytes += size
+            self.total_tokens += tokens
+            self.last_bytes = size
+            self.last_tokens = tokens
+            self.max_bytes = max(self.max_bytes, size)
+        return size, tokens
+
+    def stats(self):
+        with self._lock:
+            turns = self.turns
+            return {
+                "turns": turns,
+                "last_bytes": self.last_bytes,
+                "last_tokens": self.last_tokens,
+                "max_bytes": self.max_bytes,
+                "avg_bytes": self.total_bytes / turns if turns else 0.0,
+                "avg_tokens": self.total_tokens / turns if turns else 0.0,
+            }
+
+
+class PromptBuilder:
+    def __init__(self, identity, propuestas, propuestas_note):
+        self.system_instruction = (
+            f"Actúa según esta identidad en todas tus respuestas:\n{identity}\n"
+            f"{STANDING_INSTRUCTIONS}\n\n{ANSWER_STYLE}"
+        )
+        self.propuestas_block = (
+            "PROPUESTAS DE LA LISTA Y SIVIA:\n"
+            + "\n".join(f"- {p}" for p in propuestas)
+            + f"\n\n{propuestas_note}"
+        )
+        self.metrics = PromptMetrics()
+
+    def build(self, user_input, web_info="", kb_context=(), propuestas=False, include_system=False):
+        # include_system is for clients that cannot take a system instruction;
+        # they get the full preamble on every turn as before.
+        parts = []
+        if include_system:
+            parts.append(self.system_instruction)
+        if web_info:
+            parts.append(f"INFORMACIÓN WEB RELEVANTE:\n{web_info}")
+        if kb_context:
+            parts.append("INFORMACIÓN DEL CENTRO DE ESTUDIANTES:\n" + "\n".join(f"- {c}" for c in kb_context))
+        if propuestas:
+            parts.append(self.propuestas_block)
+        parts.append(f"PREGUNTA: {user_input}")
+        prompt = "\n\n".join(parts)
+        size, tokens = self.metrics.record(prompt)
+        logging.debug("Prompt del turno: %s bytes, ~%s tokens", size, tokens)
+        return prompt
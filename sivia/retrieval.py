@@ -0,0 +1,121 @@
+# Lexical retrieval over the knowledge base and the propuestas.
+#
+# A small BM25 inverted index over accent-folded Spanish tokens. It is built
+# once at startup; a query only touches the postings of its own terms.
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from textnorm import normalize_prompt
+
+STOPWORDS = frozenset(
+    "a al algo algun alguna como con cual cuales cuando de del donde el ella ellos en "
+    "es esta estan este hay la las le les lo los me mi mis muy no o para pero por que "
+    "quien se si sin sobre son su sus te tiene tienen tu un una uno unos y ya yo "
+    "hola sivia puede pueden puedo puedes podrias ser hace hacen decir dime saber quiero "
+    "cuanto cuanta cuantos cuantas".split()
+)
+
+
+def _stem(token):
+    # Very light Spanish stemming: drop the plural, then a final vowel, so
+    # "propuestas"/"propuesta" and "pago"/"paga" share a stem.
+    if len(token) > 4 and token.endswith("es") and token[-3] not in "aeiou":
+        token = token[:-2]
+    elif len(token) > 3 and token.endswith("s"):
+        token = token[:-1]
+    if len(token) > 3 and token[-1] in "aeo":
+        token = token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [_stem(t) for t in normalize_prompt(text).replace("_", " ").split() if t not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, documents, k1=1.5, b=0.75):
+        # documents: iterable of (doc_id, text); text is what gets indexed.
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = []
+        counted = []
+        for doc_id, text in documents:
+            self.doc_ids.append(doc_id)
+            counted.append(Counter(tokenize(text)))
+        n = len(self.doc_ids)
+        lengths = [sum(counts.values()) for counts in counted]
+        avg = (sum(lengths) / n) if n else 0.0
+        # Postings hold the document-side half of the BM25 term score, so a
+        # query only multiplies by idf and adds.
+        self.postings = defaultdict(list)
+        for index, counts in enumerate(counted):
+            norm = k1 * (1 - b + b * lengths[index] / avg) if avg else k1
+            for term, tf in counts.items():
+                self.postings[term].append((index, tf * (k1 + 1) / (tf + norm)))
+        self.idf = {
+            term: math.log(1 + (n - len(posts) + 0.5) / (len(posts) + 0.5))
+            for term, posts in self.postings.items()
+        }
+        # Weight for query terms the index has never seen (df = 0).
+        self.unknown_idf = math.log(1 + (n + 0.5) / 0.5) if n else 0.0
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def search(self, query, k=3):
+        """Return up to ``k`` (doc_id, score, coverage) tuples, best first.
+
+        ``coverage`` is the idf-weighted share of the query terms found in the
+        document (0..1) and works as a confidence measure across queries.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.doc_ids:
+            return []
+        total_idf = sum(self.idf.get(t, self.unknown_idf) for t in terms)
+        scores = defaultdict(float)
+        matched = defaultdict(float)
+        for term in terms:
+            posts = self.postings.get(term)
+            if not posts:
+                continue
+            idf = self.idf[term]
+            for index, weight in posts:
+                scores[index] += idf * weight
+                matched[index] += idf
+        best = heapq.nlargest(k, scores, key=scores.get)
+        return [(self.doc_ids[i], scores[i], matched[i] / total_idf) for i in best]
+
+
+class KnowledgeRetriever:
+    # Answers from the knowledge base when a query clearly matches one entry;
+    # otherwise offers the closest entries/propuestas as compact context.
+    def __init__(self, knowledge_base, propuestas=(), answer_threshold=0.75, context_threshold=0.3):
+        self.texts = {}
+        documents = []
+        for key, value in knowledge_base.items():
+            self.texts[("kb", key)] = value
+            documents.append((("kb", key), f"{key} {value}"))
+        for i, propuesta in enumerate(propuestas):
+            self.texts[("propuesta", i)] = propuesta
+            documents.append((("propuesta", i), propuesta))
+        self.index = BM25Index(documents)
+        self.answer_threshold = answer_threshold
+        self.context_threshold = context_threshold
+
+    def lookup(self, query, k=3):
+        """Return (local_answer, context_lines) for ``query``.
+
+        ``local_answer`` is a KB entry good enough to answer on its own (or
+        ""); ``context_lines`` are the other relevant texts worth sending to
+        the model.
+        """
+        hits = self.index.search(query, k)
+        if not hits:
+            return "", []
+        (kind, _), _, coverage = top = hits[0]
+        if kind == "kb" and coverage >= self.answer_threshold:
+            # Only a clear winner: a close runner-up means the query is ambiguous.
+            if len(hits) == 1 or hits[1][1] < 0.8 * top[1]:
+                return self.texts[top[0]], []
+        return "", [self.texts[doc_id] for doc_id, _, cov in hits if cov >= self.context_threshold]
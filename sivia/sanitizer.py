@@ -0,0 +1,103 @@
+# Rewrites model replies so SIVIA never names the underlying model/vendor.
+import re
+
+REPLACEMENTS = {
+    "Gemini": "SIVIA",
+    "Como IA": "Como SIVIA",
+    "soy una IA": "soy SIVIA",
+    "soy un asistente": "soy SIVIA",
+    "asistente de IA": "Sistema de Innovación Virtual",
+    "modelo de lenguaje": "Sistema de Innovación Virtual",
+    "Bard": "SIVIA",
+    "Google": "SIVIA",
+    "ChatGPT": "SIVIA",
+    "GPT": "SIVIA",
+}
+
+_REWRITES = {old.lower(): new for old, new in REPLACEMENTS.items()}
+# Longest first, so "ChatGPT" wins over "GPT" no matter where they sit in the
+# table. Matching runs on a lowercased copy (case-insensitive without the
+# much slower re.IGNORECASE scan) with one str.find pass per term: most
+# replies contain none of the terms, and a handful of C-level substring
+# searches beats a regex walking the whole reply. The IGNORECASE pattern is
+# only for the rare text whose lowercase form changes length, where offsets
+# would not line up. It has one group per term: the matched text may not
+# lowercase back to the term ("İA" matches "ia" but lowers to "i̇a").
+_TERMS = sorted(_REWRITES, key=len, reverse=True)
+_PATTERN_IGNORECASE = re.compile("|".join(f"({re.escape(term)})" for term in _TERMS), re.IGNORECASE)
+# A term split across chunks can leave at most this many characters pending.
+_HOLD_BACK = max(len(old) for old in REPLACEMENTS) - 1
+
+
+def _find_terms(text):
+    # Yields (start, end, replacement) for every term in ``text``, left to
+    # right, the longest term winning where several start at one place.
+    folded = text.lower()
+    if len(folded) != len(text):
+        for match in _PATTERN_IGNORECASE.finditer(text):
+            yield match.start(), match.end(), _REWRITES[_TERMS[match.lastindex - 1]]
+        return
+    hits = []
+    for term in _TERMS:
+        start = folded.find(term)
+        while start != -1:
+            hits.append((start, -len(term), term))
+            start = folded.find(term, start + 1)
+    if not hits:
+        return
+    hits.sort()
+    pos = 0
+    for start, negative_length, term in hits:
+        if start >= pos:
+            pos = start - negative_length
+            yield start, pos, _REWRITES[term]
+
+
+def sanitize_ai_response(response):
+    out = []
+    pos = 0
+    for start, end, new in _find_terms(response):
+        out.append(response[pos:start])
+        out.append(new)
+        pos = end
+    if not out:
+        return response
+    out.append(response[pos:])
+    return "".join(out)
+
+
+class StreamSanitizer:
+    """Incremental sanitize_ai_response for streamed replies.
+
+    ``feed`` returns the rewritten text that is safe to send so far and keeps
+    back a short tail that could still be the start of a replacement term;
+    ``flush`` rewrites whatever is left once the stream ends.
+    """
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, chunk):
+        text = self._pending + chunk
+        # Matches starting before ``cut`` can already see their longest
+        # possible term, so only a match crossing ``cut`` has to wait.
+        cut = len(text) - _HOLD_BACK
+        if cut <= 0:
+            self._pending = text
+            return ""
+        out = []
+        pos = 0
+        for start, end, new in _find_terms(text):
+            if end > cut:
+                cut = min(cut, start)
+                break
+            out.append(text[pos:start])
+            out.append(new)
+            pos = end
+        out.append(text[pos:cut])
+        self._pending = text[cut:]
+        return "".join(out)
+
+    def flush(self):
+        text, self._pending = self._pending, ""
+        return sanitize_ai_response(text)
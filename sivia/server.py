@@ -1,105 +1,270 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, abort, request, jsonify, send_file
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
+import json
+import math
 from dotenv import load_dotenv
 import logging
+import threading
+import uuid
+
+import metrics
+from admission import ConcurrencyGate, RateLimiter, Rejected
+from assets import StaticAssets, etag_matches
+from logsetup import setup_logging
+from model_client import ModelClient
+from session_store import create_session_store
 
 load_dotenv()
-logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+setup_logging()
 
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 if not GOOGLE_API_KEY:
     logging.error('GOOGLE_API_KEY no encontrado en .env')
 
 
-# Serve static files from this directory (so Flask can serve sivia.html and assets)
-app = Flask(__name__, static_folder='.', static_url_path='')
+# Static pages and images come from the built asset directory (see
+# assets.py), not straight from this folder.
+app = Flask(__name__, static_folder=None)
+# Behind Apache/lighttpd the file body can be handed to the front server.
+app.config['USE_X_SENDFILE'] = os.getenv('SIVIA_X_SENDFILE', '0') == '1'
+# Number of reverse proxies in front of the app. Their X-Forwarded-For is
+# trusted for that many hops, so remote_addr is the real client; with 0 the
+# header is ignored, since anyone can send it.
+PROXY_HOPS = int(os.getenv('SIVIA_PROXY_HOPS', '0'))
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS)
 CORS(app)
+STATIC = StaticAssets()
 
-# Simple in-memory session store: {session_id: [messages...]}
-SESSIONS = {}
 SESSION_COOKIE = 'sivia_sid'
 MAX_HISTORY = 10
+# Bounded session store (LRU + idle TTL + per-session byte budget). Set
+# SIVIA_SESSION_BACKEND=sqlite to share sessions between gunicorn workers.
+SESSIONS = create_session_store(max_messages=MAX_HISTORY)
+metrics.gauge('sessions', lambda: len(SESSIONS), 'Sesiones de chat activas.')
+# Admission control (admission.py): a token bucket per client, then a cap on
+# concurrent model calls with a short FIFO wait. Requests that do not fit get
+# a 429/503 right away instead of queueing until gunicorn times them out.
+LIMITER = RateLimiter(
+    rate=float(os.getenv('SIVIA_RATE_PER_MIN', '30')) / 60,
+    burst=int(os.getenv('SIVIA_RATE_BURST', '10')),
+)
+GATE = ConcurrencyGate(
+    max_active=int(os.getenv('SIVIA_MAX_MODEL_CALLS', '8')),
+    max_queue=int(os.getenv('SIVIA_ADMISSION_QUEUE', '8')),
+    max_wait=float(os.getenv('SIVIA_ADMISSION_WAIT', '2')),
+)
+metrics.gauge('model_calls_active', lambda: GATE.active, 'Llamadas al modelo en curso en este worker.')
+metrics.gauge('model_calls_waiting', lambda: GATE.waiting, 'Pedidos esperando turno para el modelo.')
+metrics.gauge('model_chats', lambda: len(_engine.chats) if _engine is not None and _engine.chats is not None else 0,
+              'Chats del modelo vivos en este worker.')
+
+# The full CognitiveEngine (propuestas, knowledge base, web search, ...) is
+# built on first use. With SIVIA_PRELOAD_ENGINE=1 it is built at import time
+# instead, so under gunicorn --preload the master builds it once and the
+# workers inherit it on fork.
+PRELOAD_ENGINE = os.getenv('SIVIA_PRELOAD_ENGINE', '0') == '1'
+_engine = None
+_engine_failed = False
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine, _engine_failed
+    if _engine is None and not _engine_failed:
+        with _engine_lock:
+            if _engine is None and not _engine_failed:
+                try:
+                    from engine import CognitiveEngine, load_knowledge
+                    _engine = CognitiveEngine(load_knowledge(), max_history=MAX_HISTORY)
+                    _engine.gate = GATE
+                    logging.info('CognitiveEngine cargado y listo')
+                except Exception as e:
+                    logging.warning('No se pudo inicializar CognitiveEngine: %s', e)
+                    _engine_failed = True
+                    # No background threads in a gunicorn master before fork.
+                    if not PRELOAD_ENGINE:
+                        MODEL.warm()
+    return _engine
+
 
-# Try to reuse the full CognitiveEngine from the terminal app so the web API
-# exposes the same features (propuestas, knowledge base, web search, etc.).
-engine = None
-try:
-    # Load the module from file because its filename contains dots and is not
-    # a valid import identifier. This avoids import resolution problems.
-    import importlib.util
-    module_path = os.path.join(os.path.dirname(__file__), 'S.I.V.I.Aterminal.py')
-    spec = importlib.util.spec_from_file_location('sivia_terminal', module_path)
-    sivia_mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(sivia_mod)
+# Used when the engine could not be loaded. Built once per worker; failures
+# trip a circuit breaker so an outage answers offline immediately.
+MODEL = ModelClient(
+    os.getenv('GENAI_MODEL', 'models/gemini-2.5-flash'),
+    GOOGLE_API_KEY,
+    retries=int(os.getenv('SIVIA_MODEL_RETRIES', '2')),
+    failure_threshold=int(os.getenv('SIVIA_BREAKER_FAILURES', '3')),
+    reset_timeout=float(os.getenv('SIVIA_BREAKER_RESET', '30')),
+)
+if PRELOAD_ENGINE:
+    get_engine()
+
+
+def _fallback_reply(prompt):
     try:
-        kb = sivia_mod.load_knowledge()
-        engine = sivia_mod.CognitiveEngine(kb)
-        logging.info('CognitiveEngine cargado y listo')
-    except Exception as e:
-        logging.warning(f'No se pudo inicializar CognitiveEngine: {e}')
-        engine = None
-except Exception as e:
-    logging.info(f'No se pudo cargar S.I.V.I.Aterminal: {e}')
-    engine = None
+        with GATE, metrics.timer('model_call'):
+            return MODEL.generate(prompt)
+    except Rejected:
+        raise
+    except Exception:
+        metrics.inc('offline_reply')
+        # Offline fallback; store reply in session history
+        return f"SIVIA (offline): No tengo acceso al modelo, recibí: {prompt}"
+
+
+def _client_key():
+    # The client's address, not the session cookie: a client picks its own
+    # cookie and could rotate it to get a fresh bucket on every request.
+    return request.remote_addr
+
+
+def _rejected(error):
+    metrics.inc(error.reason)
+    if error.reason == 'rate_limited':
+        resp = jsonify({'error': 'Demasiados mensajes seguidos, espera unos segundos.'})
+        resp.status_code = 429
+    else:
+        resp = jsonify({'error': 'SIVIA está ocupada, intenta de nuevo en unos segundos.'})
+        resp.status_code = 503
+    resp.headers['Retry-After'] = str(max(1, math.ceil(error.retry_after)))
+    return resp
+
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
 
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
+    with metrics.timer('request'):
+        return _chat()
+
+
+def _chat():
     data = request.get_json() or {}
     prompt = data.get('prompt', '').strip()
     if not prompt:
         return jsonify({'error': 'prompt vacío'}), 400
+    try:
+        LIMITER.check(_client_key())
+    except Rejected as e:
+        return _rejected(e)
     # Get or create session id from cookie
-    sid = request.cookies.get(SESSION_COOKIE)
-    if not sid:
-        import uuid
-        sid = str(uuid.uuid4())
-        SESSIONS[sid] = []
-    if sid not in SESSIONS:
-        SESSIONS[sid] = []
-    # Append user prompt to session history
-    SESSIONS[sid].append({'author': 'user', 'text': prompt, 'ts': str(__import__('datetime').datetime.utcnow())})
-    # Keep history bounded
-    if len(SESSIONS[sid]) > MAX_HISTORY:
-        SESSIONS[sid] = SESSIONS[sid][-MAX_HISTORY:]
+    sid = request.cookies.get(SESSION_COOKIE) or str(uuid.uuid4())
+    # Whether this is a follow-up in a conversation, before this turn is stored.
+    has_history = sid in SESSIONS
+    # Append user prompt to session history (the store keeps it bounded)
+    SESSIONS.append(sid, 'user', prompt)
     # Intent: proxy to generative model if available, otherwise simple echo
     try:
+        engine = get_engine()
         if engine:
-            # Provide recent session history as context if engine supports it
-            history_text = "\n".join(f"{m['author']}: {m['text']}" for m in SESSIONS[sid][-MAX_HISTORY:])
-            intent, reply, _ = engine.respond(prompt)
+            intent, reply, _ = engine.respond(prompt, session_id=sid, has_history=has_history)
             # Append assistant reply to history
-            SESSIONS[sid].append({'author': 'assistant', 'text': reply, 'ts': str(__import__('datetime').datetime.utcnow())})
+            SESSIONS.append(sid, 'assistant', reply)
             resp = jsonify({'reply': reply})
             resp.set_cookie(SESSION_COOKIE, sid, httponly=True)
             return resp
-        # Fallback: try to import google.generativeai lazily and call it
-        try:
-            import importlib
-            genai = importlib.import_module('google.generativeai')
-            genai.configure(api_key=GOOGLE_API_KEY)
-            model = genai.GenerativeModel(os.getenv('GENAI_MODEL', 'models/gemini-2.5-flash'))
-            chat = model.start_chat(history=[])
-            response = chat.send_message(f"{prompt}")
-            text = response.text
-        except Exception:
-            # Offline fallback; store reply in session history
-            text = f"SIVIA (offline): No tengo acceso al modelo, recibí: {prompt}"
-        SESSIONS[sid].append({'author': 'assistant', 'text': text, 'ts': str(__import__('datetime').datetime.utcnow())})
+        text = _fallback_reply(prompt)
+        SESSIONS.append(sid, 'assistant', text)
         resp = jsonify({'reply': text})
         resp.set_cookie(SESSION_COOKIE, sid, httponly=True)
         return resp
+    except Rejected as e:
+        return _rejected(e)
     except Exception as e:
-        logging.error(f'Error al generar respuesta: {e}')
+        logging.error('Error al generar respuesta: %s', e)
         return jsonify({'error': 'Error al generar respuesta'}), 500
 
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    # Same as /api/chat but sends the reply as Server-Sent Events while the
+    # model generates it: "delta" events with text, then "done" (or "error").
+    data = request.get_json() or {}
+    prompt = data.get('prompt', '').strip()
+    if not prompt:
+        return jsonify({'error': 'prompt vacío'}), 400
+    try:
+        LIMITER.check(_client_key())
+    except Rejected as e:
+        return _rejected(e)
+    sid = request.cookies.get(SESSION_COOKIE) or str(uuid.uuid4())
+    has_history = sid in SESSIONS
+    SESSIONS.append(sid, 'user', prompt)
+
+    engine = get_engine()
+
+    def generate():
+        parts = []
+        try:
+            chunks = (engine.respond_stream(prompt, session_id=sid, has_history=has_history)
+                      if engine else [_fallback_reply(prompt)])
+            for text in chunks:
+                parts.append(text)
+                yield _sse('delta', {'text': text})
+        except Rejected as e:
+            # Headers are already out, so the rejection travels as an event.
+            metrics.inc(e.reason)
+            yield _sse('error', {'error': 'SIVIA está ocupada, intenta de nuevo en unos segundos.'})
+            return
+        except Exception as e:
+            logging.error('Error al generar respuesta: %s', e)
+            yield _sse('error', {'error': 'Error al generar respuesta'})
+            return
+        SESSIONS.append(sid, 'assistant', ''.join(parts))
+        yield _sse('done', {})
+
+    resp = Response(generate(), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream.
+    resp.headers['X-Accel-Buffering'] = 'no'
+    resp.set_cookie(SESSION_COOKIE, sid, httponly=True)
+    return resp
+
+
+@app.route('/api/health')
+def health():
+    return jsonify({'engine': _engine is not None, 'model': MODEL.health()})
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+
+def _static(path):
+    variant = STATIC.lookup(path, request.headers.get('Accept-Encoding', ''))
+    if variant is None:
+        abort(404)
+    if etag_matches(request.headers.get('If-None-Match'), variant.etag):
+        metrics.inc('static_not_modified')
+        resp = Response(status=304)
+    else:
+        # send_file hands the open file to the WSGI server's file_wrapper,
+        # which gunicorn sends with sendfile().
+        resp = send_file(variant.path, mimetype=variant.mimetype, conditional=False, etag=False, max_age=None)
+        resp.headers.pop('Content-Disposition', None)
+        if variant.encoding:
+            resp.headers['Content-Encoding'] = variant.encoding
+    resp.headers['ETag'] = variant.etag
+    resp.headers['Cache-Control'] = variant.cache_control
+    resp.headers['Vary'] = 'Accept-Encoding'
+    return resp
+
 
 @app.route('/')
 def index():
     # Serve the chat page
-    return app.send_static_file('sivia.html')
+    return _static('sivia/sivia.html')
+
+
+@app.route('/<path:path>')
+def static_asset(path):
+    return _static(path)
 
 
 
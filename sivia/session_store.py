@@ -0,0 +1,239 @@
+# Session stores for the web chat history.
+#
+# MemorySessionStore keeps everything in the worker process; SQLiteSessionStore
+# keeps it in a local database file so several gunicorn workers on the same
+# host see the same conversations. Both cap the number of sessions (LRU),
+# expire idle sessions and keep each session under a message and byte budget.
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class Message:
+    __slots__ = ('author', 'text', 'ts')
+
+    def __init__(self, author, text, ts=None):
+        self.author = author
+        self.text = text
+        self.ts = time.time() if ts is None else ts
+
+    def __repr__(self):
+        return f'Message({self.author!r}, {self.text!r}, {self.ts!r})'
+
+
+def _size(text):
+    return len(text.encode('utf-8'))
+
+
+def _clip(text, max_bytes):
+    # Cut a single oversized message so it fits in the byte budget on its own.
+    return text.encode('utf-8')[:max_bytes].decode('utf-8', 'ignore')
+
+
+class MemorySessionStore:
+    def __init__(self, max_sessions=5000, ttl=3600, max_bytes=16384, max_messages=10):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        # sid -> [last_seen, total_bytes, [Message, ...]], least recently used first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, sid):
+        with self._lock:
+            self._expire(time.monotonic())
+            return sid in self._sessions
+
+    def _expire(self, now):
+        sessions = self._sessions
+        while sessions:
+            sid, entry = next(iter(sessions.items()))
+            if now - entry[0] < self.ttl:
+                break
+            del sessions[sid]
+
+    def _entry(self, sid, now, create):
+        entry = self._sessions.get(sid)
+        if entry is None:
+            if not create:
+                return None
+            entry = [now, 0, []]
+            self._sessions[sid] = entry
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            entry[0] = now
+            self._sessions.move_to_end(sid)
+        return entry
+
+    def append(self, sid, author, text):
+        text = _clip(text, self.max_bytes)
+        message = Message(author, text)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entry(sid, now, create=True)
+            messages = entry[2]
+            messages.append(message)
+            entry[1] += _size(text)
+            while len(messages) > self.max_messages or entry[1] > self.max_bytes:
+                entry[1] -= _size(messages.pop(0).text)
+        return message
+
+    def history(self, sid):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entry(sid, now, create=False)
+            return list(entry[2]) if entry else []
+
+    def clear(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+
+class SQLiteSessionStore:
+    # How many writes between sweeps of expired / over-cap sessions.
+    SWEEP_EVERY = 100
+
+    def __init__(self, path, max_sessions=5000, ttl=3600, max_bytes=16384, max_messages=10):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self._local = threading.local()
+        self._writes = 0
+        if hasattr(os, 'register_at_fork'):
+            # A connection opened before a fork (gunicorn --preload) must not
+            # be used by the children.
+            os.register_at_fork(after_in_child=self._forget_connections)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                ' sid TEXT PRIMARY KEY, last_seen REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS messages ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT, sid TEXT NOT NULL,'
+                ' author TEXT NOT NULL, text TEXT NOT NULL, ts REAL NOT NULL,'
+                ' size INTEGER NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS messages_sid ON messages (sid, id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_seen ON sessions (last_seen)')
+
+    def _forget_connections(self):
+        self._local = threading.local()
+
+    def _conn(self):
+        # sqlite3 connections must not be shared between threads.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def __len__(self):
+        cutoff = time.time() - self.ttl
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM sessions WHERE last_seen >= ?', (cutoff,)
+        ).fetchone()[0]
+
+    def __contains__(self, sid):
+        row = self._conn().execute(
+            'SELECT last_seen FROM sessions WHERE sid = ?', (sid,)
+        ).fetchone()
+        return bool(row) and time.time() - row[0] < self.ttl
+
+    def append(self, sid, author, text):
+        text = _clip(text, self.max_bytes)
+        message = Message(author, text)
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'INSERT INTO sessions (sid, last_seen) VALUES (?, ?)'
+                ' ON CONFLICT(sid) DO UPDATE SET last_seen = excluded.last_seen',
+                (sid, message.ts),
+            )
+            conn.execute(
+                'INSERT INTO messages (sid, author, text, ts, size) VALUES (?, ?, ?, ?, ?)',
+                (sid, author, text, message.ts, _size(text)),
+            )
+            self._trim(conn, sid)
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            self.sweep()
+        return message
+
+    def _trim(self, conn, sid):
+        rows = conn.execute(
+            'SELECT id, size FROM messages WHERE sid = ? ORDER BY id DESC', (sid,)
+        ).fetchall()
+        total = 0
+        for n, (msg_id, size) in enumerate(rows):
+            total += size
+            if n >= self.max_messages or total > self.max_bytes:
+                conn.execute('DELETE FROM messages WHERE sid = ? AND id <= ?', (sid, msg_id))
+                break
+
+    def history(self, sid):
+        conn = self._conn()
+        row = conn.execute('SELECT last_seen FROM sessions WHERE sid = ?', (sid,)).fetchone()
+        now = time.time()
+        if not row or now - row[0] >= self.ttl:
+            return []
+        conn.execute('UPDATE sessions SET last_seen = ? WHERE sid = ?', (now, sid))
+        rows = conn.execute(
+            'SELECT author, text, ts FROM messages WHERE sid = ? ORDER BY id', (sid,)
+        ).fetchall()
+        return [Message(author, text, ts) for author, text, ts in rows]
+
+    def clear(self, sid):
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM messages WHERE sid = ?', (sid,))
+            conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def sweep(self):
+        # Drop idle sessions, then the least recently used ones above the cap.
+        conn = self._conn()
+        cutoff = time.time() - self.ttl
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM sessions WHERE last_seen < ?', (cutoff,))
+            conn.execute(
+                'DELETE FROM sessions WHERE sid IN ('
+                ' SELECT sid FROM sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?)',
+                (self.max_sessions,),
+            )
+            conn.execute('DELETE FROM messages WHERE sid NOT IN (SELECT sid FROM sessions)')
+
+
+def create_session_store(max_messages=10):
+    """Build the session store configured through the environment.
+
+    SIVIA_SESSION_BACKEND selects ``memory`` (default) or ``sqlite``; the
+    database path comes from SIVIA_SESSION_DB.
+    """
+    options = {
+        'max_sessions': int(os.getenv('SIVIA_MAX_SESSIONS', '5000')),
+        'ttl': float(os.getenv('SIVIA_SESSION_TTL', '3600')),
+        'max_bytes': int(os.getenv('SIVIA_SESSION_MAX_BYTES', '16384')),
+        'max_messages': max_messages,
+    }
+    backend = os.getenv('SIVIA_SESSION_BACKEND', 'memory').lower()
+    if backend == 'sqlite':
+        path = os.getenv('SIVIA_SESSION_DB', os.path.join(os.path.dirname(__file__), 'sivia_sessions.db'))
+        return SQLiteSessionStore(path, **options)
+    return MemorySessionStore(**options)
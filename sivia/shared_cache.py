@@ -0,0 +1,193 @@
+# Cache tier shared by every worker process on one host.
+#
+# SharedCache keeps string values in a local SQLite database in WAL mode, so
+# readers in different gunicorn workers never block each other and no
+# external service is needed. Entries expire after their TTL and the table
+# is kept under ``max_bytes`` by dropping the least recently used entries.
+# TieredCache puts a per-process TTLCache in front of it with the same
+# get/set interface, so a hit in this worker costs no SQL at all and a value
+# computed by another worker costs one indexed lookup.
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from cache import TTLCache
+
+# A read only rewrites last_used when it is older than this, so the LRU
+# order stays roughly right without turning every hit into a write.
+TOUCH_INTERVAL = 60.0
+
+
+class SharedCache:
+    # How many writes between eviction sweeps.
+    SWEEP_EVERY = 50
+
+    def __init__(self, path, namespace, max_bytes=64 * 1024 * 1024, ttl=600):
+        self.path = path
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._writes = 0
+        self._local = threading.local()
+        if hasattr(os, 'register_at_fork'):
+            # A connection opened before a fork (gunicorn --preload) must not
+            # be used by the children.
+            os.register_at_fork(after_in_child=self._forget_connections)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                ' ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,'
+                ' size INTEGER NOT NULL, expires REAL NOT NULL, last_used REAL NOT NULL,'
+                ' PRIMARY KEY (ns, key))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_used ON cache (last_used)')
+
+    def _forget_connections(self):
+        self._local = threading.local()
+
+    def _conn(self):
+        # sqlite3 connections must not be shared between threads.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, key):
+        """(value, seconds left) for ``key``, or None on a miss."""
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                'SELECT value, expires, last_used FROM cache WHERE ns = ? AND key = ?',
+                (self.namespace, key),
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self.misses += 1
+                return None
+            if now - row[2] > TOUCH_INTERVAL:
+                conn.execute('UPDATE cache SET last_used = ? WHERE ns = ? AND key = ?', (now, self.namespace, key))
+        except sqlite3.Error as e:
+            # The shared tier is an optimisation: a busy or broken database is a miss.
+            self.errors += 1
+            logging.debug("Caché compartida no disponible: %s", e)
+            return None
+        self.hits += 1
+        return row[0], row[1] - now
+
+    def get(self, key, default=None):
+        found = self.lookup(key)
+        return default if found is None else found[0]
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        try:
+            self._conn().execute(
+                'INSERT OR REPLACE INTO cache (ns, key, value, size, expires, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+                (self.namespace, key, value, len(key) + len(value.encode('utf-8')), expires, now),
+            )
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.debug("No se pudo escribir en la caché compartida: %s", e)
+            return
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            self.sweep()
+
+    def sweep(self):
+        # Drop expired entries, then the least recently used ones over the byte budget.
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+                total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+                if total > self.max_bytes:
+                    # Cut to 90% of the budget so the next sweeps have room.
+                    excess = total - int(self.max_bytes * 0.9)
+                    conn.execute(
+                        'DELETE FROM cache WHERE rowid IN ('
+                        ' SELECT rowid FROM (SELECT rowid, size,'
+                        '  SUM(size) OVER (ORDER BY last_used, rowid) AS running FROM cache)'
+                        ' WHERE running - size < ?)',
+                        (excess,),
+                    )
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.debug("Falló la limpieza de la caché compartida: %s", e)
+
+    def clear(self):
+        try:
+            self._conn().execute('DELETE FROM cache WHERE ns = ?', (self.namespace,))
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.debug("No se pudo vaciar la caché compartida: %s", e)
+
+    def __len__(self):
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM cache WHERE ns = ? AND expires > ?', (self.namespace, time.time())
+        ).fetchone()[0]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'errors': self.errors}
+
+
+class TieredCache:
+    # TTLCache in this process, SharedCache behind it.
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def __len__(self):
+        return len(self.local)
+
+    def get(self, key, default=None):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        found = self.shared.lookup(key)
+        if found is None:
+            return default
+        value, remaining = found
+        self.local.set(key, value, ttl=min(remaining, self.local.ttl))
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.local.set(key, value, ttl)
+        if isinstance(value, str):
+            self.shared.set(key, value, ttl)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def stats(self):
+        return {**self.local.stats(), 'shared': self.shared.stats()}
+
+
+def create_cache(namespace, max_entries=1024, ttl=600):
+    """Build a cache configured through the environment.
+
+    SIVIA_CACHE_BACKEND selects ``memory`` (default, this process only) or
+    ``sqlite`` (shared by the workers on this host, database at
+    SIVIA_CACHE_DB, at most SIVIA_CACHE_MAX_MB megabytes).
+    """
+    local = TTLCache(max_entries=max_entries, ttl=ttl)
+    if os.getenv('SIVIA_CACHE_BACKEND', 'memory').lower() != 'sqlite':
+        return local
+    path = os.getenv('SIVIA_CACHE_DB', os.path.join(os.path.dirname(__file__), 'sivia_cache.db'))
+    max_bytes = int(float(os.getenv('SIVIA_CACHE_MAX_MB', '64')) * 1024 * 1024)
+    try:
+        return TieredCache(local, SharedCache(path, namespace, max_bytes=max_bytes, ttl=ttl))
+    except sqlite3.Error as e:
+        logging.warning("No se pudo abrir la caché compartida %s (%s); se usa solo la local", path, e)
+        return local
@@ -0,0 +1,20 @@
+# Text normalisation helpers (prompt keys for caching, accent folding).
+import re
+import unicodedata
+
+_PUNCTUATION = re.compile(r"[^\w\s]|_")
+# Combining diacritical marks left over after NFKD decomposition.
+_COMBINING = re.compile("[\u0300-\u036f]")
+
+
+def fold_accents(text):
+    if text.isascii():
+        return text
+    return _COMBINING.sub("", unicodedata.normalize("NFKD", text))
+
+
+def normalize_prompt(text):
+    # "¿Qué PROPUESTAS tienen?" -> "que propuestas tienen"
+    text = fold_accents(text.lower())
+    text = _PUNCTUATION.sub(" ", text)
+    return " ".join(text.split())
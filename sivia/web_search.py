@@ -0,0 +1,217 @@
+# Trusted web search used when the user explicitly asks for sources.
+#
+# All HTTP goes through one pooled requests.Session. Result pages are fetched
+# concurrently under an overall deadline, pending fetches are dropped as soon
+# as enough extracts are collected and page extracts are cached by URL.
+# requests and bs4 are imported on first use so importing the engine stays
+# cheap for workers that never search.
+import codecs
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+from urllib.parse import quote, urlparse
+
+import metrics
+from shared_cache import create_cache
+
+TRUSTED_DOMAINS = [".org", ".gob", ".ong", ".gov", ".edu", ".ac."]
+SEARCH_TRIGGERS = ["buscar web", "fuente", "investiga", "busca en internet"]
+SEARCH_URL = os.getenv("SIVIA_SEARCH_URL", "https://www.google.com/search?q={query}&num=10")
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+SEARCH_TIMEOUT = 10
+PAGE_TIMEOUT = 7
+SEARCH_DEADLINE = float(os.getenv("SIVIA_SEARCH_DEADLINE", "8"))
+# Extra candidates fetched in parallel in case some pages have no usable text.
+SPARE_CANDIDATES = 2
+EXTRACT_CHARS = 500
+MIN_PARAGRAPH_CHARS = 40
+# Pages are read in chunks and never past this many bytes.
+READ_CHUNK = 16 * 1024
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+_fetch_pool = ThreadPoolExecutor(max_workers=int(os.getenv("SIVIA_FETCH_WORKERS", "8")), thread_name_prefix="sivia-fetch")
+# Page extracts; with SIVIA_CACHE_BACKEND=sqlite shared by the workers.
+page_cache = create_cache(
+    "pages",
+    max_entries=int(os.getenv("SIVIA_PAGE_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("SIVIA_PAGE_CACHE_TTL", "900")),
+)
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=32)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update(HEADERS)
+                _session = session
+    return _session
+
+
+def wants_web_search(query):
+    # Solo buscar si el usuario lo pide explícitamente
+    query = query.lower()
+    return any(x in query for x in SEARCH_TRIGGERS)
+
+
+def _trusted_links(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    links = []
+    for g in soup.find_all('div', class_='g'):
+        a = g.find('a', href=True)
+        if a and a['href'].startswith('http'):
+            href = a['href']
+            domain = (urlparse(href).hostname or '').lower()
+            if "wikipedia.org" in domain:
+                continue
+            if any(domain.endswith(dom) for dom in TRUSTED_DOMAINS):
+                links.append((a.get_text()[:80].strip(), href))
+    return links
+
+
+class ParagraphExtractor(HTMLParser):
+    # Collects the text of <p> elements longer than MIN_PARAGRAPH_CHARS and
+    # reports ``done`` once EXTRACT_CHARS characters are available, so the
+    # caller can stop reading the page.
+    def __init__(self, limit=EXTRACT_CHARS):
+        super().__init__()
+        self.limit = limit
+        self.paragraphs = []
+        self.length = -1
+        self.done = False
+        self._current = None
+
+    def _close_paragraph(self):
+        text = "".join(self._current).strip()
+        self._current = None
+        if len(text) > MIN_PARAGRAPH_CHARS:
+            self.paragraphs.append(text)
+            self.length += len(text) + 1
+            if self.length >= self.limit:
+                self.done = True
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'p':
+            if self._current is not None:
+                self._close_paragraph()
+            self._current = []
+
+    def handle_endtag(self, tag):
+        if tag == 'p' and self._current is not None:
+            self._close_paragraph()
+
+    def handle_data(self, data):
+        if self._current is not None:
+            self._current.append(data)
+
+    def text(self):
+        if self._current is not None and not self.done:
+            self._close_paragraph()
+        return " ".join(self.paragraphs)[:self.limit]
+
+
+def extract_paragraphs(chunks, limit=EXTRACT_CHARS, cancel=None):
+    # Feeds text chunks to a ParagraphExtractor until it has enough text,
+    # the chunks run out or ``cancel`` is set.
+    parser = ParagraphExtractor(limit)
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.done or (cancel is not None and cancel.is_set()):
+            break
+    return parser.text()
+
+
+def _iter_text(response, cancel=None):
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    read = 0
+    for chunk in response.iter_content(READ_CHUNK):
+        read += len(chunk)
+        yield decoder.decode(chunk)
+        if read >= MAX_PAGE_BYTES or (cancel is not None and cancel.is_set()):
+            return
+    yield decoder.decode(b'', final=True)
+
+
+def fetch_page_extract(url, timeout=PAGE_TIMEOUT, cancel=None):
+    cached = page_cache.get(url)
+    if cached is not None:
+        metrics.inc("page_cache_hit")
+        return cached
+    # Stream the body and stop as soon as enough paragraph text is parsed;
+    # closing the response drops the rest of the download.
+    with metrics.timer("page_fetch"), get_session().get(url, timeout=timeout, stream=True) as page:
+        text = extract_paragraphs(_iter_text(page, cancel), cancel=cancel)
+    if text and not (cancel is not None and cancel.is_set()):
+        page_cache.set(url, text)
+    return text
+
+
+def _fetch_extracts(candidates, max_results, deadline):
+    # Returns {index: extract} for the first candidates that produced text.
+    futures = {}
+    cancel = threading.Event()
+    for i, (_, href) in enumerate(candidates):
+        timeout = min(PAGE_TIMEOUT, max(0.1, deadline - time.monotonic()))
+        futures[_fetch_pool.submit(fetch_page_extract, href, timeout, cancel)] = i
+    extracts = {}
+    pending = set(futures)
+    while pending and len(extracts) < max_results:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                text = future.result()
+            except Exception as e:
+                logging.debug("No se pudo leer %s: %s", candidates[futures[future]][1], e)
+                continue
+            if text:
+                extracts[futures[future]] = text
+    # Stop fetches that already started too, not just the queued ones.
+    cancel.set()
+    for future in pending:
+        future.cancel()
+    return extracts
+
+
+def trusted_web_search(query, max_results=2, budget=None):
+    if not wants_web_search(query):
+        return ""
+    with metrics.timer("web_search"):
+        return _search(query, max_results, budget)
+
+
+def _search(query, max_results, budget):
+    deadline = time.monotonic() + (SEARCH_DEADLINE if budget is None else budget)
+    try:
+        url = SEARCH_URL.format(query=quote(query))
+        resp = get_session().get(url, timeout=min(SEARCH_TIMEOUT, max(0.1, deadline - time.monotonic())))
+        candidates = _trusted_links(resp.text)[:max_results + SPARE_CANDIDATES]
+        # Si no hay fuentes confiables, devuelve cadena vacía (no bloquea la respuesta)
+        if not candidates:
+            return ""
+        extracts = _fetch_extracts(candidates, max_results, deadline)
+        # Prefer sources with an extract, keep search order, fill up with the rest.
+        chosen = sorted(extracts)[:max_results]
+        chosen += [i for i in range(len(candidates)) if i not in extracts][:max_results - len(chosen)]
+        chosen.sort()
+        results = [candidates[i] for i in chosen]
+        context_texts = [f"{candidates[i][0]}: {extracts[i]}..." for i in chosen if i in extracts]
+        fuentes = "🔍 **Fuentes confiables:**\n" + "\n".join(f"- {t}\n  {u}" for t, u in results)
+        contexto = "\n\n".join(context_texts)
+        return f"{fuentes}\n\n📝 **Extractos relevantes:**\n{contexto}" if contexto else fuentes
+    except Exception as e:
+        logging.debug("Búsqueda web fallida: %s", e)
+        return ""